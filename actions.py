@@ -8,6 +8,9 @@ from typing import Tuple, Union
 class ActionType(Enum):
     MOUSE = auto()
     KEYBOARD = auto()
+    MOUSE_MOVE = auto()
+    TEXT = auto()
+    CONTROL = auto()
 
 
 @dataclass
@@ -22,12 +25,31 @@ class MouseAction:
     delay_randomization: bool = False  # Enable delay randomization
     delay_min_multiplier: float = 1.0  # Minimum multiplier for delay randomization
     delay_max_multiplier: float = 1.5  # Maximum multiplier for delay randomization
+    press_duration: float = 0.0  # seconds the button was held (0 = plain click)
+    path: list | None = None  # drag path [(x, y, t), ...], t relative to the press
+    template: str | None = None  # base64 PNG patch centred on the click; matched instead of the color
+    match_threshold: float = 0.8  # minimum normalized cross-correlation for a template match
+    track_motion: bool = False  # aim at where a moving target will be when the click lands
+    anchor: dict | None = None  # reference point for picking among matches (None = program anchor)
 
     @property
     def type(self) -> ActionType:
         return ActionType.MOUSE
 
 
+@dataclass
+class MouseMoveAction:
+    timestamp: float  # interval (seconds) to wait before this action
+    path: list  # simplified cursor path [(x, y, t), ...], t relative to the first point
+    delay_randomization: bool = False  # Enable delay randomization
+    delay_min_multiplier: float = 1.0  # Minimum multiplier for delay randomization
+    delay_max_multiplier: float = 1.5  # Maximum multiplier for delay randomization
+
+    @property
+    def type(self) -> ActionType:
+        return ActionType.MOUSE_MOVE
+
+
 @dataclass
 class KeyboardAction:
     timestamp: float  # interval (seconds) to wait before this action
@@ -41,4 +63,40 @@ class KeyboardAction:
         return ActionType.KEYBOARD
 
 
-Action = Union[MouseAction, KeyboardAction]
\ No newline at end of file
+@dataclass
+class TextAction:
+    timestamp: float  # interval (seconds) to wait before this action
+    text: str  # characters typed in order
+    char_interval: float = 0.02  # pause (seconds) between characters
+    delay_randomization: bool = False  # Enable delay randomization
+    delay_min_multiplier: float = 1.0  # Minimum multiplier for delay randomization
+    delay_max_multiplier: float = 1.5  # Maximum multiplier for delay randomization
+
+    @property
+    def type(self) -> ActionType:
+        return ActionType.TEXT
+
+
+@dataclass
+class ControlOp:
+    """A control-flow entry in a script (compiled by ``control.compile_script``)."""
+    op: str  # label, jump, if_found, if_missing, on_miss, repeat, end_repeat, call, return, end
+    name: str | None = None  # label: its name
+    to: str | None = None  # jump, call, if_found, if_missing, on_miss: the target label (on_miss None = restart)
+    count: int = 1  # repeat: how many times the block up to the matching end_repeat runs
+    timestamp: float = 0.0  # if_found/if_missing: interval (seconds) to wait before looking
+    color: Tuple[int, int, int] | None = None  # if_found/if_missing: what to look for...
+    color_area: tuple[int, int, int, int] | None = None  # ...and where (x, y, w, h)
+    color_tolerance: int = 1
+    template: str | None = None  # base64 PNG patch, matched instead of the color
+    match_threshold: float = 0.8
+    delay_randomization: bool = False
+    delay_min_multiplier: float = 1.0
+    delay_max_multiplier: float = 1.5
+
+    @property
+    def type(self) -> ActionType:
+        return ActionType.CONTROL
+
+
+Action = Union[MouseAction, KeyboardAction, MouseMoveAction, TextAction, ControlOp]
\ No newline at end of file
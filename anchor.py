@@ -0,0 +1,135 @@
+"""
+The reference point used to pick one of several matches (the closest wins).
+
+An anchor is a small JSON-friendly dict, set for the whole program in
+``settings.json`` (``"anchor"``) or per mouse action (``MouseAction.anchor``):
+
+    {"mode": "fixed", "point": [1111, 561]}
+    {"mode": "position"}                      # the action's recorded position
+    {"mode": "color", "color": [r, g, b], "area": [x, y, w, h], "tolerance": 5}
+    {"mode": "template", "template": "<base64 PNG>", "area": [x, y, w, h], "threshold": 0.8}
+
+Marker anchors (color/template) follow something on screen, such as a
+character or a window corner, so cluster selection survives window moves.
+``area`` may be omitted to search the whole screen.
+"""
+from __future__ import annotations
+
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from utils import DEFAULT_SETTINGS, find_closest_cluster, find_color_connected_clusters, grab_area
+
+DEFAULT_ANCHOR = DEFAULT_SETTINGS["anchor"]
+MODES = ("fixed", "position", "color", "template")
+
+
+def check_anchor(spec: dict) -> dict:
+    """Raise ValueError unless *spec* is a usable anchor; returns it."""
+    mode = spec.get("mode") if isinstance(spec, dict) else None
+    if mode not in MODES:
+        raise ValueError(f"anchor mode must be one of {', '.join(MODES)}, got {mode!r}")
+    required = {"fixed": ("point",), "color": ("color",), "template": ("template",)}.get(mode, ())
+    missing = [k for k in required if k not in spec]
+    if missing:
+        raise ValueError(f"{mode} anchor needs {', '.join(missing)}")
+    return spec
+
+
+def _spec_key(spec: dict) -> tuple:
+    return tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in spec.items()))
+
+
+class AnchorTracker:
+    """
+    Resolves anchors to screen points.
+
+    Marker positions are cached for *max_age* seconds, so consecutive actions
+    share one search. When the cache runs out the marker is first looked for
+    in a *window*-pixel square around where it was last seen, and the whole
+    area is searched only if it is not there. A marker that cannot be found
+    keeps its last known point (or the area centre).
+    """
+
+    def __init__(self, capture: Callable = grab_area, clock: Callable[[], float] = time.perf_counter,
+                 max_age: float = 0.25, window: int = 80):
+        self.capture = capture
+        self.clock = clock
+        self.max_age = max_age
+        self.window = window
+        self._markers: Dict[tuple, Tuple[Tuple[int, int], float]] = {}  # spec -> (point, checked at)
+        self.cached = 0
+        self.local = 0
+        self.full = 0
+        self.lost = 0
+
+    def resolve(self, spec: dict, position: Tuple[int, int]) -> Tuple[int, int]:
+        """The anchor point of *spec* for an action recorded at *position*."""
+        mode = spec.get("mode", "fixed")
+        if mode == "fixed":
+            return tuple(spec["point"])
+        if mode == "position":
+            return tuple(position)
+        if mode in ("color", "template"):
+            return self._marker(spec)
+        raise ValueError(f"unknown anchor mode {mode!r}")
+
+    def _marker(self, spec: dict) -> Tuple[int, int]:
+        key = _spec_key(spec)
+        now = self.clock()
+        known = self._markers.get(key)
+        if known and now - known[1] <= self.max_age:
+            self.cached += 1
+            return known[0]
+        last = known[0] if known else None
+        area = tuple(spec["area"]) if spec.get("area") else self._screen()
+        found = None
+        if last is not None:
+            size = max(spec.get("window", self.window), 2 * self._patch_size(spec))
+            found = self._search(spec, (max(0, last[0] - size // 2), max(0, last[1] - size // 2), size, size), last)
+            if found is not None:
+                self.local += 1
+        if found is None:
+            found = self._search(spec, area, last)
+            if found is not None:
+                self.full += 1
+        if found is None:
+            self.lost += 1
+            found = last or (area[0] + area[2] // 2, area[1] + area[3] // 2)
+        self._markers[key] = (found, now)
+        return found
+
+    def _search(self, spec: dict, region, near) -> Optional[Tuple[int, int]]:
+        x, y, w, h = region
+        frame = self.capture(x, y, w, h)
+        if spec["mode"] == "color":
+            found = find_color_connected_clusters(frame, tuple(spec["color"]), offset=(x, y),
+                                                  tolerance=spec.get("tolerance", 5),
+                                                  min_cluster_size=spec.get("min_cluster_size", 5))
+        else:
+            from template import decode_patch, match_template
+            matches = match_template(frame, decode_patch(spec["template"]), threshold=spec.get("threshold", 0.8),
+                                     offset=(x, y), max_matches=5)
+            found = [(mx, my) for mx, my, _ in matches]
+        if not found:
+            return None
+        return find_closest_cluster(found, near) if near is not None else tuple(found[0])
+
+    @staticmethod
+    def _patch_size(spec: dict) -> int:
+        if spec["mode"] != "template":
+            return 0
+        from template import decode_patch
+        return max(decode_patch(spec["template"]).shape[:2])
+
+    @staticmethod
+    def _screen() -> Tuple[int, int, int, int]:
+        import pyautogui
+        w, h = pyautogui.size()
+        return 0, 0, w, h
+
+    def clear(self):
+        self._markers.clear()
+
+    def stats(self) -> dict:
+        return {"cached": self.cached, "local": self.local, "full": self.full, "lost": self.lost}
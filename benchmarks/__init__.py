@@ -0,0 +1 @@
+"""Benchmarks and regression checks (run with ``python -m benchmarks.<name>``)."""
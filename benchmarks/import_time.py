@@ -0,0 +1,79 @@
+"""
+Import-time regression check.
+
+Imports each entry module in a fresh interpreter with ``-X importtime`` and
+fails if it exceeds its time budget or pulls in a module it must not load
+eagerly (NumPy, scikit-learn, PIL and pyautogui belong to the first color
+search, Tk only to the GUI).
+
+    python -m benchmarks.import_time            # check default budgets
+    python -m benchmarks.import_time --top 15   # also list the slowest imports
+"""
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+HEAVY = ("numpy", "sklearn", "PIL", "pyautogui")
+
+# module -> (budget in ms, modules that must not be imported)
+CHECKS = {
+    "gui": (400.0, HEAVY),
+    "player": (60.0, HEAVY + ("tkinter", "pynput")),
+    "script_manager": (60.0, HEAVY + ("tkinter", "pynput")),
+    "cli": (80.0, HEAVY + ("tkinter", "pynput")),
+}
+
+
+def measure(module: str) -> tuple[float, dict[str, float]]:
+    """Return (total ms, {module: cumulative ms}) for importing *module*."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+    cumulative: dict[str, float] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cum_us, name = line[len("import time:"):].split("|")
+        cumulative[name.strip()] = int(cum_us) / 1000
+    return cumulative.get(module, 0.0), cumulative
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("modules", nargs="*", help="modules to check (default: all known entry modules)")
+    ap.add_argument("--scale", type=float, default=1.0, help="multiply every budget (slow machines)")
+    ap.add_argument("--top", type=int, default=0, help="list the N slowest imports per module")
+    args = ap.parse_args(argv)
+
+    failed = False
+    for module in args.modules or CHECKS:
+        budget, forbidden = CHECKS.get(module, (float("inf"), HEAVY))
+        budget *= args.scale
+        try:
+            total, cumulative = measure(module)
+        except RuntimeError as e:
+            print(f"SKIP {module}: {e}")
+            continue
+        loaded = sorted(m for m in cumulative if m.split(".")[0] in forbidden)
+        roots = sorted({m.split(".")[0] for m in loaded})
+        ok = total <= budget and not roots
+        failed |= not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {module}: {total:.1f} ms (budget {budget:.0f} ms)"
+              + (f", eagerly imports {', '.join(roots)}" if roots else ""))
+        if args.top:
+            top = sorted(cumulative.items(), key=lambda kv: kv[1], reverse=True)[1:args.top + 1]
+            for name, ms in top:
+                print(f"      {ms:8.1f} ms  {name}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""
+Playback-engine overhead benchmark.
+
+Runs ``ActionPlayer`` against fake mouse, keyboard and screen capture and a
+virtual clock whose ``sleep`` returns immediately, so the wall time spent is
+the engine's own: scheduling, flag checks, progress reporting and the color
+search on a tiny frame.
+
+    python -m benchmarks.playback                          # 10 .. 1,000,000 actions
+    python -m benchmarks.playback --quick                  # up to 10,000
+    python -m benchmarks.playback --sizes 1000 --no-color --json out.json
+
+For every script size, with and without color actions and delay
+randomization, it reports actions/s, overhead per action, the cost of the
+progress callback, and a histogram of the interval error: how far the gap
+between two injected events (on the virtual clock) is from the delay the
+engine scheduled. The error includes the engine's fixed pre/post-input
+sleeps and the granular-sleep rounding as well as real overhead.
+"""
+from __future__ import annotations
+
+import argparse
+import bisect
+import contextlib
+import io
+import json
+import random
+import statistics
+import sys
+import time
+from array import array
+from pathlib import Path
+from typing import List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from actions import KeyboardAction, MouseAction, TextAction
+from player import ActionPlayer
+
+SIZES = [10, 100, 1_000, 10_000, 100_000, 1_000_000]
+QUICK_SIZES = [10, 100, 1_000, 10_000]
+
+# interval-error histogram bucket edges (ms)
+EDGES = [-1.0, 0.0, 0.1, 1.0, 5.0, 10.0, 20.0, 50.0, 100.0]
+
+
+class VirtualClock:
+    """perf_counter plus the time "slept" so far; sleeping only advances the offset."""
+
+    def __init__(self):
+        self._offset = 0.0
+
+    def now(self) -> float:
+        return time.perf_counter() + self._offset
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            self._offset += seconds
+
+
+class FakeMouse:
+    def __init__(self, clock: VirtualClock, events: array):
+        self.position = (0, 0)
+        self._clock = clock
+        self._events = events
+
+    def click(self, button):
+        self._events.append(self._clock.now())
+
+    def press(self, button):
+        self._events.append(self._clock.now())
+
+    def release(self, button):
+        pass
+
+
+class FakeKeyboard:
+    def __init__(self, clock: VirtualClock, events: array):
+        self._clock = clock
+        self._events = events
+
+    def press(self, key):
+        self._events.append(self._clock.now())
+
+    def release(self, key):
+        pass
+
+
+class CyclicScript:
+    """*n* actions repeating *pattern*, generated on access (no per-action storage)."""
+
+    def __init__(self, pattern: list, n: int):
+        self._pattern = pattern
+        self._n = n
+
+    def __getitem__(self, i: int):
+        if i >= self._n:
+            raise IndexError(i)
+        return self._pattern[i % len(self._pattern)]
+
+    def __len__(self):
+        return self._n
+
+    def __length_hint__(self):
+        return self._n
+
+    def close(self):
+        pass
+
+
+def make_pattern(color: bool, randomize: bool, frame_size: int) -> list:
+    """A mix of clicks, keys and one-character text, each producing exactly one input event."""
+    extra = dict(delay_randomization=randomize, delay_min_multiplier=0.8, delay_max_multiplier=1.2)
+    pattern = [
+        MouseAction(0.05, "Button.left", (10, 10), **extra),
+        KeyboardAction(0.12, "'a'", **extra),
+        TextAction(0.2, "x", **extra),
+        KeyboardAction(0.5, "Key.enter", **extra),
+    ]
+    if color:
+        pattern.append(MouseAction(0.3, "Button.left", (10, 10), color_toggle=True, color=(255, 0, 0),
+                                   color_area=(0, 0, frame_size, frame_size), color_tolerance=0, **extra))
+    return pattern
+
+
+def make_frame(size: int):
+    import numpy as np
+    frame = np.zeros((size, size, 3), dtype=np.uint8)
+    c = size // 2
+    frame[c - 1:c + 2, c - 1:c + 2] = (255, 0, 0)
+    return frame
+
+
+def intended_delays(pattern: list, n: int, speed: float, seed: int) -> array:
+    """The delays the engine will schedule, reproducing its random draws."""
+    rng = random.Random(seed)
+    out = array("d")
+    for i in range(n):
+        act = pattern[i % len(pattern)]
+        delay = act.timestamp * speed
+        if act.delay_randomization:
+            delay *= rng.uniform(act.delay_min_multiplier, act.delay_max_multiplier)
+        out.append(delay)
+    return out
+
+
+def run_once(n: int, *, color: bool, randomize: bool, progress: bool, frame_size: int,
+             speed: float = 1.0, seed: int = 0) -> dict:
+    clock = VirtualClock()
+    events = array("d")
+    frame = make_frame(frame_size) if color else None
+    calls = [0]
+
+    def on_progress(info):
+        calls[0] += 1
+
+    player = ActionPlayer(
+        speed=speed, pause_key=object(), hotkeys=False,
+        progress_callback=on_progress if progress else None,
+        clock=clock.now, sleep=clock.sleep, inline=True,
+        mouse=FakeMouse(clock, events), keys=FakeKeyboard(clock, events),
+        capture=lambda x, y, w, h: frame,
+    )
+    player.pause_flag = False
+    pattern = make_pattern(color, randomize, frame_size)
+    script = CyclicScript(pattern, n)
+
+    random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):  # the engine prints per color hit
+        t0 = time.perf_counter()
+        player._play_script(script)
+        wall = time.perf_counter() - t0
+    if len(events) != n:
+        raise RuntimeError(f"expected {n} input events, got {len(events)}")
+    return {"wall": wall, "events": events, "delays": intended_delays(pattern, n, speed, seed),
+            "progress_calls": calls[0]}
+
+
+def histogram(values_ms: List[float]) -> List[int]:
+    counts = [0] * (len(EDGES) + 1)
+    for v in values_ms:
+        counts[bisect.bisect_right(EDGES, v)] += 1
+    return counts
+
+
+def _bucket_labels() -> List[str]:
+    labels = [f"< {EDGES[0]:g}"]
+    labels += [f"{a:g} .. {b:g}" for a, b in zip(EDGES, EDGES[1:])]
+    labels.append(f">= {EDGES[-1]:g}")
+    return labels
+
+
+def bench(n: int, *, color: bool, randomize: bool, frame_size: int) -> dict:
+    bare = run_once(n, color=color, randomize=randomize, progress=False, frame_size=frame_size)
+    full = run_once(n, color=color, randomize=randomize, progress=True, frame_size=frame_size)
+
+    ev, delays = full["events"], full["delays"]
+    errors_ms = [((ev[i] - ev[i - 1]) - delays[i]) * 1e3 for i in range(1, len(ev))]
+    errors_sorted = sorted(errors_ms)
+
+    def pct(q):
+        return errors_sorted[min(len(errors_sorted) - 1, int(q * len(errors_sorted)))] if errors_sorted else 0.0
+
+    return {
+        "actions": n,
+        "color": color,
+        "randomize": randomize,
+        "actions_per_s": n / full["wall"],
+        "overhead_us": full["wall"] / n * 1e6,
+        "overhead_no_progress_us": bare["wall"] / n * 1e6,
+        "progress_cost_us": (full["wall"] - bare["wall"]) / max(full["progress_calls"], 1) * 1e6,
+        "error_ms": {
+            "mean": statistics.fmean(errors_ms) if errors_ms else 0.0,
+            "stdev": statistics.pstdev(errors_ms) if errors_ms else 0.0,
+            "p50": pct(0.50), "p99": pct(0.99),
+            "max": errors_sorted[-1] if errors_sorted else 0.0,
+        },
+        "error_histogram_ms": dict(zip(_bucket_labels(), histogram(errors_ms))),
+    }
+
+
+def print_result(r: dict):
+    e = r["error_ms"]
+    flags = f"{'color' if r['color'] else 'plain'}{'+rand' if r['randomize'] else ''}"
+    print(f"{r['actions']:>9} {flags:11} {r['actions_per_s']:>11.0f} act/s  "
+          f"{r['overhead_us']:7.1f} us/act  (no progress {r['overhead_no_progress_us']:6.1f}, "
+          f"callback {r['progress_cost_us']:5.2f} us)  "
+          f"error mean {e['mean']:6.2f} sd {e['stdev']:5.2f} p99 {e['p99']:6.2f} max {e['max']:6.2f} ms")
+
+
+def print_histogram(r: dict, width: int = 40):
+    counts = r["error_histogram_ms"]
+    peak = max(counts.values()) or 1
+    for label, count in counts.items():
+        if count:
+            print(f"      {label:>12} ms  {'#' * max(1, round(count / peak * width)):{width}} {count}")
+
+
+def main(argv: Optional[list] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", nargs="+", type=int, help=f"script lengths (default {SIZES})")
+    ap.add_argument("--quick", action="store_true", help=f"use {QUICK_SIZES}")
+    ap.add_argument("--no-color", dest="color", action="store_false", help="skip the color-action variants")
+    ap.add_argument("--no-random", dest="randomize", action="store_false",
+                    help="skip the delay-randomization variants")
+    ap.add_argument("--frame-size", type=int, default=8, help="side of the fake captured frame (px)")
+    ap.add_argument("--histograms", action="store_true", help="print interval-error histograms")
+    ap.add_argument("--json", type=Path, help="write all results here")
+    args = ap.parse_args(argv)
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else SIZES)
+    variants = [(c, r) for c in ((False, True) if args.color else (False,))
+                for r in ((False, True) if args.randomize else (False,))]
+    # warm up lazy imports and the detection path before timing anything
+    run_once(100, color=args.color, randomize=False, progress=True, frame_size=args.frame_size)
+    results = []
+    for n in sizes:
+        for color, randomize in variants:
+            r = bench(n, color=color, randomize=randomize, frame_size=args.frame_size)
+            results.append(r)
+            print_result(r)
+            if args.histograms:
+                print_histogram(r)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
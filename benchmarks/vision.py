@@ -0,0 +1,412 @@
+"""
+Vision benchmark: latency, throughput, peak memory and correctness of the
+color-search functions on synthetic or recorded frames.
+
+    python -m benchmarks.vision                          # default synthetic grid
+    python -m benchmarks.vision --sizes 200x200 --clusters 1 5 --backends connected mean
+    python -m benchmarks.vision --corpus frames/ --target 255 0 0 --tolerance 5
+    python -m benchmarks.vision --save-baseline baseline.json
+    python -m benchmarks.vision --baseline baseline.json --max-ratio 1.25   # exit 1 on regression
+
+Synthetic frames plant disc-shaped clusters of the target color (with
+per-channel jitter inside the tolerance) on a background that never matches,
+plus optional isolated "speckle" matches smaller than ``min_cluster_size``.
+A corpus is a directory of images, optionally with a ``frames.json`` mapping
+file names to ``{"target": [r, g, b], "tolerance": n}``.
+
+Every result is checked against an independent NumPy reference: connected
+components for the cluster searches, the plain mean for ``find_color_mean``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import numpy as np
+
+import utils
+
+Frame = np.ndarray  # (H, W, 3) uint8
+
+
+# ---------------------------------------------------------------------------
+# Frames
+# ---------------------------------------------------------------------------
+@dataclass
+class Case:
+    """One frame to search, with the parameters and (if synthetic) the planted centroids."""
+    name: str
+    frame: Frame
+    target: Tuple[int, int, int]
+    tolerance: int
+    min_cluster_size: int = 5
+    planted: List[Tuple[float, float]] = field(default_factory=list)
+    _components: Optional[List[Tuple[int, int]]] = field(default=None, repr=False)
+
+
+def make_frame(width: int, height: int, *, clusters: int = 5, density: float = 0.02,
+               noise: int = 0, speckle: float = 0.0, target=(255, 0, 0), tolerance: int = 5,
+               seed: int = 0) -> Case:
+    """
+    Synthetic frame.
+
+    Args:
+        clusters: Number of disc-shaped clusters to plant.
+        density: Fraction of the frame covered by clusters (sets the disc radius).
+        noise: Per-channel jitter on cluster pixels (clipped to *tolerance*).
+        speckle: Fraction of pixels turned into isolated matches (below
+                 ``min_cluster_size``, so they must be ignored).
+    """
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 256, size=(height, width, 3), dtype=np.int16)
+    t = np.array(target, dtype=np.int16)
+    # Push background pixels that happen to match well outside the tolerance
+    near = np.all(np.abs(frame - t) <= tolerance + noise + 1, axis=-1)
+    frame[near] = (t + 128) % 256
+
+    radius = max(2.0, math.sqrt(density * width * height / max(clusters, 1) / math.pi))
+    yy, xx = np.mgrid[0:height, 0:width]
+    planted = []
+    placed = 0
+    attempts = 0
+    taken = np.zeros((height, width), dtype=bool)
+    while placed < clusters and attempts < clusters * 50:
+        attempts += 1
+        cx = rng.uniform(radius, max(radius + 1, width - radius))
+        cy = rng.uniform(radius, max(radius + 1, height - radius))
+        disc = (xx - cx) ** 2 + (yy - cy) ** 2 <= radius ** 2
+        # keep clusters more than find_color_clusters' default max_distance apart
+        grown = (xx - cx) ** 2 + (yy - cy) ** 2 <= (radius + 6) ** 2
+        if (grown & taken).any():
+            continue
+        taken |= disc
+        jitter = rng.integers(-min(noise, tolerance), min(noise, tolerance) + 1,
+                              size=(int(disc.sum()), 3)) if noise else 0
+        frame[disc] = np.clip(t + jitter, 0, 255)
+        ys, xs = np.nonzero(disc)
+        planted.append((xs.mean(), ys.mean()))
+        placed += 1
+
+    if speckle:
+        n = int(speckle * width * height)
+        sy = rng.integers(1, height - 1, n)
+        sx = rng.integers(1, width - 1, n)
+        free = ~taken[sy, sx]
+        for y, x in zip(sy[free], sx[free]):
+            # isolated: clear the 3x3 neighbourhood first
+            if not taken[y - 1:y + 2, x - 1:x + 2].any():
+                frame[y, x] = t
+                taken[y - 1:y + 2, x - 1:x + 2] = True
+
+    name = f"{width}x{height} c{clusters} d{density:g} n{noise} s{speckle:g}"
+    return Case(name, frame.astype(np.uint8), tuple(target), tolerance, planted=planted)
+
+
+def load_corpus(directory: Path, target, tolerance: int) -> List[Case]:
+    """Recorded frames from *directory* (per-frame overrides in ``frames.json``)."""
+    from PIL import Image
+
+    meta_path = directory / "frames.json"
+    meta = json.loads(meta_path.read_text()) if meta_path.exists() else {}
+    cases = []
+    for path in sorted(directory.iterdir()):
+        if path.suffix.lower() not in (".png", ".bmp", ".jpg", ".jpeg"):
+            continue
+        info = meta.get(path.name, {})
+        with Image.open(path) as img:
+            frame = np.asarray(img.convert("RGB"), dtype=np.uint8)
+        cases.append(Case(path.name, frame, tuple(info.get("target", target)),
+                          int(info.get("tolerance", tolerance))))
+    return cases
+
+
+# ---------------------------------------------------------------------------
+# Reference implementations
+# ---------------------------------------------------------------------------
+def reference_mask(case: Case) -> np.ndarray:
+    diff = np.abs(case.frame.astype(np.int16) - np.array(case.target, dtype=np.int16))
+    return np.all(diff <= case.tolerance, axis=-1)
+
+
+def reference_components(case: Case) -> List[Tuple[int, int]]:
+    """8-connected components (>= min_cluster_size), centroids in raster order of first pixel."""
+    if case._components is None:
+        case._components = _components(case)
+    return case._components
+
+
+def _components(case: Case) -> List[Tuple[int, int]]:
+    mask = reference_mask(case)
+    h, w = mask.shape
+    labels = np.zeros((h, w), dtype=np.int32)
+    out = []
+    next_label = 0
+    for y, x in zip(*np.nonzero(mask)):
+        if labels[y, x]:
+            continue
+        next_label += 1
+        labels[y, x] = next_label
+        stack = [(y, x)]
+        sx = sy = n = 0
+        while stack:
+            cy, cx = stack.pop()
+            sx += cx
+            sy += cy
+            n += 1
+            for ny in (cy - 1, cy, cy + 1):
+                if ny < 0 or ny >= h:
+                    continue
+                for nx in (cx - 1, cx, cx + 1):
+                    if 0 <= nx < w and mask[ny, nx] and not labels[ny, nx]:
+                        labels[ny, nx] = next_label
+                        stack.append((ny, nx))
+        if n >= case.min_cluster_size:
+            out.append((int(sx / n), int(sy / n)))
+    return out
+
+
+def reference_mean(case: Case) -> Optional[Tuple[int, int]]:
+    ys, xs = np.nonzero(reference_mask(case))
+    if not len(xs):
+        return None
+    return int(xs.sum() / len(xs)), int(ys.sum() / len(ys))
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+@dataclass
+class Backend:
+    name: str
+    run: Callable[[Case], object]
+    check: Callable[[Case, object], bool]
+    max_pixels: int = 10 ** 9  # skip frames larger than this (slow pure-Python paths)
+
+
+def _same_set(case: Case, result) -> bool:
+    return sorted(result) == sorted(reference_components(case))
+
+
+def _near_planted(case: Case, result, slack: float = 2.0) -> bool:
+    """Distance-based clustering can merge/split differently; check against planted centroids."""
+    if not case.planted:
+        return True
+    if len(result) != len(case.planted):
+        return False
+    return all(min(math.dist(p, r) for r in result) <= slack for p in case.planted)
+
+
+BACKENDS: Dict[str, Backend] = {}
+
+
+def register_backend(backend: Backend):
+    BACKENDS[backend.name] = backend
+    return backend
+
+
+register_backend(Backend(
+    "mean",
+    lambda c: utils.find_color_mean(c.frame, c.target, tolerance=c.tolerance),
+    lambda c, r: r == reference_mean(c),
+    max_pixels=1_000_000,
+))
+register_backend(Backend(
+    "connected",
+    lambda c: utils.find_color_connected_clusters(c.frame, c.target, tolerance=c.tolerance,
+                                                  min_cluster_size=c.min_cluster_size),
+    lambda c, r: r == reference_components(c),
+    max_pixels=1_000_000,
+))
+_tiles = None
+
+
+def _tile_detector():
+    global _tiles
+    if _tiles is None:
+        from tiles import TileDetector
+        _tiles = TileDetector()
+    return _tiles
+
+
+register_backend(Backend(
+    # repeated runs see an unchanged frame: this times the incremental (all-clean) path
+    "tiles",
+    lambda c: _tile_detector().find(c.frame, c.target, tolerance=c.tolerance,
+                                    min_cluster_size=c.min_cluster_size),
+    lambda c, r: r == reference_components(c),
+))
+_parallel = None
+
+
+def _parallel_detector():
+    global _parallel
+    if _parallel is None:
+        from tiles import ParallelTileDetector
+        _parallel = ParallelTileDetector(min_pixels=0)
+    return _parallel
+
+
+register_backend(Backend(
+    "parallel",
+    lambda c: _parallel_detector().find(c.frame, c.target, tolerance=c.tolerance,
+                                        min_cluster_size=c.min_cluster_size),
+    lambda c, r: r == reference_components(c),
+))
+register_backend(Backend(
+    "clusters_distance",
+    lambda c: utils.find_color_clusters(c.frame, c.target, tolerance=c.tolerance,
+                                        min_cluster_size=c.min_cluster_size),
+    _near_planted,
+    max_pixels=60_000,  # quadratic in the number of matches
+))
+register_backend(Backend(
+    "clusters_dbscan",
+    lambda c: utils.find_color_clusters_dbscan(c.frame, c.target, tolerance=c.tolerance,
+                                               min_cluster_size=c.min_cluster_size, max_distance=2),
+    _near_planted,
+))
+register_backend(Backend(
+    "closest",
+    # input is the (cached) component list, so only the selection itself is timed
+    lambda c: utils.find_closest_cluster(reference_components(c), (c.frame.shape[1] // 2, c.frame.shape[0] // 2)),
+    lambda c, r: r is None or r in reference_components(c),
+))
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    k = (len(sorted_values) - 1) * q
+    lo, hi = math.floor(k), math.ceil(k)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def measure(backend: Backend, case: Case, repeat: int) -> dict:
+    h, w = case.frame.shape[:2]
+    if h * w > backend.max_pixels:
+        return {"skipped": f"frame larger than {backend.max_pixels} px"}
+    try:
+        result = backend.run(case)  # warm-up (lazy imports, caches)
+    except ImportError as e:
+        return {"skipped": str(e)}
+    correct = bool(backend.check(case, result))
+
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        backend.run(case)
+        times.append(time.perf_counter() - t0)
+    times.sort()
+
+    tracemalloc.start()
+    backend.run(case)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = sum(times)
+    return {
+        "p50_ms": _percentile(times, 0.50) * 1e3,
+        "p90_ms": _percentile(times, 0.90) * 1e3,
+        "p99_ms": _percentile(times, 0.99) * 1e3,
+        "max_ms": times[-1] * 1e3,
+        "mean_ms": statistics.fmean(times) * 1e3,
+        "fps": len(times) / total if total else float("inf"),
+        "mpix_s": len(times) * h * w / 1e6 / total if total else float("inf"),
+        "peak_kib": peak / 1024,
+        "correct": correct,
+    }
+
+
+def run(cases: List[Case], backends: List[str], repeat: int) -> dict:
+    results: dict = {}
+    for case in cases:
+        for name in backends:
+            stats = measure(BACKENDS[name], case, repeat)
+            results.setdefault(name, {})[case.name] = stats
+            if "skipped" in stats:
+                print(f"{name:18} {case.name:32} skipped ({stats['skipped']})")
+                continue
+            print(f"{name:18} {case.name:32} p50 {stats['p50_ms']:9.2f} ms  p99 {stats['p99_ms']:9.2f} ms  "
+                  f"{stats['fps']:8.1f} fps  {stats['mpix_s']:7.2f} Mpx/s  peak {stats['peak_kib']:9.0f} KiB  "
+                  f"{'ok' if stats['correct'] else 'MISMATCH'}")
+    return results
+
+
+def compare(results: dict, baseline: dict, max_ratio: float) -> List[str]:
+    """Return regressions: incorrect results or p50 slower than baseline by more than *max_ratio*."""
+    problems = []
+    for name, per_case in results.items():
+        for case, stats in per_case.items():
+            if "skipped" in stats:
+                continue
+            if not stats["correct"]:
+                problems.append(f"{name} / {case}: result does not match the reference")
+            base = baseline.get(name, {}).get(case)
+            if base and "p50_ms" in base and stats["p50_ms"] > base["p50_ms"] * max_ratio:
+                problems.append(f"{name} / {case}: p50 {stats['p50_ms']:.2f} ms vs baseline "
+                                f"{base['p50_ms']:.2f} ms (x{stats['p50_ms'] / base['p50_ms']:.2f})")
+    return problems
+
+
+def _size(text: str) -> Tuple[int, int]:
+    w, h = text.lower().split("x")
+    return int(w), int(h)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--backends", nargs="+", choices=sorted(BACKENDS), default=sorted(BACKENDS))
+    ap.add_argument("--sizes", nargs="+", type=_size, default=[(100, 100), (300, 500), (500, 500)])
+    ap.add_argument("--clusters", nargs="+", type=int, default=[1, 10])
+    ap.add_argument("--density", nargs="+", type=float, default=[0.01, 0.05])
+    ap.add_argument("--noise", nargs="+", type=int, default=[0, 3])
+    ap.add_argument("--speckle", type=float, default=0.001)
+    ap.add_argument("--target", nargs=3, type=int, default=[255, 0, 0])
+    ap.add_argument("--tolerance", type=int, default=5)
+    ap.add_argument("--corpus", type=Path, help="directory of captured frames to replay instead of synthetic ones")
+    ap.add_argument("--repeat", type=int, default=5, help="timed runs per backend and frame")
+    ap.add_argument("--json", type=Path, help="write the full results here")
+    ap.add_argument("--save-baseline", type=Path, help="store the results as the new baseline")
+    ap.add_argument("--baseline", type=Path, help="compare against this baseline")
+    ap.add_argument("--max-ratio", type=float, default=1.25, help="allowed p50 slowdown vs baseline")
+    args = ap.parse_args(argv)
+
+    if args.corpus:
+        cases = load_corpus(args.corpus, tuple(args.target), args.tolerance)
+    else:
+        cases = [make_frame(w, h, clusters=c, density=d, noise=n, speckle=args.speckle,
+                            target=tuple(args.target), tolerance=args.tolerance, seed=i)
+                 for i, ((w, h), c, d, n) in enumerate(
+                     (s, c, d, n) for s in args.sizes for c in args.clusters
+                     for d in args.density for n in args.noise)]
+
+    results = run(cases, args.backends, args.repeat)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(results, indent=2))
+    if args.baseline:
+        problems = compare(results, json.loads(args.baseline.read_text()), args.max_ratio)
+        for p in problems:
+            print(f"REGRESSION {p}")
+        return 1 if problems else 0
+    return 0 if all(s.get("correct", True) for r in results.values() for s in r.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
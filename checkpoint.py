@@ -0,0 +1,171 @@
+"""
+Checkpoints: where a long program was, so playback can pick up from there.
+
+The player writes its position (pass, script, iteration, action, reset
+counter, and for scripts with control flow the interpreter state) to
+``checkpoints/<program>.ckpt`` at the boundaries chosen by the
+``checkpoint_every`` setting, and once more when playback stops. A finished
+program removes its checkpoint. Each file records content hashes of the
+program and its scripts; :func:`load_resume` refuses a checkpoint taken
+with different ones.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from utils import BASE_DIR, SCRIPTS_DIR
+
+CHECKPOINT_DIR = BASE_DIR / "checkpoints"
+LEVELS = ("off", "script", "iteration", "action")  # each level includes the ones before it
+VERSION = 1
+
+_hashes: Dict[Path, Tuple[int, int, str]] = {}  # path -> (size, mtime_ns, digest)
+
+
+def checkpoint_path(program: str, directory: Path = CHECKPOINT_DIR) -> Path:
+    """Checkpoint of a program: ``my_program.json`` -> ``checkpoints/my_program.ckpt``."""
+    return directory / (Path(program).stem + ".ckpt")
+
+
+def file_hash(path: Path) -> str:
+    """SHA-256 of a file, remembered until its size or modification time changes."""
+    st = path.stat()
+    known = _hashes.get(path)
+    if known and known[:2] == (st.st_size, st.st_mtime_ns):
+        return known[2]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    _hashes[path] = (st.st_size, st.st_mtime_ns, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def fingerprint(sequence: Sequence[Tuple[str, int]], scripts_dir: Path = SCRIPTS_DIR) -> dict:
+    """Content hashes of a program (its normalized sequence) and of each of its scripts."""
+    program = hashlib.sha256(json.dumps([list(entry) for entry in sequence]).encode()).hexdigest()
+    return {"program": program,
+            "scripts": {name: file_hash(scripts_dir / name) for name in dict.fromkeys(n for n, _ in sequence)}}
+
+
+def write_atomic(path: Path, data: bytes, sync: bool = False):
+    """Replace *path* with *data*: readers see the old file or the new one, never a partial write."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        if sync:  # survive power loss too, not only a crash of this process
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Checkpointer:
+    """
+    Writes a program's position to *path*.
+
+    :meth:`reached` is called at every boundary; positions are written at
+    the levels up to *every* (see ``LEVELS``), per-action ones at most once
+    per *interval* seconds. :meth:`save` writes unconditionally.
+    """
+
+    def __init__(self, path: Path, program: str, sequence: Sequence[Tuple[str, int]], every: str = "iteration",
+                 interval: float = 1.0, clock: Callable[[], float] = time.monotonic, sync: bool = False,
+                 scripts_dir: Path = SCRIPTS_DIR):
+        if every not in LEVELS:
+            raise ValueError(f"checkpoint level must be one of {', '.join(LEVELS)}, got {every!r}")
+        self.path = Path(path)
+        self.program = program
+        self.level = LEVELS.index(every)
+        self.interval = interval
+        self.clock = clock
+        self.sync = sync
+        self.hashes = fingerprint(sequence, scripts_dir)
+        self.writes = 0
+        self._last = float("-inf")
+
+    def reached(self, level: str, position: Callable[[], dict]):
+        """At a *level* boundary: write ``position()`` if that level is checkpointed."""
+        index = LEVELS.index(level)
+        if index > self.level:
+            return
+        now = self.clock()
+        if index == len(LEVELS) - 1 and now - self._last < self.interval:
+            return
+        self._last = now
+        self.save(position())
+
+    def save(self, position: dict):
+        record = {"version": VERSION, "name": self.program, "saved_at": time.time(), **self.hashes,
+                  "position": position}
+        try:
+            write_atomic(self.path, json.dumps(record, separators=(",", ":")).encode(), self.sync)
+            self.writes += 1
+        except OSError as e:
+            print(f"Failed to write checkpoint {self.path}: {e}")
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+def load_resume(program: str, sequence: Sequence[Tuple[str, int]], path: Optional[Path] = None,
+                scripts_dir: Path = SCRIPTS_DIR) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    The position to resume *program* from, and None; or None and why there
+    is none (no checkpoint, unreadable, or the program or a script changed).
+    """
+    path = path or checkpoint_path(program)
+    try:
+        record = json.loads(path.read_text())
+    except FileNotFoundError:
+        return None, "no checkpoint"
+    except (OSError, ValueError) as e:
+        return None, f"unreadable checkpoint {path.name}: {e}"
+    if not isinstance(record, dict) or record.get("version") != VERSION or "position" not in record:
+        return None, f"unsupported checkpoint {path.name}"
+    try:
+        current = fingerprint(sequence, scripts_dir)
+    except OSError as e:
+        return None, f"cannot hash the scripts: {e}"
+    if record.get("program") != current["program"]:
+        return None, "the program changed since the checkpoint"
+    changed: List[str] = [name for name, digest in current["scripts"].items()
+                          if record.get("scripts", {}).get(name) != digest]
+    if changed:
+        return None, "changed since the checkpoint: " + ", ".join(changed)
+    position = record["position"]
+    if not isinstance(position, dict) or not _valid_position(position):
+        return None, f"malformed position in {path.name}"
+    index = position.get("script_index", 0)
+    if not 0 <= index < len(sequence) or not 0 <= position.get("iteration", 0) < sequence[index][1]:
+        return None, "checkpoint position is outside the program"
+    return position, None
+
+
+def _count(value) -> bool:
+    return type(value) is int and value >= 0
+
+
+def _valid_position(position: dict) -> bool:
+    """Field types and signs; the script's own bounds are checked when it is opened."""
+    if not all(_count(position.get(k, 0)) for k in
+               ("passes_completed", "script_index", "iteration", "action_index", "reset_counter")):
+        return False
+    flow = position.get("flow")
+    if flow is None:
+        return True
+    return (isinstance(flow, dict) and _count(flow.get("pc")) and type(flow.get("miss")) is int
+            and flow["miss"] >= -1 and isinstance(flow.get("calls"), list) and all(map(_count, flow["calls"]))
+            and isinstance(flow.get("counters"), list) and all(type(c) is int for c in flow["counters"]))
+
+
+def describe(position: dict, sequence: Sequence[Tuple[str, int]]) -> str:
+    """Where *position* is, for a resume prompt."""
+    name, iterations = sequence[position.get("script_index", 0)]
+    return (f"{name}, iteration {position.get('iteration', 0) + 1}/{iterations}, "
+            f"action {position.get('action_index', 0) + 1} (pass {position.get('passes_completed', 0) + 1})")
@@ -0,0 +1,387 @@
+"""Headless command-line runner (no Tk).
+
+    python main.py run my_program --speed 1.5 --iterations 3
+    python main.py run my_program --checkpoint iteration --resume
+    python main.py supervise my_program --workers 4 --stdin-control
+    python main.py list
+
+Progress is written to stdout as JSON lines; everything the player prints
+goes to stderr. The exit code tells how playback ended (see EXIT_CODES).
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import signal
+import sys
+import threading
+import time
+
+from checkpoint import LEVELS, describe, load_resume
+from script_manager import ScriptManager
+from utils import load_settings, SETTINGS_PATH
+
+EXIT_CODES = {
+    "completed": 0,
+    "error": 1,
+    # 2 is argparse's usage error
+    "user": 3,
+    "reset_limit": 4,
+}
+
+
+class JsonLinesProgress:
+    """Progress callback writing one JSON object per line, at most every *interval* seconds."""
+
+    def __init__(self, out, interval: float = 0.0):
+        self._out = out
+        self._interval = interval
+        self._last = 0.0
+
+    def emit(self, event: str, **fields):
+        fields = {"event": event, "time": round(time.time(), 3), **fields}
+        self._out.write(json.dumps(fields) + "\n")
+        self._out.flush()
+
+    def __call__(self, info: dict):
+        now = time.monotonic()
+        if self._interval and now - self._last < self._interval and not info.get("is_stopped"):
+            return
+        self._last = now
+        self.emit("progress", **info)
+
+
+def player_options(settings: dict) -> dict:
+    """ActionPlayer keyword arguments that come from the settings (shared by ``run``, ``supervise`` and the GUI)."""
+    return dict(
+        failure_frames=settings["failure_frames"],
+        failure_budget=int(settings["failure_budget_mb"] * (1 << 20)),
+        detect_mode=settings["detect_mode"],
+        vision_service=settings["vision_service"],
+        template_downscale=settings["template_downscale"] or None,
+        track_frames=settings["track_frames"],
+        track_interval=settings["track_interval"],
+        max_extrapolation=settings["max_extrapolation"],
+        anchor=settings["anchor"],
+        learn_roi=settings["learn_roi"],
+        fast_path=settings["fast_path"],
+        probe_radius=settings["probe_radius"],
+        probe_min=settings["probe_min"],
+        detect_lookahead=settings["detect_lookahead"],
+    )
+
+
+def _load_program(mgr: ScriptManager, program: str, report):
+    """The program's (script, iterations) list, or None after reporting why it cannot run."""
+    try:
+        sequence = mgr.normalize_program(mgr.load_program(program))
+    except (OSError, ValueError) as e:
+        report("error", message=f"Failed to load program {program}: {e}")
+        print(f"Failed to load program {program}: {e}", file=sys.stderr)
+        return None
+    missing = mgr.missing_scripts(sequence)
+    if missing:
+        report("error", message="missing scripts", scripts=missing)
+        print("Missing scripts: " + ", ".join(missing), file=sys.stderr)
+        return None
+    errors = mgr.control_flow_errors(sequence)
+    if errors:
+        report("error", message="scripts do not compile", errors=errors)
+        print("Scripts do not compile:\n  " + "\n  ".join(errors), file=sys.stderr)
+        return None
+    return sequence
+
+
+def _checked_options(settings: dict, args, report):
+    """player_options() with the --anchor override, or None after reporting a bad anchor."""
+    options = player_options(settings)
+    if args.anchor:
+        options["anchor"] = {"mode": "fixed", "point": args.anchor}
+    try:
+        from anchor import check_anchor
+        check_anchor(options["anchor"])
+    except ValueError as e:
+        report("error", message=f"Bad anchor setting: {e}")
+        print(f"Bad anchor setting: {e}", file=sys.stderr)
+        return None
+    return options
+
+
+def _point(text: str):
+    try:
+        x, y = (int(v) for v in text.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected X,Y, got {text!r}")
+    return [x, y]
+
+
+def _program_name(name: str) -> str:
+    return name if name.endswith(".json") else name + ".json"
+
+
+def cmd_list(args) -> int:
+    mgr = ScriptManager()
+    for name in mgr.list_programs():
+        print(name[:-5])
+    return 0
+
+
+def cmd_run(args) -> int:
+    from player import ActionPlayer, to_key
+
+    settings = load_settings(args.settings)
+    speed = args.speed if args.speed is not None else settings["replay_speed"]
+    loop = args.loop if args.loop is not None else settings["loop_until_stopped"]
+    # One pass unless looping; --iterations caps looping too
+    max_passes = args.iterations if args.iterations is not None else (None if loop else 1)
+
+    out = sys.stdout
+    progress = JsonLinesProgress(out, args.progress_interval) if args.progress == "jsonl" else None
+
+    def report(event, **fields):
+        if progress:
+            progress.emit(event, **fields)
+
+    program = _program_name(args.program)
+    sequence = _load_program(ScriptManager(), program, report)
+    options = _checked_options(settings, args, report)
+    if sequence is None or options is None:
+        return EXIT_CODES["error"]
+    if args.detect_mode:
+        options["detect_mode"] = args.detect_mode
+    if args.vision_service is not None:
+        options["vision_service"] = args.vision_service
+    resume = None
+    if args.resume:
+        resume, problem = load_resume(program, sequence)
+        if resume is not None:
+            report("resume", position=resume)
+            print(f"Resuming {program} at {describe(resume, sequence)}", file=sys.stderr)
+        elif problem == "no checkpoint":
+            print(f"No checkpoint for {program}, starting from the beginning", file=sys.stderr)
+        else:
+            report("error", message=f"cannot resume: {problem}")
+            print(f"Cannot resume {program}: {problem}", file=sys.stderr)
+            return EXIT_CODES["error"]
+    player = ActionPlayer(
+        speed=speed,
+        pause_key=to_key(settings["pause_key"], None) if args.hotkeys else None,
+        stop_key=settings["replay_stop_key"], skip_pause_key=settings["skip_pause_key"],
+        loop_until_stopped=True, progress_callback=progress,
+        max_passes=max_passes, hotkeys=args.hotkeys,
+        checkpoint_every=args.checkpoint or settings["checkpoint_every"],
+        checkpoint_interval=settings["checkpoint_interval"],
+        **options,
+    )
+    player.pause_flag = args.start_paused
+
+    def on_signal(signum, frame):
+        player.stop_playback()
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    if args.trace:
+        from instrument import TRACER, sink_for_path
+        TRACER.add_sink(sink_for_path(args.trace))
+
+    report("start", program=program, speed=speed, max_passes=max_passes, scripts=sequence)
+    started = time.monotonic()
+    try:
+        # Keep stdout clean for the JSON lines
+        with contextlib.redirect_stdout(sys.stderr):
+            player.replay_program(sequence, program=program, resume=resume)
+    except Exception as e:
+        report("error", message=str(e))
+        print(f"Playback failed: {e}", file=sys.stderr)
+        return EXIT_CODES["error"]
+    finally:
+        if args.trace:
+            TRACER.close()
+    reason = player.stop_reason or "completed"
+    timing = player.timing.summary()
+    report("end", stop_reason=reason, passes_completed=player.passes_completed,
+           elapsed=round(time.monotonic() - started, 3),
+           drift={k: round(timing[k], 4) for k in ("mean_drift", "p95_drift", "max_drift")},
+           detect_cache=player.detector.stats(), tracking=player.tracker.stats(), anchor=player.anchors.stats(),
+           fast_path=player.probe_stats(),
+           **({"lookahead": player.engine.stats()} if player.engine.lookahead else {}),
+           **({"checkpoints": player.checkpointer.writes} if player.checkpointer else {}),
+           **({"vision": player.vision.stats()} if player.vision else {}),
+           **({"roi": player.roi.stats()} if player.roi else {}))
+    if args.timing:
+        try:
+            player.timing.export(args.timing)
+        except OSError as e:
+            print(f"Failed to write timing report {args.timing}: {e}", file=sys.stderr)
+    return EXIT_CODES.get(reason, EXIT_CODES["error"])
+
+
+def _parse_command(line: str):
+    """``pause [N]``, ``resume [N]`` or ``stop [N]`` -> (command, worker index or None)."""
+    parts = line.split()
+    if not parts or parts[0] not in ("pause", "resume", "stop") or len(parts) > 2:
+        return None
+    try:
+        return parts[0], int(parts[1]) if len(parts) == 2 else None
+    except ValueError:
+        return None
+
+
+def cmd_supervise(args) -> int:
+    from supervisor import Supervisor, WorkerSpec, plan_cpus
+
+    settings = load_settings(args.settings)
+    speed = args.speed if args.speed is not None else settings["replay_speed"]
+    progress = JsonLinesProgress(sys.stdout) if args.progress == "jsonl" else None
+
+    def report(event, **fields):
+        if progress:
+            progress.emit(event, **fields)
+
+    mgr = ScriptManager()
+    program = _program_name(args.program)
+    sequence = _load_program(mgr, program, report)
+    options = _checked_options(settings, args, report)
+    if sequence is None or options is None:
+        return EXIT_CODES["error"]
+    if args.detect_mode:
+        options["detect_mode"] = args.detect_mode
+
+    displays = args.displays or [f":{args.first_display + i}" for i in range(args.workers)]
+    cpus = plan_cpus(len(displays)) if args.affinity else [()] * len(displays)
+    sup = Supervisor(
+        sequence, mgr.preload(name for name, _ in sequence),
+        [WorkerSpec(d, c) for d, c in zip(displays, cpus)], options,
+        speed=speed, max_passes=args.iterations, start_paused=args.start_paused,
+        xvfb=args.xvfb, screen=args.screen, launch=args.launch,
+    )
+
+    def on_signal(signum, frame):
+        sup.stop()
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    def read_commands():
+        for line in sys.stdin:
+            parsed = _parse_command(line)
+            if parsed is None:
+                print(f"Unknown command {line.strip()!r} (pause|resume|stop [worker])", file=sys.stderr)
+                continue
+            command, index = parsed
+            if index is not None and not 0 <= index < len(displays):
+                print(f"No worker {index}", file=sys.stderr)
+                continue
+            getattr(sup, command)(index)
+
+    report("start", program=program, workers=[{"display": d, "cpus": list(c)} for d, c in zip(displays, cpus)])
+    try:
+        sup.start()
+    except (OSError, RuntimeError) as e:
+        report("error", message=str(e))
+        print(f"Failed to start workers: {e}", file=sys.stderr)
+        return EXIT_CODES["error"]
+    if args.stdin_control:
+        threading.Thread(target=read_commands, daemon=True).start()
+
+    last = 0.0
+    try:
+        while sup.running or any(w.result is None for w in sup.workers):
+            for index, kind, fields in sup.poll(0.25):
+                if kind != "progress":
+                    report(kind, worker=index, **fields)
+            now = time.monotonic()
+            if now - last >= args.progress_interval:
+                last = now
+                report("progress", **sup.progress())
+    finally:
+        sup.close()
+    results = [w.result or {} for w in sup.workers]
+    report("end", **sup.progress())
+    codes = [EXIT_CODES.get(r.get("stop_reason", "error"), EXIT_CODES["error"]) for r in results]
+    return max(codes, default=0)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="toolforge", description="Run ToolForge programs without the GUI.")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="replay a program")
+    run.add_argument("program", help="program name (with or without .json)")
+    run.add_argument("--speed", type=float, help="delay multiplier (default: replay_speed setting)")
+    run.add_argument("--loop", dest="loop", action="store_true", default=None,
+                     help="repeat the program until stopped")
+    run.add_argument("--no-loop", dest="loop", action="store_false", help="run the program once")
+    run.add_argument("--iterations", type=int, help="number of passes over the program")
+    run.add_argument("--settings", default=SETTINGS_PATH, help="settings file to read overrides from")
+    run.add_argument("--start-paused", action="store_true", help="wait for the pause key before starting")
+    run.add_argument("--no-hotkeys", dest="hotkeys", action="store_false",
+                     help="do not listen for pause/stop/skip keys")
+    run.add_argument("--progress", choices=("jsonl", "none"), default="jsonl", help="progress output format")
+    run.add_argument("--progress-interval", type=float, default=0.0,
+                     help="minimum seconds between progress lines")
+    run.add_argument("--trace", metavar="FILE",
+                     help="record hot-path spans: Chrome trace for *.json, JSON Lines otherwise")
+    run.add_argument("--timing", metavar="FILE",
+                     help="write scheduled vs. actual action times: CSV for *.csv, JSON otherwise")
+    run.add_argument("--detect-mode", choices=("full", "tiles", "parallel"),
+                     help="color detection: relabel every frame, only changed tiles, "
+                          "or tiles on a process pool (default: setting)")
+    run.add_argument("--vision-service", dest="vision_service", action="store_true", default=None,
+                     help="capture and detect colors in a separate process")
+    run.add_argument("--no-vision-service", dest="vision_service", action="store_false",
+                     help="capture and detect colors in the playback process")
+    run.add_argument("--checkpoint", choices=LEVELS,
+                     help="checkpoint the position at every script, iteration or action "
+                          "(default: checkpoint_every setting)")
+    run.add_argument("--resume", action="store_true",
+                     help="continue from the program's last checkpoint, if its program and scripts are unchanged")
+    run.add_argument("--anchor", type=_point, metavar="X,Y",
+                     help="pick matches closest to this fixed point (default: anchor setting)")
+    run.set_defaults(func=cmd_run)
+
+    sup = sub.add_parser("supervise", help="replay a program on several displays at once")
+    sup.add_argument("program", help="program name (with or without .json)")
+    sup.add_argument("--workers", type=int, default=2, help="number of player processes")
+    sup.add_argument("--displays", nargs="+", metavar="DISPLAY",
+                     help="X displays to use (default: --workers displays from --first-display)")
+    sup.add_argument("--first-display", type=int, default=10, help="first display number (default :10)")
+    sup.add_argument("--no-xvfb", dest="xvfb", action="store_false",
+                     help="use running X servers instead of starting Xvfb")
+    sup.add_argument("--screen", default="1920x1080x24", help="Xvfb screen geometry WxHxDEPTH")
+    sup.add_argument("--launch", metavar="COMMAND", help="application to start on every display")
+    sup.add_argument("--no-affinity", dest="affinity", action="store_false",
+                     help="do not pin workers to disjoint CPU sets")
+    sup.add_argument("--speed", type=float, help="delay multiplier (default: replay_speed setting)")
+    sup.add_argument("--iterations", type=int, default=1, help="passes over the program per worker")
+    sup.add_argument("--settings", default=SETTINGS_PATH, help="settings file to read overrides from")
+    sup.add_argument("--start-paused", action="store_true", help="start workers paused (resume via stdin)")
+    sup.add_argument("--stdin-control", action="store_true",
+                     help="read 'pause|resume|stop [worker]' commands from stdin")
+    sup.add_argument("--progress", choices=("jsonl", "none"), default="jsonl", help="progress output format")
+    sup.add_argument("--progress-interval", type=float, default=1.0,
+                     help="seconds between aggregate progress lines")
+    sup.add_argument("--detect-mode", choices=("full", "tiles", "parallel"),
+                     help="color detection mode (default: setting)")
+    sup.add_argument("--anchor", type=_point, metavar="X,Y",
+                     help="pick matches closest to this fixed point (default: anchor setting)")
+    sup.set_defaults(func=cmd_supervise)
+
+    lst = sub.add_parser("list", help="list saved programs")
+    lst.set_defaults(func=cmd_list)
+    return ap
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    # Started paused, playback waits for a resume that nothing could send
+    if args.command == "run" and args.start_paused and not args.hotkeys:
+        parser.error("--start-paused waits for the pause key, so it cannot be used with --no-hotkeys")
+    if args.command == "supervise" and args.start_paused and not args.stdin_control:
+        parser.error("--start-paused needs --stdin-control to resume the workers")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Control flow in scripts: labels, jumps, detection branches, loops and subroutines.
+
+A script is normally a flat list of actions, replayed top to bottom and
+restarted from the top when a color/template target is missing. Entries with
+an ``"op"`` key change that (see ``actions.ControlOp``):
+
+    {"op": "label", "name": "menu"}
+    {"op": "if_missing", "to": "menu", "color": [255, 0, 0], "color_area": [0, 0, 300, 200]}
+    {"op": "if_found", "to": "done", "template": "<base64 PNG>", "color_area": [...]}
+    {"op": "on_miss", "to": "recover"}     # a missed target jumps there instead of restarting
+    {"op": "repeat", "count": 5} ... {"op": "end_repeat"}
+    {"op": "call", "to": "collect"} ... {"op": "return"}
+    {"op": "jump", "to": "menu"}
+    {"op": "end"}                          # end of this pass (subroutines go after it)
+
+:func:`compile_script` turns such a script into a :class:`CompiledScript`:
+an ``array('i')`` of ``(opcode, a, b)`` triples plus the action and condition
+tables they index, which the playback engine runs in a small dispatch loop.
+"""
+from __future__ import annotations
+
+from array import array
+from typing import Dict, List, Sequence
+
+from actions import Action, ActionType, ControlOp, MouseAction
+
+# Opcodes (instruction = opcode, a, b); the ones that take time come first
+ACT = 0  # run actions[a]
+CHECK = 1  # look for conditions[a]; jump to b if found
+CHECK_NOT = 2  # look for conditions[a]; jump to b if not found
+JUMP = 3  # go to a
+ON_MISS = 4  # missed targets go to a from now on (-1 = restart the pass)
+SET = 5  # counters[a] = b
+LOOP = 6  # counters[b] -= 1; go to a while it is above zero
+CALL = 7  # push the next instruction, go to a
+RET = 8  # go to the popped instruction (end of pass if the stack is empty)
+END = 9  # end of pass
+
+MAX_CALL_DEPTH = 256
+
+
+class CompiledScript:
+    """
+    A script with control flow, ready for playback.
+
+    ``code`` holds three ints per instruction; ``lines`` the index of the
+    script entry each instruction came from (shown as the action number
+    while it runs). Like the other script types it has ``close()`` and a
+    length (the number of entries).
+    """
+
+    __slots__ = ("code", "lines", "actions", "conditions", "counters", "labels", "entries")
+
+    def __init__(self, code: array, lines: array, actions: tuple, conditions: tuple, counters: int,
+                 labels: Dict[str, int], entries: int):
+        self.code = code
+        self.lines = lines
+        self.actions = actions
+        self.conditions = conditions
+        self.counters = counters  # number of repeat counters
+        self.labels = labels  # label -> instruction index
+        self.entries = entries
+
+    def __len__(self):
+        return self.entries
+
+    def close(self):
+        pass
+
+
+def _condition(op: ControlOp) -> MouseAction:
+    if op.color_area is None or (op.color is None and op.template is None):
+        raise ValueError("needs color_area and a color or template")
+    x, y, w, h = op.color_area
+    # Searched like a mouse action's target; the recorded position (for the
+    # fast path) is the area's centre
+    return MouseAction(op.timestamp, "Button.left", (x + w // 2, y + h // 2), color_toggle=True,
+                       color=tuple(op.color) if op.color is not None else None, color_area=tuple(op.color_area),
+                       color_tolerance=op.color_tolerance, template=op.template,
+                       match_threshold=op.match_threshold, delay_randomization=op.delay_randomization,
+                       delay_min_multiplier=op.delay_min_multiplier, delay_max_multiplier=op.delay_max_multiplier)
+
+
+def compile_script(entries: Sequence[Action], name: str = "script") -> CompiledScript:
+    """Compile *entries* (actions and ControlOps); raises ValueError naming the bad entry."""
+    code = array("i")
+    lines = array("i")
+    actions: List[Action] = []
+    conditions: List[MouseAction] = []
+    labels: Dict[str, int] = {}
+    fixups = []  # (code position, label, entry index)
+    repeats = []  # open repeat blocks: (body start, counter, entry index)
+    counters = 0
+
+    def emit(line: int, op: int, a: int = 0, b: int = 0):
+        code.extend((op, a, b))
+        lines.append(line)
+
+    for i, entry in enumerate(entries):
+        if entry.type != ActionType.CONTROL:
+            emit(i, ACT, len(actions))
+            actions.append(entry)
+            continue
+        op = entry.op
+        try:
+            if op == "label":
+                if not entry.name:
+                    raise ValueError("label needs a name")
+                if entry.name in labels:
+                    raise ValueError(f"duplicate label {entry.name!r}")
+                labels[entry.name] = len(lines)
+            elif op in ("jump", "call", "if_found", "if_missing", "on_miss"):
+                if entry.to is None and op != "on_miss":
+                    raise ValueError(f"{op} needs a target label ('to')")
+                if op in ("if_found", "if_missing"):
+                    emit(i, CHECK if op == "if_found" else CHECK_NOT, len(conditions))
+                    conditions.append(_condition(entry))
+                    slot = len(code) - 1
+                else:
+                    emit(i, {"jump": JUMP, "call": CALL, "on_miss": ON_MISS}[op], -1)
+                    slot = len(code) - 2
+                if entry.to is not None:
+                    fixups.append((slot, entry.to, i))
+            elif op == "repeat":
+                if int(entry.count) < 1:
+                    raise ValueError("repeat count must be at least 1")
+                emit(i, SET, counters, int(entry.count))
+                repeats.append((len(lines), counters, i))
+                counters += 1
+            elif op == "end_repeat":
+                if not repeats:
+                    raise ValueError("end_repeat without repeat")
+                start, counter, _ = repeats.pop()
+                emit(i, LOOP, start, counter)
+            elif op == "return":
+                emit(i, RET)
+            elif op == "end":
+                emit(i, END)
+            else:
+                raise ValueError(f"unknown op {op!r}")
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{name}, entry {i + 1}: {e}") from None
+
+    if repeats:
+        raise ValueError(f"{name}, entry {repeats[-1][2] + 1}: repeat without end_repeat")
+    for slot, label, i in fixups:
+        if label not in labels:
+            raise ValueError(f"{name}, entry {i + 1}: unknown label {label!r}")
+        code[slot] = labels[label]
+    return CompiledScript(code, lines, tuple(actions), tuple(conditions), counters, labels, len(entries))
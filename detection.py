@@ -0,0 +1,118 @@
+"""Color detection for playback: memoized on frame content."""
+from __future__ import annotations
+
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+from instrument import TRACER
+from utils import find_color_connected_clusters
+
+
+class DetectionCache:
+    """
+    LRU memo of ``find_color_connected_clusters`` keyed by frame content.
+
+    The key is a BLAKE2b digest of the frame bytes and shape plus the search
+    parameters, so a pixel-identical capture (idle screens, menus, retries)
+    returns the previous clusters without relabeling. Entries are evicted
+    oldest-first once there are more than *max_entries* or their estimated
+    size exceeds *max_bytes*. Misses go to *detect* (same signature as
+    ``find_color_connected_clusters``, which is the default).
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 4 << 20, detect: Optional[Callable] = None):
+        self.detect = detect or find_color_connected_clusters
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(frame, color, tolerance: int, min_cluster_size: int, offset=(0, 0)) -> tuple:
+        import numpy as np
+
+        arr = np.ascontiguousarray(frame)
+        digest = hashlib.blake2b(arr, digest_size=16).digest()
+        return digest, arr.shape, tuple(color), tolerance, min_cluster_size, tuple(offset)
+
+    @staticmethod
+    def _size(clusters) -> int:
+        return sys.getsizeof(clusters) + 64 * len(clusters) + 200  # list + tuples + key
+
+    def find(self, frame, color: Tuple[int, int, int], *, offset: Tuple[int, int] = (0, 0),
+             tolerance: int = 10, min_cluster_size: int = 5) -> List[Tuple[int, int]]:
+        """Clusters of *color* in *frame* ((H, W, 3) array), from the cache when seen before."""
+        with TRACER.span("hash"):
+            k = self.key(frame, color, tolerance, min_cluster_size, offset)
+        with self._lock:
+            hit = self._entries.get(k)
+            if hit is not None:
+                self._entries.move_to_end(k)
+                self.hits += 1
+                TRACER.counter("detect_cache", hits=self.hits, misses=self.misses)
+                return list(hit)
+            self.misses += 1
+        clusters = self.detect(frame, color, offset=offset, tolerance=tolerance,
+                               min_cluster_size=min_cluster_size)
+        if self.max_entries and self.max_bytes:
+            self._store(k, tuple(clusters))
+        TRACER.counter("detect_cache", hits=self.hits, misses=self.misses)
+        return clusters
+
+    def _store(self, k, clusters: tuple):
+        size = self._size(clusters)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if k in self._entries:
+                return
+            self._entries[k] = clusters
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self._bytes -= self._size(old)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def close(self):
+        """Release what the detector holds (the process pool and shared memory of ``"parallel"``)."""
+        owner = getattr(self.detect, "__self__", None)
+        if hasattr(owner, "close"):
+            owner.close()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self._entries), "bytes": self._bytes,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+def make_detector(mode: str = "full", cache_entries: int = 256) -> DetectionCache:
+    """
+    Detection for the player: ``"full"`` relabels every frame, ``"tiles"``
+    re-labels only the tiles that changed since the previous capture and
+    ``"parallel"`` labels large frames tile by tile on a process pool.
+    """
+    if mode == "tiles":
+        from tiles import TileDetector
+        return DetectionCache(cache_entries, detect=TileDetector().find)
+    if mode == "parallel":
+        from tiles import ParallelTileDetector
+        return DetectionCache(cache_entries, detect=ParallelTileDetector().find)
+    if mode != "full":
+        raise ValueError(f"unknown detect mode {mode!r}")
+    return DetectionCache(cache_entries)
@@ -0,0 +1,148 @@
+"""
+Recent color-search frames, kept in memory and written out only on failure.
+
+    python -m diagnostics retune diagnostics/20250101-120000 --tolerance 0 2 5 10
+
+re-runs the color search on every dumped frame with other tolerances, so a
+better ``color_tolerance`` can be found without replaying the program.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from utils import DIAGNOSTICS_DIR
+
+
+@dataclass
+class _Frame:
+    seq: int
+    shape: tuple
+    pixels: bytes  # zlib-compressed RGB
+    mask: bytes  # zlib-compressed packed bits
+    meta: dict = field(default_factory=dict)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.pixels) + len(self.mask)
+
+
+class FrameRing:
+    """
+    The last *max_frames* captured color areas, compressed, at most *budget* bytes.
+
+    Each entry holds the frame, the mask of pixels within tolerance and the
+    search result. Nothing touches the disk until :meth:`dump`, which writes
+    the frames not dumped before into one directory per playback.
+    """
+
+    def __init__(self, max_frames: int = 32, budget: int = 16 << 20, directory: Path | str = DIAGNOSTICS_DIR):
+        self.max_frames = max_frames
+        self.budget = budget
+        self.directory = Path(directory)
+        self._frames: deque = deque()
+        self._bytes = 0
+        self._seq = 0
+        self._dumped_seq = 0
+        self._session: Optional[Path] = None
+
+    def __len__(self):
+        return len(self._frames)
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def new_session(self):
+        """Start a new dump directory (called when playback starts)."""
+        self._session = None
+
+    def add(self, frame, color, tolerance: int, clusters, **meta):
+        """Store *frame* ((H, W, 3) uint8 array) with its match mask and search result."""
+        if not self.max_frames or not self.budget:
+            return
+        import numpy as np
+
+        arr = np.ascontiguousarray(frame, dtype=np.uint8)[..., :3]
+        if color is None:
+            mask = np.zeros(arr.shape[:2], dtype=bool)
+        else:
+            diff = np.abs(arr.astype(np.int16) - np.asarray(color, dtype=np.int16))
+            mask = np.all(diff <= tolerance, axis=-1)
+        self._seq += 1
+        entry = _Frame(
+            self._seq, arr.shape,
+            zlib.compress(arr.tobytes(), 1),
+            zlib.compress(np.packbits(mask).tobytes(), 1),
+            dict(meta, time=time.time(), color=list(color) if color is not None else None, tolerance=tolerance,
+                 matches=int(mask.sum()), clusters=[list(c) for c in clusters or ()]),
+        )
+        if entry.nbytes > self.budget:
+            return
+        self._frames.append(entry)
+        self._bytes += entry.nbytes
+        while len(self._frames) > self.max_frames or self._bytes > self.budget:
+            self._bytes -= self._frames.popleft().nbytes
+
+    def dump(self, reason: str) -> Optional[Path]:
+        """Write buffered frames not yet on disk; returns the directory (None if nothing new)."""
+        new = [f for f in self._frames if f.seq > self._dumped_seq]
+        if not new:
+            return None
+        import numpy as np
+        from PIL import Image
+
+        if self._session is None:
+            self._session = self.directory / time.strftime("%Y%m%d-%H%M%S")
+            self._session.mkdir(parents=True, exist_ok=True)
+        with open(self._session / "index.jsonl", "a") as index:
+            for f in new:
+                h, w = f.shape[:2]
+                pixels = np.frombuffer(zlib.decompress(f.pixels), dtype=np.uint8).reshape(f.shape)
+                mask = np.unpackbits(np.frombuffer(zlib.decompress(f.mask), dtype=np.uint8))[:h * w]
+                Image.fromarray(pixels).save(self._session / f"{f.seq:06d}.png")
+                Image.fromarray((mask.reshape(h, w) * 255).astype(np.uint8)).save(self._session / f"{f.seq:06d}_mask.png")
+                index.write(json.dumps({"seq": f.seq, "reason": reason, **f.meta}) + "\n")
+        self._dumped_seq = new[-1].seq
+        return self._session
+
+
+def retune(directory: Path, tolerances, min_cluster_size: int = 5):
+    """Print the clusters found on each dumped frame for every tolerance in *tolerances*."""
+    from utils import find_color_connected_clusters
+
+    for line in (directory / "index.jsonl").read_text().splitlines():
+        meta = json.loads(line)
+        if meta["color"] is None:  # template match
+            continue
+        frame = directory / f"{meta['seq']:06d}.png"
+        found = []
+        for tol in tolerances:
+            clusters = find_color_connected_clusters(frame, tuple(meta["color"]), tolerance=tol,
+                                                     min_cluster_size=min_cluster_size)
+            found.append(f"tol {tol}: {len(clusters)}")
+        print(f"{frame.name} {meta.get('reason', '')} color {tuple(meta['color'])} "
+              f"(recorded tol {meta['tolerance']}, {len(meta['clusters'])} clusters) -> " + ", ".join(found))
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m diagnostics", description="Inspect dumped color-search frames.")
+    sub = ap.add_subparsers(dest="command", required=True)
+    rt = sub.add_parser("retune", help="re-run the color search with other tolerances")
+    rt.add_argument("directory", type=Path)
+    rt.add_argument("--tolerance", type=int, nargs="+", default=[0, 1, 2, 5, 10, 20])
+    rt.add_argument("--min-cluster-size", type=int, default=5)
+    args = ap.parse_args(argv)
+    retune(args.directory, args.tolerance, args.min_cluster_size)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
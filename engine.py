@@ -0,0 +1,572 @@
+"""
+asyncio playback engine behind ``ActionPlayer``.
+
+Each action is a coroutine: its delay, its detection (run in an executor
+thread, off the event loop) and the control flags (pause, stop, skip) are
+awaited together, so a stop request ends a wait at once instead of at the
+next poll. ``ActionPlayer.replay_program`` runs one engine on a fresh event
+loop; :func:`run_programs` drives several players from one process:
+
+    run_programs([(player_a, [("a.json", 3)]), (player_b, [("b.json", 1)])])
+
+With *lookahead*, the color or template search of a mouse action starts
+shortly before its delay is over (up to the average detection time, capped
+at *max_lookahead*), so the click lands closer to the scheduled time.
+
+A player built with ``inline=True`` (the benchmarks' virtual clock, tests)
+runs *inline*: handlers are called on the loop thread and waits go through
+the player's own ``_sleep``, since real timeouts would stall a virtual clock.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import random
+from concurrent.futures import ThreadPoolExecutor
+from operator import length_hint
+from typing import List, Optional, Sequence, Tuple
+
+from actions import ActionType, MouseAction
+from control import ACT, CALL, CHECK, CHECK_NOT, JUMP, LOOP, MAX_CALL_DEPTH, ON_MISS, RET, SET, CompiledScript
+from instrument import TRACER
+
+_PENDING = object()  # no prefetched target: search when the action is due
+
+
+class PlaybackEngine:
+    def __init__(self, player, lookahead: bool = False, max_lookahead: float = 0.5):
+        self.player = player
+        self.lookahead = lookahead
+        self.max_lookahead = max_lookahead
+        self.detect_estimate = 0.0  # running average of the search time of color/template actions
+        self.prefetched = 0
+        self.prefetch_misses = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._changed: Optional[asyncio.Event] = None  # set whenever a control flag changes
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._depth = 0
+        # Clock, elapsed_time and paused_time when the pass began, or when it
+        # went on after a missed target (see _rebase)
+        self._pass_start = (0.0, 0.0, 0.0)
+        # Position, for checkpoints (see position()); _flow is the interpreter
+        # state (pc, miss, calls, counters) in scripts with control flow
+        self._script_index = self._iteration = self._action_index = self._resets = 0
+        self._flow = None
+        self._resume_from: Optional[dict] = None  # where the next pass starts, when resuming
+
+    @property
+    def inline(self) -> bool:
+        return self.player.inline
+
+    # ---------- control ----------
+    def notify(self):
+        """Wake the waits of a running engine; safe to call from any thread."""
+        loop, changed = self._loop, self._changed
+        if loop is None or changed is None:
+            return
+        try:
+            loop.call_soon_threadsafe(changed.set)
+        except RuntimeError:
+            pass  # loop already closed
+
+    @contextlib.asynccontextmanager
+    async def _session(self):
+        # run_program and a bare play_script (benchmarks) both set up the loop state
+        if self._depth == 0:
+            self._loop = asyncio.get_running_loop()
+            self._changed = asyncio.Event()
+            if not self.inline:
+                # One thread: actions stay in order and pynput controllers stay on one thread
+                self._executor = ThreadPoolExecutor(1, thread_name_prefix="toolforge-actions")
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=True)
+                self._executor = None
+                self._loop = self._changed = None
+
+    async def _changed_within(self, timeout: Optional[float]):
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def sleep(self, total: float):
+        """Wait *total* seconds of unpaused time; ends early on stop or skip."""
+        p = self.player
+        if self.inline:
+            p._sleep(total)
+            return
+        remaining = total
+        while not p.stop_flag:
+            # Clear before looking at the flags, so a change in between is not lost
+            self._changed.clear()
+            if p.pause_flag:
+                paused_from = p._clock()
+                await self._changed.wait()
+                p.paused_time += p._clock() - paused_from
+                continue
+            if remaining <= 0:
+                return
+            if p.skip_pause_flag:
+                p.skip_pause_flag = False
+                return
+            started = p._clock()
+            await self._changed_within(remaining)
+            remaining -= p._clock() - started
+
+    async def wait(self, seconds: float):
+        """Wait *seconds* regardless of pause; ends early only on stop."""
+        p = self.player
+        if self.inline:
+            p._raw_sleep(seconds)
+            return
+        deadline = p._clock() + seconds
+        while not p.stop_flag:
+            self._changed.clear()
+            remaining = deadline - p._clock()
+            if remaining <= 0:
+                return
+            await self._changed_within(remaining)
+
+    async def call(self, fn, *args):
+        """
+        Run a blocking step in the executor. A stop request returns None at
+        once; the step itself sees ``stop_flag`` and winds down on its own.
+        """
+        if self.inline:
+            return fn(*args)
+        future = self._loop.run_in_executor(self._executor, fn, *args)
+        while not future.done():
+            self._changed.clear()
+            if self.player.stop_flag:
+                return None
+            waiter = asyncio.ensure_future(self._changed.wait())
+            try:
+                await asyncio.wait((future, waiter), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiter.cancel()
+        return future.result()
+
+    # ---------- actions ----------
+    def _find(self, act: MouseAction, final: bool):
+        target = self.player._find_target(act, final)
+        self.detect_estimate += 0.3 * (self.player._detect_time - self.detect_estimate)
+        return target
+
+    async def perform(self, act, target=_PENDING) -> bool:
+        """Run one action; False if its color/template target was not found."""
+        p = self.player
+        if self.inline:
+            return self._perform_inline(act)
+        if act.type == ActionType.MOUSE:
+            if not act.color_toggle:
+                target = (*act.position, None)
+            elif target is _PENDING:
+                target = await self.call(self._find, act, True)
+            if target is None:
+                return False
+            await self.call(p._click, act, *target)
+        elif act.type == ActionType.MOUSE_MOVE:
+            await self.call(p._do_move, act)
+        elif act.type == ActionType.TEXT:
+            await self.call(p._do_text, act)
+        else:
+            await self.call(p._do_key, act)
+        return True
+
+    def _perform_inline(self, act) -> bool:
+        p = self.player
+        if act.type == ActionType.MOUSE:
+            return p._do_mouse(act) != 0
+        if act.type == ActionType.MOUSE_MOVE:
+            p._do_move(act)
+        elif act.type == ActionType.TEXT:
+            p._do_text(act)
+        else:
+            p._do_key(act)
+        return True
+
+    async def _delay(self, act, delay: float, prefetch: bool = True) -> Tuple[float, object]:
+        """
+        Sleep before *act*; returns when the sleep ended and the target found
+        during its last part (``_PENDING`` if there was no lookahead).
+        """
+        p = self.player
+        if self.inline:
+            p._sleep(delay)
+            return p._clock(), _PENDING
+        lead = 0.0
+        if prefetch and self.lookahead and act.type == ActionType.MOUSE and act.color_toggle:
+            lead = min(self.detect_estimate, self.max_lookahead, delay)
+        if lead <= 0.0:
+            await self.sleep(delay)
+            return p._clock(), _PENDING
+        await self.sleep(delay - lead)
+        if p.stop_flag:
+            return p._clock(), _PENDING
+        paused = p.paused_time
+        search = asyncio.ensure_future(self.call(self._find, act, False))
+        try:
+            await self.sleep(lead)
+            slept_to = p._clock()
+            target = await search
+        finally:
+            search.cancel()
+        if target is None or p.paused_time != paused:
+            # Not there yet, or the screen had time to change during a pause: look again now
+            self.prefetch_misses += 1
+            return slept_to, _PENDING
+        self.prefetched += 1
+        p._detect_time = max(0.0, p._clock() - slept_to)  # only the part not hidden by the delay
+        return slept_to, target
+
+    async def play_script(self, actions, reset_limit: Optional[int] = 20):
+        """
+        One pass over *actions*: any sequence raising IndexError past the end,
+        or a CompiledScript (run by its control flow). A target that is not
+        found restarts the pass (unless the script handles misses); after more
+        than *reset_limit* restarts (None = no limit) playback stops.
+        """
+        p = self.player
+        async with self._session():
+            # Intended dispatch times are measured from the start of this pass:
+            # scheduled delays plus time spent paused
+            p.timing.begin_iteration(p.current_script_name, p.current_script_iteration)
+            self._rebase()
+            start, self._resume_from = self._resume_from or {}, None
+            if isinstance(actions, CompiledScript):
+                await self._run_compiled(actions, reset_limit, start)
+            else:
+                await self._run_actions(actions, reset_limit, start)
+            p.timing.end_iteration()
+
+    async def _run_actions(self, actions, reset_limit: Optional[int], start: dict):
+        p = self.player
+        checkpoints = p.checkpointer
+        action_index = start.get("action_index", 0)
+        resets = start.get("reset_counter", 0)
+        while not p.stop_flag:
+            try:
+                act = actions[action_index]
+            except IndexError:
+                break
+            self._action_index, self._resets = action_index, resets
+            if checkpoints is not None:
+                checkpoints.reached("action", self.position)
+            found = await self._step(act, action_index, actions)
+            if found is None:
+                break
+            if found:
+                action_index += 1
+                continue
+            # Reset to start of actions loop
+            action_index = 0
+            resets += 1
+            if not await self._reset(resets, reset_limit):
+                break
+
+    async def _run_compiled(self, script: CompiledScript, reset_limit: Optional[int], start: dict):
+        """The dispatch loop for scripts with control flow (opcodes in control.py)."""
+        p = self.player
+        checkpoints = p.checkpointer
+        code, lines, actions, conditions = script.code, script.lines, script.actions, script.conditions
+        end = len(lines)
+        flow = start.get("flow")
+        if flow:
+            pc, miss, calls, counters = flow["pc"], flow["miss"], list(flow["calls"]), list(flow["counters"])
+        else:
+            pc, miss, calls, counters = 0, -1, [], [0] * script.counters
+        resets = start.get("reset_counter", 0)
+        idle = 0  # instructions since the last action or check
+        while pc < end and not p.stop_flag:
+            op, a, b = code[3 * pc], code[3 * pc + 1], code[3 * pc + 2]
+            line = lines[pc]
+            if op <= CHECK_NOT:  # ACT, CHECK, CHECK_NOT: a step that takes time
+                self._action_index, self._resets, self._flow = line, resets, (pc, miss, calls, counters)
+                if checkpoints is not None:
+                    checkpoints.reached("action", self.position)
+            pc += 1
+            if op == ACT:
+                idle = 0
+                found = await self._step(actions[a], line, script)
+                if found is None:
+                    break
+                if found:
+                    continue
+                if miss >= 0:
+                    pc = miss
+                    self._rebase()
+                    continue
+                resets += 1
+                if not await self._reset(resets, reset_limit):
+                    break
+                pc, miss, calls, counters = 0, -1, [], [0] * script.counters
+            elif op == CHECK or op == CHECK_NOT:
+                idle = 0
+                found = await self._step(conditions[a], line, script, check=True)
+                if found is None:
+                    break
+                if found == (op == CHECK):
+                    pc = b
+            elif op == JUMP:
+                pc = a
+            elif op == ON_MISS:
+                miss = a
+            elif op == SET:
+                counters[a] = b
+            elif op == LOOP:
+                counters[b] -= 1
+                if counters[b] > 0:
+                    pc = a
+            elif op == CALL:
+                if len(calls) >= MAX_CALL_DEPTH:
+                    raise RuntimeError(f"{p.current_script_name}, entry {line + 1}: "
+                                       f"calls nested deeper than {MAX_CALL_DEPTH}")
+                calls.append(pc)
+                pc = a
+            elif op == RET:
+                if not calls:
+                    break
+                pc = calls.pop()
+            else:  # END
+                break
+            idle += 1
+            if idle >= 10_000:
+                # A loop of jumps with nothing to wait for: still honour pause,
+                # and let the other programs on this loop run
+                idle = 0
+                await self.sleep(0)
+                await asyncio.sleep(0)
+
+    @staticmethod
+    def _resume_fits(actions, position: dict) -> bool:
+        """Whether a checkpointed *position* lies inside the opened script *actions*."""
+        flow = position.get("flow")
+        if isinstance(actions, CompiledScript):
+            if flow is None:
+                return True  # runs from the top
+            end = len(actions.lines)
+            return (flow["pc"] < end and flow["miss"] < end and len(flow["calls"]) <= MAX_CALL_DEPTH
+                    and all(pc <= end for pc in flow["calls"]) and len(flow["counters"]) == actions.counters)
+        # Streams know their exact length only once parsed to the end; this is a one-off on resume
+        return flow is None and position.get("action_index", 0) < len(actions)
+
+    def _rebase(self):
+        """
+        Measure intended dispatch times from now on. Done at the start of a
+        pass and after a missed target: the failed search and the reset wait
+        are not part of the schedule, and would otherwise show up as drift
+        in every later action.
+        """
+        p = self.player
+        self._pass_start = (p._clock(), p.elapsed_time, p.paused_time)
+
+    async def _reset(self, count: int, limit: Optional[int]) -> bool:
+        """After a missed target: wait a second; False once more than *limit* resets were needed."""
+        p = self.player
+        TRACER.counter("resets", count=count)
+        print(f"Reset counter: {count}")
+        await self.wait(1)
+        if limit is not None and count > limit:
+            p.stop_flag = True
+            p.stop_reason = "reset_limit"
+            p._dump_frames("reset_limit")
+            return False
+        self._rebase()
+        return True
+
+    async def _step(self, act, index: int, actions, check: bool = False) -> Optional[bool]:
+        """
+        Wait for and run *act*, entry *index* of *actions*: True when done,
+        False if its target was not found, None once playback stops. With
+        *check* the target of *act* is only looked for (True if it is there).
+        """
+        p = self.player
+        p.current_action_index = index + 1
+        if p.current_action_index > p.current_action_total:
+            p.current_action_total = length_hint(actions)
+        p.current_action_delay = act.timestamp * p.speed
+        p._update_progress()
+        if p.stop_flag:
+            return None
+
+        delay = act.timestamp * p.speed
+        if act.delay_randomization:
+            delay *= random.uniform(act.delay_min_multiplier, act.delay_max_multiplier)
+        if delay > 30:
+            print(f"Delay: {delay}")
+        p._detect_time = 0.0
+        with TRACER.span("schedule", delay=delay):
+            slept_from, paused_from = p._clock(), p.paused_time
+            slept_to, target = await self._delay(act, delay, prefetch=not check)
+        if p.stop_flag:
+            return None
+        p.elapsed_time += delay
+
+        if target is _PENDING:
+            p._detect_time = 0.0
+        if check:
+            found = await self.call(p._sees, act)
+        else:
+            found = await self.perform(act, target)
+        if p.stop_flag:
+            return None
+        if found and not check:
+            base, elapsed0, paused0 = self._pass_start
+            done = p._clock()
+            detect = p._detect_time
+            intended = base + (p.elapsed_time - elapsed0) + (p.paused_time - paused0)
+            overshoot = slept_to - slept_from - delay - (p.paused_time - paused_from)
+            p.timing.add(intended, slept_to + detect, overshoot, detect, done - slept_to - detect)
+        return found
+
+    async def run_program(self, program_sequence: Sequence[Tuple[str, int]], scripts: Optional[dict] = None,
+                          reset_limit: Optional[int] = 20, resume: Optional[dict] = None):
+        """
+        The program loop behind ``ActionPlayer.replay_program``; *resume* is a
+        checkpointed position (``checkpoint.load_resume``) to start from.
+        """
+        from script_manager import ScriptManager
+
+        p = self.player
+        mgr = ScriptManager()
+        # Calculate total program duration in the background so playback starts immediately
+        p._start_duration_calculation(program_sequence)
+        if p.hotkeys:
+            p._start_key_listener()
+        print(f"Loop until stopped: {p.loop_until_stopped}")
+        p.timing.reset(p._clock())
+        p.frames.new_session()
+        start = resume
+        if start is not None:
+            p.passes_completed = start.get("passes_completed", 0)
+            p.elapsed_time = start.get("elapsed_time", 0.0)
+        checkpoints = p.checkpointer
+        finished = False  # one pass done without looping: nothing left to resume
+
+        async with self._session():
+            try:
+                while True:
+                    for script_index, (script_name, iterations) in enumerate(program_sequence):
+                        first_iteration = 0
+                        if start is not None:
+                            if script_index < start.get("script_index", 0):
+                                continue
+                            first_iteration = start.get("iteration", 0)
+                            self._resume_from, start = start, None
+                            print(f"Resuming at {script_name}, iteration {first_iteration + 1}, "
+                                  f"action {self._resume_from.get('action_index', 0) + 1}")
+                        p.current_script_name = script_name
+                        p.current_script_total_iterations = iterations
+                        self._script_index = script_index
+                        try:
+                            if scripts is not None and script_name in scripts:
+                                actions = scripts[script_name]
+                            else:
+                                actions = mgr.open_script(script_name)
+                            p.current_action_total = length_hint(actions)
+                            p.timing.reserve(p.current_action_total)  # one pass; add() grows the log as needed
+                            p._load_roi(script_name)
+                        except Exception as e:
+                            print(f"Failed to load script {script_name}: {e}")
+                            if self._resume_from is not None:
+                                print("Resume position dropped; continuing with the next script")
+                                self._resume_from = None
+                            continue
+                        if self._resume_from is not None and not self._resume_fits(actions, self._resume_from):
+                            print(f"Checkpoint position is outside {script_name}; starting it from the beginning")
+                            self._resume_from = None
+
+                        for iteration in range(first_iteration, iterations):
+                            p.current_script_iteration = iteration + 1
+                            print(f"Running {script_name} (iteration {iteration + 1}/{iterations})")
+                            if p.stop_flag:
+                                break
+                            self._iteration = iteration
+                            resumed = self._resume_from or {}
+                            self._action_index = resumed.get("action_index", 0)
+                            self._resets = resumed.get("reset_counter", 0)
+                            self._flow = resumed.get("flow")
+                            while p.pause_flag:
+                                await self.sleep(0.2)
+                                if p.stop_flag:
+                                    break
+                            if p.stop_flag:
+                                break
+                            # Only now is a new pass under way: a stop during the pause
+                            # after a finished pass leaves nothing to resume
+                            finished = False
+                            if checkpoints is not None:
+                                checkpoints.reached("script" if iteration == first_iteration else "iteration",
+                                                    self.position)
+                            await self.play_script(actions, reset_limit)
+                            if p.stop_flag:
+                                break
+                            await self.sleep(0.2)
+                        p._save_roi(script_name)
+                        actions.close()
+                        if p.stop_flag:
+                            break
+
+                    if p.stop_flag:
+                        break
+                    p.passes_completed += 1
+                    self._script_index, self._iteration, self._action_index, self._resets = 0, 0, 0, 0
+                    self._flow = None
+                    if p.max_passes and p.passes_completed >= p.max_passes:
+                        p.stop_reason = "completed"
+                        break
+                    # If not looping, pause after the first pass
+                    if not p.loop_until_stopped:
+                        finished = True
+                        p.pause_flag = True
+            finally:
+                self._resume_from = None
+                if checkpoints is not None:
+                    if p.stop_reason == "completed" or finished:
+                        checkpoints.clear()
+                    else:
+                        position = self.position()  # stopped, closed or crashed: exactly here
+                        if p.stop_reason == "reset_limit":
+                            position["reset_counter"] = 0  # a resume gets a fresh set of retries
+                        checkpoints.save(position)
+                if p.keyboard_listener:
+                    p.keyboard_listener.stop()
+                if p.vision:
+                    p.vision.close()
+                p.detector.close()
+
+    def position(self) -> dict:
+        """Where playback is, as checkpointed: the action about to run (or running)."""
+        p = self.player
+        out = {"passes_completed": p.passes_completed, "script_index": self._script_index,
+               "iteration": self._iteration, "action_index": self._action_index,
+               "reset_counter": self._resets, "elapsed_time": p.elapsed_time}
+        if self._flow is not None:
+            pc, miss, calls, counters = self._flow
+            out["flow"] = {"pc": pc, "miss": miss, "calls": list(calls), "counters": list(counters)}
+        return out
+
+    def stats(self) -> dict:
+        return {"prefetched": self.prefetched, "prefetch_misses": self.prefetch_misses,
+                "detect_estimate": self.detect_estimate}
+
+
+async def play_programs(jobs: Sequence[Tuple[object, Sequence[Tuple[str, int]]]], scripts: Optional[dict] = None):
+    """Run ``(player, program_sequence)`` *jobs* side by side on the current event loop."""
+    results = await asyncio.gather(*(player.engine.run_program(sequence, scripts) for player, sequence in jobs),
+                                   return_exceptions=True)
+    for (player, _), result in zip(jobs, results):
+        if isinstance(result, BaseException):
+            print(f"Program of {player!r} failed: {result}")
+    return results
+
+
+def run_programs(jobs: Sequence[Tuple[object, Sequence[Tuple[str, int]]]], scripts: Optional[dict] = None) -> List:
+    """Synchronous :func:`play_programs`; returns once every program has ended."""
+    return asyncio.run(play_programs(jobs, scripts))
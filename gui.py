@@ -1,34 +1,208 @@
 import threading
 import signal
 import sys
-import json
 from pathlib import Path
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-from pynput.keyboard import Key, KeyCode
+from tkinter import ttk, messagebox, simpledialog, filedialog, font as tkfont
+from pynput.keyboard import Key
 
-from player import ActionPlayer
+from player import ActionPlayer, to_key
 from recorder import ActionRecorder
 from script_manager import ScriptManager
 from actions import ActionType, MouseAction, KeyboardAction
-from utils import SCRIPTS_DIR, PROGRAMS_DIR
+from utils import SCRIPTS_DIR, PROGRAMS_DIR, load_settings, save_settings
+from checkpoint import checkpoint_path, describe, load_resume
+from cli import player_options
 
-DEFAULT_COLOR_AREA_WIDTH = 300
-DEFAULT_COLOR_AREA_HEIGHT = 500
 
+def describe_anchor(spec):
+    """Short text for an anchor spec (see anchor.py)."""
+    if not spec:
+        return "program default"
+    mode = spec.get("mode")
+    if mode == "fixed":
+        return f"fixed ({spec['point'][0]},{spec['point'][1]})"
+    if mode == "position":
+        return "recorded position"
+    if mode == "color":
+        return f"color marker {tuple(spec['color'])}"
+    return f"{mode} marker"
 
-def to_key(key_str, default):
-    """Convert a string to a pynput Key or KeyCode, or fallback to default."""
-    if not key_str:
-        return default
-    key_str = key_str.lower()
-    # Try named key
-    if hasattr(Key, key_str):
-        return getattr(Key, key_str)
-    # Otherwise, treat as single character
-    if len(key_str) == 1:
-        return KeyCode.from_char(key_str)
-    return default
+
+def format_control(op):
+    """One-line summary of a control-flow entry (see control.py)."""
+    if op.op == "label":
+        return f"{op.name}:"
+    if op.op in ("if_found", "if_missing"):
+        target = "template" if op.template else f"color {tuple(op.color) if op.color else None}"
+        return (f"  If {target} {'found' if op.op == 'if_found' else 'missing'} -> {op.to}"
+                f" | Delay: {op.timestamp:.2f}s")
+    if op.op == "on_miss":
+        return f"  On miss -> {op.to or 'restart'}"
+    if op.op == "repeat":
+        return f"  Repeat {op.count}x"
+    if op.op in ("jump", "call"):
+        return f"  {op.op.title()} {op.to}"
+    return f"  {op.op.replace('_', ' ').title()}"
+
+
+def format_action(action):
+    """One-line summary of an action for the editor list."""
+    if action.type == ActionType.MOUSE:
+        button_short = action.button.replace("Button.", "").title()
+        base_text = f"Mouse {button_short} ({action.position[0]},{action.position[1]}) | Delay: {action.timestamp:.2f}s"
+        if action.path:
+            base_text += f" | Drag to ({action.path[-1][0]},{action.path[-1][1]})"
+        elif action.press_duration >= 0.3:
+            base_text += f" | Hold {action.press_duration:.2f}s"
+        if action.color_toggle and action.template:
+            base_text += f" | Match template (>= {action.match_threshold:.2f})"
+        elif action.color_toggle:
+            area_info = f" | Detect {action.color}"
+            tolerance_info = f" (tol:{action.color_tolerance})"
+            base_text += area_info + tolerance_info
+        if action.color_toggle and action.track_motion:
+            base_text += " | Track"
+        if action.color_toggle and action.anchor:
+            base_text += f" | Anchor: {describe_anchor(action.anchor)}"
+    elif action.type == ActionType.TEXT:
+        base_text = f"Type {action.text!r} | Delay: {action.timestamp:.2f}s"
+    elif action.type == ActionType.MOUSE_MOVE:
+        x, y = action.path[-1][0], action.path[-1][1]
+        base_text = f"Move to ({x},{y}) [{len(action.path)} pts, {action.path[-1][2]:.2f}s] | Delay: {action.timestamp:.2f}s"
+    elif action.type == ActionType.CONTROL:
+        return format_control(action)
+    else:
+        base_text = f"Keyboard {action.key} | Delay: {action.timestamp:.2f}s"
+    if action.delay_randomization:
+        random_info = f" | Random: {action.delay_min_multiplier:.1f}-{action.delay_max_multiplier:.1f}x"
+        base_text += random_info
+    return base_text
+
+
+class VirtualListbox(ttk.Frame):
+    """
+    Listbox over a (possibly huge) list that only renders the rows in view.
+
+    Row labels are produced by *formatter* and cached per item, so scrolling,
+    moving or deleting items costs O(visible rows). Call :meth:`invalidate`
+    after mutating an item in place.
+    """
+    def __init__(self, parent, items, formatter, width=60, height=15):
+        super().__init__(parent)
+        self._items = items
+        self._format = formatter
+        self._labels = {}  # id(item) -> (item, label)
+        self._shown = []  # labels currently in the listbox rows
+        self._top = 0
+        self._rows = height
+        self._selected = None  # absolute index of the selected item
+        self.listbox = tk.Listbox(self, width=width, height=height, selectmode=tk.SINGLE,
+                                  exportselection=0, activestyle='none')
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.listbox.bind('<<ListboxSelect>>', self._on_select)
+        self.listbox.bind('<Configure>', self._on_resize)
+        self.listbox.bind('<MouseWheel>', lambda e: self._scroll(-1 if e.delta > 0 else 1))
+        self.listbox.bind('<Button-4>', lambda e: self._scroll(-1))
+        self.listbox.bind('<Button-5>', lambda e: self._scroll(1))
+        self.listbox.bind('<Up>', lambda e: self._step(-1))
+        self.listbox.bind('<Down>', lambda e: self._step(1))
+        self.refresh()
+
+    # ---------- data ----------
+    def set_items(self, items):
+        if items is not self._items:
+            self._items = items
+            self._labels.clear()
+            self._top = 0
+            self._selected = None
+        self.refresh()
+
+    def invalidate(self, item):
+        """Drop the cached label of *item* (after editing it in place)."""
+        self._labels.pop(id(item), None)
+
+    def _label(self, index):
+        item = self._items[index]
+        cached = self._labels.get(id(item))
+        if cached is None or cached[0] is not item:
+            cached = (item, self._format(item))
+            self._labels[id(item)] = cached
+        return cached[1]
+
+    # ---------- rendering ----------
+    def refresh(self):
+        n = len(self._items)
+        self._top = max(0, min(self._top, n - self._rows))
+        if self._selected is not None and self._selected >= n:
+            self._selected = None
+        labels = [self._label(i) for i in range(self._top, min(self._top + self._rows, n))]
+        lb = self.listbox
+        for row, text in enumerate(labels):
+            if row >= len(self._shown):
+                lb.insert(tk.END, text)
+            elif self._shown[row] != text:
+                lb.delete(row)
+                lb.insert(row, text)
+        if len(self._shown) > len(labels):
+            lb.delete(len(labels), tk.END)
+        self._shown = labels
+        lb.selection_clear(0, tk.END)
+        if self._selected is not None and self._top <= self._selected < self._top + len(labels):
+            lb.selection_set(self._selected - self._top)
+        if n > self._rows:
+            self.scrollbar.set(self._top / n, (self._top + self._rows) / n)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _scroll(self, delta):
+        self._top += delta
+        self.refresh()
+        return "break"
+
+    def _on_scrollbar(self, *args):
+        n = len(self._items)
+        if args[0] == 'moveto':
+            self._top = int(float(args[1]) * n)
+        elif args[0] == 'scroll':
+            step = int(args[1]) * (self._rows if args[2] == 'pages' else 1)
+            self._top += step
+        self.refresh()
+
+    def _on_resize(self, event):
+        line = tkfont.Font(font=self.listbox.cget('font')).metrics('linespace') + 1
+        rows = max(1, event.height // line)
+        if rows != self._rows:
+            self._rows = rows
+            self.refresh()
+
+    # ---------- selection ----------
+    def _on_select(self, event=None):
+        sel = self.listbox.curselection()
+        if sel:
+            self._selected = self._top + sel[0]
+
+    def _step(self, delta):
+        if self._selected is not None:
+            self.select_set(max(0, min(len(self._items) - 1, self._selected + delta)))
+        return "break"
+
+    def curselection(self):
+        return () if self._selected is None else (self._selected,)
+
+    def select_set(self, index):
+        """Select *index* and scroll it into view."""
+        self._selected = index
+        if index < self._top:
+            self._top = index
+        elif index >= self._top + self._rows:
+            self._top = index - self._rows + 1
+        self.refresh()
+
+    def bind(self, sequence=None, func=None, add=None):
+        return self.listbox.bind(sequence, func, add)
 
 
 class ProgressDisplay(ttk.Frame):
@@ -91,6 +265,8 @@ class ProgressDisplay(ttk.Frame):
         self.status.pack(pady=10)
         self.countdown = ttk.Label(main, text="0.0s", font=(None,16,'bold'))
         self.countdown.pack(pady=5)
+        self.drift = ttk.Label(main, text="Drift: -")
+        self.drift.pack()
 
         self.listbox = tk.Listbox(main)
         self.listbox.pack(fill=tk.BOTH, expand=True)
@@ -100,7 +276,10 @@ class ProgressDisplay(ttk.Frame):
         self.update()
 
         # Add a Close button to return to main UI
-        ttk.Button(main, text="Close", command=self._close).pack(pady=10)
+        bottom = ttk.Frame(main)
+        bottom.pack(pady=10)
+        ttk.Button(bottom, text="Export Timing...", command=self._export_timing).pack(side=tk.LEFT, padx=5)
+        ttk.Button(bottom, text="Close", command=self._close).pack(side=tk.LEFT, padx=5)
 
     def apply(self):
         if self.player:
@@ -149,11 +328,49 @@ class ProgressDisplay(ttk.Frame):
             self.start_countdown(action_delay)
         else:
             self.countdown.config(text="0.0s")
+        # Timing fidelity: running figures while playing, full summary once stopped
+        if is_stopped:
+            self.show_timing_summary()
+        elif 'drift' in progress_info:
+            self.drift.config(text=f"Drift: {progress_info['drift'] * 1000:.0f} ms "
+                                   f"(mean {progress_info['mean_drift'] * 1000:.0f}, "
+                                   f"max {progress_info['max_drift'] * 1000:.0f})"
+                                   + (f" | Fast path {progress_info['fast_path_hit_rate']:.0%}"
+                                      if progress_info.get('fast_path_hit_rate') is not None else ""))
         # Update listbox highlight
         self.update_list()
         # Force update
         self.update_idletasks()
 
+    def show_timing_summary(self):
+        summary = self.player.timing.summary()
+        if not summary['actions']:
+            return
+        ms = lambda v: f"{v * 1000:.0f}"
+        text = (f"Drift mean {ms(summary['mean_drift'])} / p95 {ms(summary['p95_drift'])} / "
+                f"max {ms(summary['max_drift'])} ms over {summary['actions']} actions\n"
+                f"Per action: sleep overshoot {ms(summary['mean_overshoot'])} ms, "
+                f"detection {ms(summary['mean_detect'])} ms, input {ms(summary['mean_inject'])} ms")
+        iterations = summary['iterations'][-5:]
+        if iterations:
+            text += "\nDrift per iteration: " + ", ".join(
+                f"{it['script'].removesuffix('.json')} #{it['iteration']} {ms(it['drift'])} ms" for it in iterations)
+        self.drift.config(text=text, justify=tk.LEFT)
+
+    def _export_timing(self):
+        if not self.player or not self.player.timing.count:
+            messagebox.showinfo("No Timing Data", "Nothing has been played yet.")
+            return
+        path = filedialog.asksaveasfilename(
+            title="Export Timing", defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("JSON", "*.json")])
+        if not path:
+            return
+        try:
+            self.player.timing.export(path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to export timing: {e}")
+
     def _close(self):
         if self.player:
             self.player.stop_playback()
@@ -175,24 +392,10 @@ class ScriptRunnerGUI:
         self._build_main()
 
     def _load_settings(self):
-        path = Path(__file__).parent / 'settings.json'
-        defaults = dict(
-            color_area_width=DEFAULT_COLOR_AREA_WIDTH,
-            color_area_height=DEFAULT_COLOR_AREA_HEIGHT,
-            color_toggle_key='shift', stop_key='tab',
-            replay_speed=1.0, pause_key='space', replay_stop_key='s', skip_pause_key='n',
-            loop_until_stopped=False
-        )
-        if path.exists():
-            try:
-                defaults.update(json.loads(path.read_text()))
-            except json.JSONDecodeError:
-                pass
-        self.settings = defaults
+        self.settings = load_settings()
 
     def _save_settings(self):
-        path = Path(__file__).parent / 'settings.json'
-        path.write_text(json.dumps(self.settings, indent=4))
+        save_settings(self.settings)
 
     def _setup_signals(self):
         signal.signal(signal.SIGINT, self._exit)
@@ -251,6 +454,7 @@ class ScriptRunnerGUI:
                 import os
                 try:
                     os.remove(str(PROGRAMS_DIR / prog))
+                    checkpoint_path(prog).unlink(missing_ok=True)  # saved position
                 except Exception as e:
                     messagebox.showerror("Error", f"Failed to delete: {e}")
                 # Refresh list and update progs
@@ -438,7 +642,10 @@ class ScriptRunnerGUI:
                 color_toggle_key=color_key,
                 stop_recording_key=stop_key,
                 color_area_width=width,
-                color_area_height=height
+                color_area_height=height,
+                record_moves=self.settings['record_mouse_moves'],
+                path_tolerance=self.settings['path_tolerance'],
+                template_size=self.settings['template_size']
             )
             self.current_recorder = rec
             rec.record()
@@ -449,9 +656,13 @@ class ScriptRunnerGUI:
         # Save script with the provided name
         if hasattr(rec, '_actions') and rec._actions:
             try:
-                rec.save(script_name)
+                out = rec.save(script_name)
+                msg = f'Script saved as "{script_name}"'
+                if self.settings['optimize_recordings']:
+                    report = self.mgr.optimize_script(out.name)
+                    msg += f" ({report.time_saved:.2f}s saved)"
                 if toast_callback:
-                    toast_callback(f'Script saved as "{script_name}"')
+                    toast_callback(msg)
             except Exception as e:
                 messagebox.showerror("Save Error", f"Failed to save script: {e}")
         self.root.lift()
@@ -475,8 +686,8 @@ class ScriptRunnerGUI:
         # Ensure these are defined before the functions that use nonlocal
         current_actions = []
         current_script_name = None
-        # --- Define actions_lb Listbox for actions display ---
-        actions_lb = tk.Listbox(left, width=60, height=15, selectmode=tk.SINGLE, exportselection=0)
+        # --- Define actions_lb list for actions display (renders visible rows only) ---
+        actions_lb = VirtualListbox(left, current_actions, format_action, width=60, height=15)
         actions_lb.pack(pady=5, fill=tk.BOTH, expand=True)
         
         # Action management buttons
@@ -595,7 +806,7 @@ class ScriptRunnerGUI:
             if sel:
                 idx = sel[0]
                 if messagebox.askyesno("Action", "Delete this action?"):
-                    current_actions.pop(idx)
+                    actions_lb.invalidate(current_actions.pop(idx))
                     refresh_actions_display()
         
         def move_action_up():
@@ -633,6 +844,17 @@ class ScriptRunnerGUI:
                 messagebox.showwarning("Warning", "No script loaded or no actions to save.")
         
         ttk.Button(action_buttons_frame, text="Save Script", command=save_script, width=15).pack(side=tk.LEFT, padx=2)
+
+        def optimize_script():
+            nonlocal current_actions
+            if not current_actions:
+                messagebox.showwarning("Warning", "No script loaded or no actions to optimize.")
+                return
+            current_actions, report = self.mgr.optimize_actions(current_actions)
+            refresh_actions_display()
+            messagebox.showinfo("Optimize", f"{report}\n\nUse 'Save Script' to keep the changes.")
+
+        ttk.Button(action_buttons_frame, text="Optimize", command=optimize_script, width=15).pack(side=tk.LEFT, padx=2)
         
         def refresh_scripts_list():
             scripts_lb.delete(0, tk.END)
@@ -641,26 +863,8 @@ class ScriptRunnerGUI:
                 scripts_lb.insert(tk.END, s[:-5] if s.endswith('.json') else s)
 
         def refresh_actions_display():
-            """Refresh the actions listbox with current actions in memory"""
-            actions_lb.delete(0, tk.END)
-            for action in current_actions:
-                if action.type == ActionType.MOUSE:
-                    button_short = action.button.replace("Button.", "").title()
-                    base_text = f"Mouse {button_short} ({action.position[0]},{action.position[1]}) | Delay: {action.timestamp:.2f}s"
-                    if action.color_toggle:
-                        area_info = f" | Detect {action.color}"
-                        tolerance_info = f" (tol:{action.color_tolerance})"
-                        base_text += area_info + tolerance_info
-                    if action.delay_randomization:
-                        random_info = f" | Random: {action.delay_min_multiplier:.1f}-{action.delay_max_multiplier:.1f}x"
-                        base_text += random_info
-                    actions_lb.insert(tk.END, base_text)
-                else:
-                    base_text = f"Keyboard {action.key} | Delay: {action.timestamp:.2f}s"
-                    if action.delay_randomization:
-                        random_info = f" | Random: {action.delay_min_multiplier:.1f}-{action.delay_max_multiplier:.1f}x"
-                        base_text += random_info
-                    actions_lb.insert(tk.END, base_text)
+            """Point the action list at the current actions; only visible rows are redrawn"""
+            actions_lb.set_items(current_actions)
 
         def display_script_actions(event=None):
             nonlocal current_actions, current_script_name
@@ -743,6 +947,37 @@ class ScriptRunnerGUI:
                 ttk.Entry(tolerance_frame, textvariable=tolerance_var, width=5).pack(side=tk.LEFT, padx=5)
                 ttk.Label(tolerance_frame, text="(0-255, higher = more flexible)").pack(side=tk.LEFT, padx=5)
                 tolerance_frame.pack(pady=5)
+
+                # Template matching (only offered when a patch was recorded)
+                template_var = tk.BooleanVar(value=bool(action.template))
+                threshold_var = tk.StringVar(value=str(action.match_threshold))
+                if action.template:
+                    template_frame = ttk.Frame(color_area_frame)
+                    ttk.Checkbutton(template_frame, text="Match recorded patch", variable=template_var).pack(side=tk.LEFT)
+                    ttk.Label(template_frame, text="Threshold:").pack(side=tk.LEFT, padx=(10, 0))
+                    ttk.Entry(template_frame, textvariable=threshold_var, width=5).pack(side=tk.LEFT, padx=5)
+                    template_frame.pack(pady=5)
+
+                track_var = tk.BooleanVar(value=action.track_motion)
+                ttk.Checkbutton(color_area_frame, text="Track moving target (click predicted position)",
+                                variable=track_var).pack(pady=5)
+
+                # Anchor: which match to click when several are found
+                anchor_choices = ["Program default", "Recorded position", "Fixed point"]
+                if action.anchor and action.anchor.get("mode") in ("color", "template"):
+                    anchor_choices.append("Keep " + describe_anchor(action.anchor))
+                current_mode = (action.anchor or {}).get("mode")
+                anchor_var = tk.StringVar(value={None: anchor_choices[0], "position": anchor_choices[1],
+                                                 "fixed": anchor_choices[2]}.get(current_mode, anchor_choices[-1]))
+                anchor_point_var = tk.StringVar(
+                    value=",".join(map(str, action.anchor["point"])) if current_mode == "fixed" else "")
+                anchor_frame = ttk.Frame(color_area_frame)
+                ttk.Label(anchor_frame, text="Anchor:").pack(side=tk.LEFT)
+                ttk.Combobox(anchor_frame, textvariable=anchor_var, values=anchor_choices, state="readonly",
+                             width=22).pack(side=tk.LEFT, padx=5)
+                ttk.Label(anchor_frame, text="x,y:").pack(side=tk.LEFT)
+                ttk.Entry(anchor_frame, textvariable=anchor_point_var, width=10).pack(side=tk.LEFT, padx=5)
+                anchor_frame.pack(pady=5)
                 
                 # Clustering parameters
                 # --- Color preview rectangle ---
@@ -797,6 +1032,28 @@ class ScriptRunnerGUI:
                             else:
                                 messagebox.showerror("Error", "Color values must be between 0 and 255")
                                 return
+                            if action.template:
+                                if not template_var.get():
+                                    action.template = None  # fall back to the color search
+                                else:
+                                    threshold = float(threshold_var.get())
+                                    if not 0 < threshold <= 1:
+                                        messagebox.showerror("Error", "Match threshold must be between 0 and 1")
+                                        return
+                                    action.match_threshold = threshold
+                            action.track_motion = track_var.get()
+                            choice = anchor_var.get()
+                            if choice == "Program default":
+                                action.anchor = None
+                            elif choice == "Recorded position":
+                                action.anchor = {"mode": "position"}
+                            elif choice == "Fixed point":
+                                try:
+                                    ax, ay = (int(v) for v in anchor_point_var.get().split(","))
+                                except ValueError:
+                                    messagebox.showerror("Error", "Anchor point must be x,y")
+                                    return
+                                action.anchor = {"mode": "fixed", "point": [ax, ay]}
                         
                         # Save color tolerance (only for mouse actions)
                         try:
@@ -816,15 +1073,9 @@ class ScriptRunnerGUI:
                             save_json(actions_data, script_path)
                         except Exception as e:
                             messagebox.showerror("Error", f"Failed to save script {current_script_name}: {e}")
-                    # --- Reload from disk and update UI ---
-                    if current_script_name:
-                        try:
-                            actions = self.mgr.load_script(current_script_name)
-                            current_actions.clear()
-                            current_actions.extend(actions)
-                            refresh_actions_display()
-                        except Exception as e:
-                            messagebox.showerror("Error", f"Failed to reload script: {e}")
+                    # --- Update the edited row only ---
+                    actions_lb.invalidate(action)
+                    refresh_actions_display()
                     edit_win.destroy()
                 except ValueError:
                     messagebox.showerror("Error", "Invalid time value")
@@ -844,6 +1095,8 @@ class ScriptRunnerGUI:
                 import os
                 try:
                     os.remove(str(SCRIPTS_DIR / script))
+                    from roi import roi_path
+                    roi_path(script).unlink(missing_ok=True)  # learned search regions
                 except Exception as e:
                     messagebox.showerror("Error", f"Failed to delete: {e}")
                 refresh_scripts_list()
@@ -910,26 +1163,36 @@ class ScriptRunnerGUI:
             messagebox.showinfo("Settings Saved", f"Loop Until Stopped set to {loop_var.get()}")
             self._options_mode()
         ttk.Button(rep_frame, text="Set Loop", command=set_loop).pack(pady=5)
+        # Anchor
+        ttk.Label(rep_frame, text="Anchor:", font=("Arial", 10, "bold")).pack(pady=(10, 5))
+        ttk.Label(rep_frame, text=f"Matches closest to: {describe_anchor(self.settings['anchor'])}").pack(anchor="w")
+        ttk.Button(rep_frame, text="Set Fixed Anchor Point", command=self._change_anchor_point).pack(pady=5)
+        ttk.Button(rep_frame, text="Use Recorded Positions",
+                   command=lambda: self._set_anchor({"mode": "position"})).pack(pady=5)
+        ttk.Button(rep_frame, text="Capture Anchor Marker (3s)", command=self._capture_anchor_marker).pack(pady=5)
 
         ttk.Button(container, text="Back to Main", command=lambda: self._switch('play')).pack(pady=10)
 
     def _execute(self, sequence, name):
         # open progress window as embedded frame
-        import os
         # Ensure all script names in sequence have .json extension
-        fixed_sequence = []
-        for script_name, iters in sequence:
-            if not script_name.endswith('.json'):
-                script_name = script_name + '.json'
-            fixed_sequence.append((script_name, iters))
-        missing = []
-        for script_name, _ in fixed_sequence:
-            script_path = SCRIPTS_DIR / script_name
-            if not script_path.exists():
-                missing.append(script_name)
+        fixed_sequence = self.mgr.normalize_program(sequence)
+        missing = self.mgr.missing_scripts(fixed_sequence)
         if missing:
             messagebox.showerror("Missing Scripts", f"The following scripts are missing and playback cannot start:\n" + "\n".join(missing))
             return
+        errors = self.mgr.control_flow_errors(fixed_sequence)
+        if errors:
+            messagebox.showerror("Script Errors", "The following scripts do not compile:\n" + "\n".join(errors))
+            return
+        resume, problem = load_resume(name, fixed_sequence)
+        if resume is not None:
+            if not messagebox.askyesno("Resume Program", f"Resume {name} at {describe(resume, fixed_sequence)}?\n\n"
+                                                         "No starts from the beginning."):
+                resume = None
+        elif problem != "no checkpoint":
+            messagebox.showinfo("Checkpoint", f"The saved position of {name} cannot be used ({problem}).\n\n"
+                                              "Starting from the beginning.")
         params = dict(
             speed=self.settings['replay_speed'],
             loop=self.settings['loop_until_stopped'],
@@ -940,7 +1203,10 @@ class ScriptRunnerGUI:
         player = ActionPlayer(
             speed=params['speed'], pause_key=to_key(params['pause_key'],Key.space),
             stop_key=params['stop_key'], skip_pause_key=params['skip_key'],
-            loop_until_stopped=params['loop']
+            loop_until_stopped=params['loop'],
+            checkpoint_every=self.settings['checkpoint_every'],
+            checkpoint_interval=self.settings['checkpoint_interval'],
+            **player_options(self.settings)
         )
         # Clear content and show ProgressDisplay frame
         for w in self.content.winfo_children(): w.destroy()
@@ -949,10 +1215,17 @@ class ScriptRunnerGUI:
         disp = ProgressDisplay(self.content, player, params, fixed_sequence, on_close=restore_main)
         disp.pack(fill=tk.BOTH, expand=True)
         player.progress_callback = disp.update_progress
-        th = threading.Thread(target=player.replay_program, args=(fixed_sequence,), daemon=True)
+        th = threading.Thread(target=player.replay_program, args=(fixed_sequence,),
+                              kwargs=dict(program=name, resume=resume), daemon=True)
         th.start()
+        self._playback = (player, th)
 
     def _exit(self, *args):
+        # Let a running program stop cleanly, so its last position is checkpointed
+        player, th = getattr(self, "_playback", (None, None))
+        if th is not None and th.is_alive():
+            player.stop_playback()
+            th.join(timeout=2)
         self.root.destroy()
         sys.exit(0)
 
@@ -973,6 +1246,41 @@ class ScriptRunnerGUI:
             messagebox.showinfo("Settings Saved", f"Color area size changed to {new_width}x{new_height}")
             self._options_mode()
 
+    def _set_anchor(self, spec):
+        self.settings['anchor'] = spec
+        self._save_settings()
+        messagebox.showinfo("Settings Saved", f"Anchor set to {describe_anchor(spec)}")
+        self._options_mode()
+
+    def _change_anchor_point(self):
+        current = self.settings['anchor'].get('point', [0, 0])
+        text = simpledialog.askstring("Anchor", "Enter anchor point as x,y:", initialvalue=f"{current[0]},{current[1]}")
+        if not text:
+            return
+        try:
+            x, y = (int(v) for v in text.split(","))
+        except ValueError:
+            messagebox.showerror("Error", "Anchor point must be x,y")
+            return
+        self._set_anchor({"mode": "fixed", "point": [x, y]})
+
+    def _capture_anchor_marker(self):
+        """In 3 seconds, save the patch under the cursor as a template anchor followed on screen."""
+        def grab():
+            try:
+                import pyautogui
+                from template import encode_patch
+                from utils import grab_area
+                x, y = pyautogui.position()
+                size = max(self.settings['template_size'] or 32, 16)
+                patch = grab_area(x - size // 2, y - size // 2, size, size)
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to capture anchor marker: {e}")
+                return
+            self._set_anchor({"mode": "template", "template": encode_patch(patch), "threshold": 0.8})
+        messagebox.showinfo("Anchor", "Hover the mouse over the marker; it is captured 3 seconds after closing this.")
+        self.root.after(3000, grab)
+
     def _change_color_toggle_key(self):
         new_key = simpledialog.askstring("Key Binding", "Enter new Color Toggle Key:", initialvalue=self.settings['color_toggle_key'])
         if new_key:
@@ -0,0 +1,158 @@
+"""Low-overhead spans and counters for the playback and vision hot paths.
+
+Tracing is off by default. While it is off, ``TRACER.span(...)`` returns a
+shared no-op context manager, so an instrumented block costs one attribute
+check. Turn it on by adding a sink::
+
+    from instrument import TRACER, ChromeTraceSink
+    TRACER.add_sink(ChromeTraceSink("trace.json"))   # open in chrome://tracing / Perfetto
+    ...
+    TRACER.close()
+
+Events are plain dicts in Chrome ``trace_event`` shape: ``name``, ``ph``
+("X" complete span, "C" counter), ``ts``/``dur`` in microseconds since the
+tracer started, ``tid`` and ``args``.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import List
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("_tracer", "_name", "_args", "_start")
+
+    def __init__(self, tracer: "Tracer", name: str, args: dict):
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        t0 = self._tracer._t0
+        self._tracer._emit({
+            "name": self._name, "ph": "X",
+            "ts": (self._start - t0) * 1e6, "dur": (end - self._start) * 1e6,
+            "tid": threading.get_ident(), "args": self._args,
+        })
+        return False
+
+
+class Tracer:
+    """Dispatches spans and counters to the registered sinks."""
+
+    def __init__(self):
+        self.enabled = False
+        self._sinks: list = []
+        self._t0 = time.perf_counter()
+
+    def span(self, name: str, **args):
+        """Context manager timing the enclosed block as one event."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def counter(self, name: str, **values):
+        """Record counter values (one track per key in Chrome's viewer)."""
+        if self.enabled:
+            self._emit({"name": name, "ph": "C", "ts": (time.perf_counter() - self._t0) * 1e6,
+                        "tid": threading.get_ident(), "args": values})
+
+    def add_sink(self, sink):
+        self._sinks.append(sink)
+        self.enabled = True
+        return sink
+
+    def remove_sink(self, sink):
+        self._sinks.remove(sink)
+        self.enabled = bool(self._sinks)
+
+    def close(self):
+        """Flush and detach all sinks; tracing is off afterwards."""
+        for sink in self._sinks:
+            sink.close()
+        self._sinks.clear()
+        self.enabled = False
+
+    def _emit(self, event: dict):
+        for sink in self._sinks:
+            sink.write(event)
+
+
+class RingBufferSink:
+    """Keeps the last *capacity* events in memory."""
+
+    def __init__(self, capacity: int = 10000):
+        self._events = deque(maxlen=capacity)
+
+    def write(self, event: dict):
+        self._events.append(event)
+
+    def events(self) -> List[dict]:
+        return list(self._events)
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink:
+    """Appends one JSON object per event to *path*."""
+
+    def __init__(self, path: Path | str):
+        self._file = open(path, "a", buffering=1 << 16)
+        self._lock = threading.Lock()
+
+    def write(self, event: dict):
+        line = json.dumps(event) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class ChromeTraceSink:
+    """Collects events and writes a Chrome ``trace_event`` JSON file on close."""
+
+    def __init__(self, path: Path | str, max_events: int = 1_000_000):
+        self._path = Path(path)
+        self._events = deque(maxlen=max_events)
+
+    def write(self, event: dict):
+        self._events.append(event)
+
+    def close(self):
+        pid = os.getpid()
+        events = [{**e, "pid": pid} for e in self._events]
+        self._path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}))
+
+
+def sink_for_path(path: Path | str):
+    """Chrome trace for ``*.json``, JSON Lines for anything else (e.g. ``*.jsonl``)."""
+    return ChromeTraceSink(path) if str(path).endswith(".json") else JsonLinesSink(path)
+
+
+TRACER = Tracer()
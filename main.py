@@ -1,8 +1,14 @@
-from gui import ScriptRunnerGUI
+import sys
+
 
 def main():
+    if len(sys.argv) > 1:
+        # Headless command-line runner; never imports Tk
+        from cli import main as cli_main
+        sys.exit(cli_main())
+    from gui import ScriptRunnerGUI
     ScriptRunnerGUI().run()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
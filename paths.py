@@ -0,0 +1,197 @@
+"""Mouse path buffers, online simplification and rate-limited replay."""
+from __future__ import annotations
+
+import time
+from array import array
+from typing import Callable, List, Sequence, Tuple
+
+Point = Tuple[int, int, float]  # (x, y, t) with t in seconds
+
+
+class PointBuffer:
+    """Append-only (x, y, t) storage backed by flat typed arrays."""
+
+    __slots__ = ("xs", "ys", "ts")
+
+    def __init__(self):
+        self.xs = array("i")
+        self.ys = array("i")
+        self.ts = array("d")
+
+    def __len__(self):
+        return len(self.xs)
+
+    def append(self, x: int, y: int, t: float):
+        self.xs.append(int(x))
+        self.ys.append(int(y))
+        self.ts.append(t)
+
+    def clear(self):
+        del self.xs[:], self.ys[:], self.ts[:]
+
+    def points(self, t0: float = 0.0) -> List[Point]:
+        """Return the buffer as a list of (x, y, t - t0) tuples."""
+        return [(x, y, round(t - t0, 4)) for x, y, t in zip(self.xs, self.ys, self.ts)]
+
+
+def simplify_path(xs: Sequence[int], ys: Sequence[int], tolerance: float) -> List[int]:
+    """
+    Ramer-Douglas-Peucker simplification.
+
+    Args:
+        xs, ys: Point coordinates.
+        tolerance: Maximum perpendicular distance (pixels) a dropped point may
+                   have from the simplified polyline.
+
+    Returns:
+        Sorted indices of the points to keep (always includes both ends).
+    """
+    n = len(xs)
+    if n <= 2:
+        return list(range(n))
+    keep = bytearray(n)
+    keep[0] = keep[n - 1] = 1
+    tol2 = tolerance * tolerance
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = xs[first], ys[first]
+        dx, dy = xs[last] - ax, ys[last] - ay
+        seg2 = dx * dx + dy * dy
+        best, best_i = -1.0, -1
+        for i in range(first + 1, last):
+            px, py = xs[i] - ax, ys[i] - ay
+            if seg2:
+                cross = px * dy - py * dx
+                d2 = cross * cross / seg2
+            else:
+                d2 = px * px + py * py
+            if d2 > best:
+                best, best_i = d2, i
+        if best > tol2:
+            keep[best_i] = 1
+            stack.append((first, best_i))
+            stack.append((best_i, last))
+    return [i for i in range(n) if keep[i]]
+
+
+class PathSimplifier:
+    """
+    Online path simplification.
+
+    Points closer than *tolerance* to the last accepted point are dropped as
+    they arrive; the accepted points are RDP-simplified in chunks of *chunk*
+    points so memory stays bounded during long drags or hovers.
+    """
+
+    def __init__(self, tolerance: float = 2.0, chunk: int = 256):
+        self.tolerance = tolerance
+        self._chunk = chunk
+        self._done = PointBuffer()     # simplified points
+        self._pending = PointBuffer()  # accepted, not yet simplified
+        self._last = None              # last raw point (x, y, t)
+
+    def __len__(self):
+        return len(self._done) + len(self._pending)
+
+    def add(self, x: int, y: int, t: float):
+        self._last = (x, y, t)
+        if self._pending:
+            lx, ly = self._pending.xs[-1], self._pending.ys[-1]
+            if (x - lx) ** 2 + (y - ly) ** 2 < self.tolerance ** 2:
+                return
+        self._pending.append(x, y, t)
+        if len(self._pending) >= self._chunk:
+            self._flush(final=False)
+
+    def _flush(self, final: bool):
+        p = self._pending
+        keep = simplify_path(p.xs, p.ys, self.tolerance)
+        # The chunk's last point is carried over as the start of the next chunk
+        tail = keep if final else keep[:-1]
+        for i in tail:
+            self._done.append(p.xs[i], p.ys[i], p.ts[i])
+        last = keep[-1]
+        x, y, t = p.xs[last], p.ys[last], p.ts[last]
+        p.clear()
+        if not final:
+            p.append(x, y, t)
+
+    def moved(self) -> bool:
+        """Whether the path spans more than the tolerance."""
+        return len(self) > 1
+
+    @property
+    def start_time(self) -> float | None:
+        buf = self._done if self._done else self._pending
+        return buf.ts[0] if buf else None
+
+    @property
+    def end_time(self) -> float | None:
+        return self._last[2] if self._last else None
+
+    def finish(self, t0: float | None = None) -> List[Point]:
+        """Simplify what is left and return the path, times relative to *t0*."""
+        if self._last and self._pending:
+            # Always end on the true final position
+            x, y, t = self._last
+            if (self._pending.xs[-1], self._pending.ys[-1]) != (x, y):
+                self._pending.append(x, y, t)
+        if self._pending:
+            self._flush(final=True)
+        if t0 is None:
+            t0 = self.start_time or 0.0
+        pts = self._done.points(t0)
+        self._done.clear()
+        self._last = None
+        return pts
+
+
+class MotionEmitter:
+    """
+    Replay a timed path by moving the cursor at most *rate* times per second.
+
+    Points that fall due within the same tick are batched: only the most
+    recent one is sent, so dense paths cost no more than sparse ones.
+    """
+
+    def __init__(self, move: Callable[[Tuple[int, int]], None], rate: float = 120.0,
+                 sleep: Callable[[float], None] = time.sleep,
+                 clock: Callable[[], float] = time.perf_counter):
+        self._move = move
+        self._tick = 1.0 / rate
+        self._sleep = sleep
+        self._clock = clock
+
+    def play(self, path: Sequence[Sequence[float]], speed: float = 1.0,
+             offset: Tuple[int, int] = (0, 0), should_stop: Callable[[], bool] = lambda: False) -> bool:
+        """
+        Emit *path* ((x, y, t) points, t relative to the start) scaled by *speed*.
+
+        Returns False if *should_stop* interrupted playback.
+        """
+        n = len(path)
+        if not n:
+            return True
+        dx, dy = offset
+        start = self._clock()
+        last_emit = None
+        i = 0
+        while i < n:
+            if should_stop():
+                return False
+            now = self._clock() - start
+            j = i
+            while j < n and path[j][2] * speed <= now:
+                j += 1
+            if j > i and (last_emit is None or now - last_emit >= self._tick):
+                x, y = path[j - 1][0], path[j - 1][1]
+                self._move((int(x) + dx, int(y) + dy))
+                last_emit = now
+                i = j
+                continue
+            due = path[i][2] * speed - now
+            if last_emit is not None:
+                due = max(due, last_emit + self._tick - now)
+            self._sleep(max(0.0, min(due, self._tick)))
+        return True
@@ -2,27 +2,64 @@
 from __future__ import annotations
 
 import random
+import sys
+import threading
 import time
-import tkinter as tk
-from typing import Iterable, List, Tuple, Callable, Optional
+from typing import List, Tuple, Callable, Optional
 
-import pyautogui
-from pynput.mouse import Button, Controller as MouseCtl
-from pynput.keyboard import Controller as KeyCtl, Key, KeyCode, Listener as KeyListener
+from actions import KeyboardAction, MouseAction, MouseMoveAction, TextAction
+from instrument import TRACER
+from paths import MotionEmitter
+from timing import TimingLog
+from detection import make_detector
+from template import decode_patch, match_template
+from tracking import TargetTracker
+from roi import RoiLearner, roi_path
+from diagnostics import FrameRing
+from utils import grab_area, find_closest_cluster
+from anchor import AnchorTracker, DEFAULT_ANCHOR, check_anchor
 
-from actions import Action, ActionType, KeyboardAction, MouseAction
-from utils import *
+# pynput is imported on first use and its controllers are created per player,
+# so importing this module is cheap and never touches the display. The same
+# goes for asyncio and the playback engine, created on first playback.
 
-MOUSE = MouseCtl()
-KEYS = KeyCtl()
 
-player_pos = (1111,561)
 
+_BUTTON_MAP = None
 
-_BUTTON_MAP = {"Button.left": Button.left, "Button.right": Button.right, "Button.middle": Button.middle}
+
+def _button(name: str):
+    """pynput button for a recorded button name (left if unknown)."""
+    global _BUTTON_MAP
+    if _BUTTON_MAP is None:
+        from pynput.mouse import Button
+        _BUTTON_MAP = {"Button.left": Button.left, "Button.right": Button.right, "Button.middle": Button.middle}
+    return _BUTTON_MAP.get(name, _BUTTON_MAP["Button.left"])
+
+
+def _gui_errors():
+    """Exceptions meaning the progress GUI is gone (Tk is only consulted if already loaded)."""
+    tk = sys.modules.get("tkinter")
+    return (tk.TclError, RuntimeError) if tk else (RuntimeError,)
+
+
+def to_key(key_str, default):
+    """Convert a setting string to a pynput Key or KeyCode, or fallback to default."""
+    if not key_str:
+        return default
+    from pynput.keyboard import Key, KeyCode
+    key_str = key_str.lower()
+    # Try named key
+    if hasattr(Key, key_str):
+        return getattr(Key, key_str)
+    # Otherwise, treat as single character
+    if len(key_str) == 1:
+        return KeyCode.from_char(key_str)
+    return default
 
 
 def _to_key(k: str):
+    from pynput.keyboard import Key, KeyCode
     if k.startswith("Key."):
         return getattr(Key, k.split(".")[1], None)
     return KeyCode.from_char(k.strip("'"))
@@ -30,13 +67,26 @@ def _to_key(k: str):
 
 class ActionPlayer:
     def __init__(self, speed: float = 1.0, granular_sleep: float = 0.03, 
-                 pause_key=Key.space, stop_key='s', skip_pause_key='n', restart_key='r', loop_until_stopped=False,
-                 progress_callback: Optional[Callable] = None):
+                 pause_key=None, stop_key='s', skip_pause_key='n', restart_key='r', loop_until_stopped=False,
+                 progress_callback: Optional[Callable] = None, motion_rate: float = 120.0,
+                 max_passes: Optional[int] = None, hotkeys: bool = True,
+                 clock: Callable[[], float] = time.perf_counter, sleep: Callable[[float], None] = time.sleep,
+                 mouse=None, keys=None, capture: Optional[Callable] = None,
+                 failure_frames: int = 32, failure_budget: int = 16 << 20, detect_cache: int = 256,
+                 detect_mode: str = "full", vision_service: bool = False,
+                 template_downscale: Optional[int] = None, track_frames: int = 2,
+                 track_interval: float = 0.03, max_extrapolation: float = 80.0,
+                 anchor: Optional[dict] = None, learn_roi: bool = False, fast_path: bool = False,
+                 probe_radius: int = 3, probe_min: int = 5, detect_lookahead: bool = False,
+                 checkpoint_every: str = "off", checkpoint_interval: float = 1.0, inline: bool = False):
         self.speed = speed
         self._g_sleep = granular_sleep
         self.stop_flag = False
         self.pause_flag = True
         self.skip_pause_flag = False
+        if pause_key is None:
+            from pynput.keyboard import Key
+            pause_key = Key.space
         self.pause_key = pause_key
         self.stop_key = stop_key
         self.skip_pause_key = skip_pause_key
@@ -45,6 +95,10 @@ class ActionPlayer:
         self.restart_flag = False
         self.keyboard_listener = None
         self.progress_callback = progress_callback
+        self.max_passes = max_passes  # stop after this many passes over the program (None = no limit)
+        self.hotkeys = hotkeys  # listen for pause/stop/skip keys during replay
+        self.stop_reason: Optional[str] = None  # "completed", "user", "reset_limit" or "gui_closed"
+        self.passes_completed = 0
         
         # Progress tracking
         self.current_script_name = ""
@@ -55,6 +109,120 @@ class ActionPlayer:
         self.current_action_delay = 0.0
         self.elapsed_time = 0.0
         self.total_program_duration = 0.0
+        self.paused_time = 0.0  # time spent paused inside _sleep
+        self.timing = TimingLog()  # scheduled vs. actual dispatch time per action
+        self._detect_time = 0.0
+        # Recent color-search frames, written to disk only when a search fails
+        self.frames = FrameRing(failure_frames, failure_budget)
+        # Identical captures (idle screens, retries) reuse the previous clusters;
+        # "tiles" mode also re-labels only what changed since the last capture
+        self.detector = make_detector(detect_mode, detect_cache)
+        self.template_downscale = template_downscale  # coarse first pass for template matching
+        # Moving targets (actions with track_motion): clicks are aimed where the
+        # target will be after the measured capture-to-click latency
+        self.tracker = TargetTracker(max_extrapolation=max_extrapolation)
+        self.track_frames = track_frames  # fresh sightings needed before predicting
+        self.track_interval = track_interval  # seconds between extra captures
+        # Search where each action's target was found before, the full color_area only on a miss
+        self.roi = RoiLearner() if learn_roi else None
+        self.save_learned = True  # write learned regions back next to the scripts
+        # Recorded-pixel fast path: before any region search, check the recorded
+        # color in a small square where the target was last clicked
+        self.fast_path = fast_path
+        self.probe_radius = probe_radius
+        self.probe_min = probe_min  # matching pixels needed to click without a search
+        self._last_hits: dict = {}  # (script, action index) -> last click position
+        self.probe_tries = 0
+        self.probe_hits = 0
+        # Optional separate process doing capture + detection off this GIL
+        self.vision = None
+        if vision_service:
+            from vision_service import VisionService
+            self.vision = VisionService(capture or grab_area, detect_mode, detect_cache)
+
+        # I/O seams: the defaults drive the real desktop; benchmarks pass fakes
+        self._clock = clock
+        self._raw_sleep = sleep
+        # Run actions and waits on the engine's loop thread through *sleep*, without
+        # an executor or real timeouts: for a fake clock, whose sleep only advances it
+        self.inline = inline
+        self._mouse = mouse
+        self._keys = keys
+        self._capture = capture or self._capture_screen
+        self._motion = MotionEmitter(self._set_mouse_position, rate=motion_rate, sleep=sleep, clock=clock)
+        # Matches are picked closest to the anchor: the program's, unless the action has its own
+        self.anchor = check_anchor(anchor or DEFAULT_ANCHOR)
+        self.anchors = AnchorTracker(self._capture, clock)
+        # Playback runs as coroutines; with lookahead, searches start before the delay is over
+        self.detect_lookahead = detect_lookahead
+        self._engine = None
+        # Position checkpoints of named programs, for resuming (see checkpoint.py)
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpointer = None
+
+    # Control flags are set from the GUI, the hotkey listener, signal handlers
+    # or a supervisor thread; every change wakes the engine's waits
+    @property
+    def stop_flag(self) -> bool:
+        return self._stop_flag
+
+    @stop_flag.setter
+    def stop_flag(self, value: bool):
+        self._stop_flag = value
+        self._notify()
+
+    @property
+    def pause_flag(self) -> bool:
+        return self._pause_flag
+
+    @pause_flag.setter
+    def pause_flag(self, value: bool):
+        self._pause_flag = value
+        self._notify()
+
+    @property
+    def skip_pause_flag(self) -> bool:
+        return self._skip_pause_flag
+
+    @skip_pause_flag.setter
+    def skip_pause_flag(self, value: bool):
+        self._skip_pause_flag = value
+        self._notify()
+
+    def _notify(self):
+        engine = self.__dict__.get("_engine")
+        if engine is not None:
+            engine.notify()
+
+    @property
+    def engine(self):
+        """The asyncio playback engine, created on first use."""
+        if self._engine is None:
+            from engine import PlaybackEngine
+            self._engine = PlaybackEngine(self, lookahead=self.detect_lookahead)
+        return self._engine
+
+    @property
+    def mouse(self):
+        """pynput mouse controller, created on first use."""
+        if self._mouse is None:
+            from pynput.mouse import Controller
+            self._mouse = Controller()
+        return self._mouse
+
+    @property
+    def keys(self):
+        """pynput keyboard controller, created on first use."""
+        if self._keys is None:
+            from pynput.keyboard import Controller
+            self._keys = Controller()
+        return self._keys
+
+    def _start_key_listener(self):
+        from pynput.keyboard import Listener
+        self.keyboard_listener = Listener(on_press=self._on_key_press)
+        self.keyboard_listener.start()
 
     def _calculate_program_duration(self, program_sequence: List[Tuple[str, int]]) -> float:
         """Calculate total duration of the program including all iterations."""
@@ -64,14 +232,18 @@ class ActionPlayer:
         
         for script_name, iterations in program_sequence:
             try:
-                actions = mgr.load_script(script_name)
-                script_duration = sum(action.timestamp for action in actions)
+                script_duration = mgr.script_duration(script_name)
                 total_duration += script_duration * iterations
             except Exception:
                 continue
                 
         return total_duration * self.speed
 
+    def _start_duration_calculation(self, program_sequence: List[Tuple[str, int]]):
+        def work():
+            self.total_program_duration = self._calculate_program_duration(program_sequence)
+        threading.Thread(target=work, daemon=True).start()
+
     def _update_progress(self):
         """Update progress information and call callback if available."""
         if self.progress_callback:
@@ -85,18 +257,25 @@ class ActionPlayer:
                 'elapsed_time': self.elapsed_time,
                 'total_duration': self.total_program_duration,
                 'is_paused': self.pause_flag,
-                'is_stopped': self.stop_flag
+                'is_stopped': self.stop_flag,
+                'passes_completed': self.passes_completed,
+                'stop_reason': self.stop_reason,
+                'drift': self.timing.last_drift,
+                'mean_drift': self.timing.mean_drift,
+                'max_drift': self.timing.max_drift,
+                'fast_path_hit_rate': self.probe_hits / self.probe_tries if self.probe_tries else None
             }
             try:
                 self.progress_callback(progress_info)
-            except (tk.TclError, RuntimeError):
+            except _gui_errors():
                 # GUI has been destroyed, stop trying to update it
                 self.stop_flag = True
-                pass
+                self.stop_reason = self.stop_reason or "gui_closed"
 
     def stop_playback(self):
         """Stop playback and clean up all listeners."""
         self.stop_flag = True
+        self.stop_reason = self.stop_reason or "user"
         if self.keyboard_listener:
             self.keyboard_listener.stop()
             self.keyboard_listener = None
@@ -114,6 +293,9 @@ class ActionPlayer:
         self.current_action_delay = 0.0
         self.elapsed_time = 0.0
         self.total_program_duration = 0.0
+        self.paused_time = 0.0
+        self.stop_reason = None
+        self.passes_completed = 0
 
     def update_keys(self, pause_key=None, stop_key=None, skip_pause_key=None, restart_key=None):
         """Update keyboard keys and restart listener with new keys."""
@@ -130,226 +312,41 @@ class ActionPlayer:
             self.skip_pause_key = skip_pause_key
         
         # Restart listener with new keys
-        self.keyboard_listener = KeyListener(on_press=self._on_key_press)
-        self.keyboard_listener.start()
+        self._start_key_listener()
 
-    def replay_program(self, program_sequence: List[Tuple[str, int]]):
-        """Replay a program sequence of scripts with iterations."""
-        from script_manager import ScriptManager
-        mgr = ScriptManager()
-        
-        # Calculate total program duration
-        self.total_program_duration = self._calculate_program_duration(program_sequence)
-        
-        # Start keyboard listener for replay control
-        self.keyboard_listener = KeyListener(on_press=self._on_key_press)
-        self.keyboard_listener.start()
-        print(f"Loop until stopped: {self.loop_until_stopped}")
+    def replay_program(self, program_sequence: List[Tuple[str, int]], scripts: Optional[dict] = None,
+                       program: Optional[str] = None, resume: Optional[dict] = None):
+        """
+        Replay a program sequence of scripts with iterations.
 
-        try:
-            while True:
-                index = 0
-                for script_name, iterations in program_sequence:
-                    self.current_script_name = script_name
-                    self.current_script_total_iterations = iterations
-                    
-                    # Load the script
-                    try:
-                        actions = mgr.load_script(script_name)
-                        self.current_action_total = len(actions)
-                    except Exception as e:
-                        print(f"Failed to load script {script_name}: {e}")
-                        continue
-                    
-                    # Run the script for the specified number of iterations
-                    for iteration in range(iterations):
-                        self.current_script_iteration = iteration + 1
-                        print(f"Running {script_name} (iteration {iteration + 1}/{iterations})")
-                        if self.stop_flag:
-                            break
-                        
-                        while self.pause_flag:
-                            self._sleep(0.2)
-                            if self.stop_flag:
-                                break
-                        
-                        # Use while loop for actions to allow restarting
-                        action_index = 0
-                        reset_counter = 0
-                        while action_index < len(actions):
-                            if self.stop_flag:
-                                break
-                                
-                            act = actions[action_index]
-                            self.current_action_index = action_index + 1
-                            self.current_action_delay = act.timestamp * self.speed
-                            # Update progress before sleep
-                            self._update_progress()
-                            
-                            # Check stop flag again before processing action
-                            if self.stop_flag:
-                                break
-                            
-                            # ----- handle interval sleep -----
-                            delay = act.timestamp * self.speed
-                            
-                            # Apply delay randomization if enabled for this action
-                            if act.delay_randomization:
-                                delay *= random.uniform(act.delay_min_multiplier, act.delay_max_multiplier)
-                            
-                            if delay > 30:
-                                print(f"Delay: {delay}")
-                            self._sleep(delay)
-                            
-                            # Check stop flag after sleep
-                            if self.stop_flag:
-                                break
-                            
-                            # Update elapsed time
-                            self.elapsed_time += delay
-                            
-                            # ----- perform action -----
-                            if self.stop_flag:
-                                break
-                            if act.type == ActionType.MOUSE:
-                                if self._do_mouse(act) == 0:
-                                    # Reset to start of actions loop
-                                    action_index = 0
-                                    reset_counter += 1
-                                    print(f"Reset counter: {reset_counter}")
-                                    time.sleep(1)
-                                    if reset_counter > 20:
-                                        self.stop_flag = True
-                                        break
-                                    continue
-                            else:
-                                self._do_key(act)  # type: ignore[arg-type]
-                            
-                            # Move to next action
-                            action_index += 1
-
-                        # Check stop flag before moving to next iteration
-                        if self.stop_flag:
-                            break
-                            
-                        self._sleep(0.2)
-                    if self.stop_flag:
-                        break
-
-                if self.stop_flag:
-                    self._sleep(0.2)
-                    break
-                # If not looping, break after first iteration
-                if not self.loop_until_stopped:
-                    self.pause_flag = True
+        *scripts* maps script names to already parsed actions (see
+        ``ScriptManager.preload``); other scripts are streamed from disk.
+        With a *program* name, the position is checkpointed as configured by
+        *checkpoint_every*; *resume* is a position from
+        ``checkpoint.load_resume`` to start from.
+        Runs the engine on its own event loop, so it cannot be called from a
+        coroutine (await ``self.engine.run_program`` there instead).
+        """
+        self.checkpointer = None
+        if program and self.checkpoint_every != "off":
+            from checkpoint import Checkpointer, checkpoint_path
+            try:
+                self.checkpointer = Checkpointer(checkpoint_path(program), program, program_sequence,
+                                                 self.checkpoint_every, self.checkpoint_interval)
+            except (OSError, ValueError) as e:
+                print(f"Checkpoints disabled: {e}")
+        import asyncio
+        asyncio.run(self.engine.run_program(program_sequence, scripts, resume=resume))
 
-        finally:
-            if self.keyboard_listener:
-                self.keyboard_listener.stop()
+    def _play_script(self, actions):
+        """Play one pass over *actions* (any sequence raising IndexError past the end)."""
+        import asyncio
+        asyncio.run(self.engine.play_script(actions))
 
     def replay_program_test(self, program_sequence: List[Tuple[str, int]]):
-        """Replay a program sequence of scripts with iterations."""
-        from script_manager import ScriptManager
-        mgr = ScriptManager()
-        
-        # Calculate total program duration
-        self.total_program_duration = self._calculate_program_duration(program_sequence)
-        
-        # Start keyboard listener for replay control
-        self.keyboard_listener = KeyListener(on_press=self._on_key_press)
-        self.keyboard_listener.start()
-        print(f"Loop until stopped: {self.loop_until_stopped}")
-
-        try:
-            while True:
-                index = 0
-                for script_name, iterations in program_sequence:
-                    self.current_script_name = script_name
-                    self.current_script_total_iterations = iterations
-                    
-                    print(f"index: {index}")
-                    index += 1
-                    # Load the script
-                    try:
-                        actions = mgr.load_script(script_name)
-                        self.current_action_total = len(actions)
-                    except Exception as e:
-                        print(f"Failed to load script {script_name}: {e}")
-                        continue
-                    
-                    # Run the script for the specified number of iterations
-                    for iteration in range(iterations):
-                        self.current_script_iteration = iteration + 1
-                        print(f"Running {script_name} (iteration {iteration + 1}/{iterations})")
-                        if self.stop_flag:
-                            break
-                        
-                        # Use while loop for actions to allow restarting
-                        action_index = 0
-                        while action_index < len(actions):
-                            if self.stop_flag:
-                                break
-                                
-                            act = actions[action_index]
-                            self.current_action_index = action_index + 1
-                            self.current_action_delay = act.timestamp * self.speed
-                            
-                            # Update progress before sleep
-                            self._update_progress()
-                            
-                            # Check stop flag again before processing action
-                            if self.stop_flag:
-                                break
-                            
-                            # ----- handle interval sleep -----
-                            delay = act.timestamp * self.speed
-                            
-                            # Apply delay randomization if enabled for this action
-                            if act.delay_randomization:
-                                delay *= random.uniform(act.delay_min_multiplier, act.delay_max_multiplier)
-                            
-                            if delay > 30:
-                                print(f"Delay: {delay}")
-                            self._sleep(delay)
-                            
-                            # Check stop flag after sleep
-                            if self.stop_flag:
-                                break
-                            
-                            # Update elapsed time
-                            self.elapsed_time += delay
-                            
-                            # ----- perform action -----
-                            if self.stop_flag:
-                                break
-                            if act.type == ActionType.MOUSE:
-                                if self._do_mouse(act) == 0:
-                                    # Reset to start of actions loop
-                                    action_index = 0
-                                    continue
-                            else:
-                                self._do_key(act)  # type: ignore[arg-type]
-                            
-                            # Move to next action
-                            action_index += 1
-
-                        # Check stop flag before moving to next iteration
-                        if self.stop_flag:
-                            break
-                            
-                        self._sleep(0.2)
-                    if self.stop_flag:
-                        break
-
-                if self.stop_flag:
-                    break
-                # If not looping, break after first iteration
-                if not self.loop_until_stopped:
-                    self.pause_flag = True
-
-        finally:
-            if self.keyboard_listener:
-                self.keyboard_listener.stop()
+        """Replay a program sequence without the limit on restarts after a missed target."""
+        import asyncio
+        asyncio.run(self.engine.run_program(program_sequence, reset_limit=None))
 
     def _on_key_press(self, key):
         try:
@@ -363,6 +360,7 @@ class ActionPlayer:
             # Handle stop
             if hasattr(key, 'char') and key.char and key.char.lower() == self.stop_key.lower():
                 self.stop_flag = True
+                self.stop_reason = "user"
                 print("Script stopped via keyboard.")
                 self._update_progress()  # Update progress to show stop state
                 return
@@ -378,54 +376,277 @@ class ActionPlayer:
 
     # ---------------------------------------------------------------------
     def _sleep(self, total):
+        # Polling wait on the injected sleep: the engine uses it in inline mode
+        # (a fake clock drives playback); real playback awaits flag changes
         elapsed = 0.0
         while elapsed < total and not self.stop_flag:
             if self.pause_flag:
-                time.sleep(0.1)  # Check pause more frequently
+                paused_from = self._clock()
+                self._raw_sleep(0.1)  # Check pause more frequently
+                self.paused_time += self._clock() - paused_from
                 continue
             if self.skip_pause_flag:
                 self.skip_pause_flag = False
                 break
-            time.sleep(self._g_sleep)
+            self._raw_sleep(self._g_sleep)
             elapsed += self._g_sleep
             # Check stop flag more frequently during long delays
             if elapsed > 1.0 and self.stop_flag:
                 break
 
-    def _do_mouse(self, act: MouseAction):
-        x, y = act.position
-        if act.color_toggle:
-            shot = "_area.png"
-            area_x, area_y, area_w, area_h = act.color_area
-            screenshot_area(area_x, area_y, area_w, area_h, shot)
+    def _locate(self, act: MouseAction):
+        """Search the action's area, learned sub-regions first; returns (clusters, capture time)."""
+        if self.fast_path and act.color is not None and not act.template:
+            found = self._probe(act)
+            if found:
+                return found
+        area = tuple(act.color_area)
+        if self.roi is None:
+            return self._search(act, area)
+        key = self._action_key
+        min_size = (0, 0)
+        if act.template:
+            ph, pw = decode_patch(act.template).shape[:2]
+            min_size = (pw, ph)
+        pixels = 0
+        for stage, rect in self.roi.regions(key, area, min_size):
+            clusters, captured_at = self._search(act, rect)
+            pixels += rect[2] * rect[3]
+            if stage != "area":
+                clusters = self.roi.complete(clusters, rect, area)
+            if clusters:
+                self.roi.record(stage, pixels, area)
+                return clusters, captured_at
+        self.roi.record(None, pixels, area)
+        return clusters, captured_at
+
+    def _probe(self, act: MouseAction):
+        """Fast path: the recorded color around the last hit (or recorded position), as one cluster."""
+        import numpy as np
+
+        x, y = self._last_hits.get(self._action_key, act.position)
+        r = self.probe_radius
+        ax, ay, aw, ah = act.color_area
+        x0, y0 = max(ax, x - r), max(ay, y - r)
+        x1, y1 = min(ax + aw, x + r + 1), min(ay + ah, y + r + 1)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        self.probe_tries += 1
+        captured_at = self._clock()
+        with TRACER.span("probe"):
+            patch = np.asarray(self._capture(x0, y0, x1 - x0, y1 - y0))[..., :3]
+            diff = np.abs(patch.astype(np.int16) - np.asarray(act.color, dtype=np.int16))
+            ys, xs = np.nonzero(np.all(diff <= act.color_tolerance, axis=-1))
+        hit = len(xs) >= self.probe_min
+        if hit:
+            self.probe_hits += 1
+        TRACER.counter("fast_path", tries=self.probe_tries, hits=self.probe_hits)
+        if not hit:
+            return None
+        return [(x0 + round(float(xs.mean())), y0 + round(float(ys.mean())))], captured_at
+
+    def probe_stats(self) -> dict:
+        return {"tries": self.probe_tries, "hits": self.probe_hits,
+                "hit_rate": self.probe_hits / self.probe_tries if self.probe_tries else 0.0}
+
+    @property
+    def _action_key(self):
+        return self.current_script_name, self.current_action_index
+
+    def _search(self, act: MouseAction, rect):
+        """Capture *rect* (x, y, w, h) and search it for the action's target."""
+        area_x, area_y, area_w, area_h = rect
+        captured_at = self._clock()
+        served = False
+        if act.template:
+            with TRACER.span("capture", w=area_w, h=area_h):
+                shot = self._capture(area_x, area_y, area_w, area_h)
+            with TRACER.span("match"):
+                matches = match_template(shot, decode_patch(act.template), threshold=act.match_threshold,
+                                         offset=(area_x, area_y), downscale=self.template_downscale)
+            clusters = [(mx, my) for mx, my, _ in matches]
+            served = True
+        elif self.vision is not None:
+            try:
+                with TRACER.span("vision", w=area_w, h=area_h):
+                    clusters, shot = self.vision.detect(rect, act.color, offset=(area_x, area_y),
+                                                        tolerance=act.color_tolerance)
+                served = True
+            except RuntimeError as e:
+                from vision_service import ServiceUnavailable
+                if isinstance(e, ServiceUnavailable):
+                    print(f"Vision service unavailable, detecting in-process: {e}")
+                    self.vision.close()
+                    self.vision = None
+                else:  # only this request failed: search it here, keep the service
+                    print(f"Vision service request failed, detecting in-process: {e}")
+        if not served:
+            with TRACER.span("capture", w=area_w, h=area_h):
+                shot = self._capture(area_x, area_y, area_w, area_h)
             #found = find_color_mean(shot, act.color, offset=(area_x, area_y), tolerance=0)
             #clusters = find_color_clusters(shot, act.color, offset=(area_x, area_y), tolerance=0)
-            clusters = find_color_connected_clusters(shot, act.color, offset=(area_x, area_y), tolerance=act.color_tolerance)
-            
-            if clusters:
-                # Find the cluster closest to the player position
-                closest_cluster = find_closest_cluster(clusters, player_pos)
-                if closest_cluster:
-                    x, y = closest_cluster
-                    print(f"Color found: {act.color} at {x}, {y} (closest to player)")
-                else:
-                    # Fallback to random cluster if something goes wrong
-                    x, y = clusters[random.randint(0, len(clusters) - 1)]
-                    print(f"Color found: {act.color} at {x}, {y} (random)")
-            else:
-                print(f"Color not found: {act.color}")
+            with TRACER.span("detect"):
+                clusters = self.detector.find(shot, act.color, offset=(area_x, area_y), tolerance=act.color_tolerance)
+        if shot is not None:
+            self.frames.add(shot, None if act.template else act.color, act.color_tolerance, clusters,
+                            area=list(rect), template=bool(act.template),
+                            script=self.current_script_name, action=self.current_action_index)
+        return clusters, captured_at
+
+    def _track(self, act: MouseAction, key, clusters, seen_at):
+        """Follow the target over extra captures if needed; returns the predicted click position."""
+        tracker = self.tracker
+        tracker.follow(key, seen_at, clusters,
+                       lambda: find_closest_cluster(clusters, self._anchor_point(act)) or random.choice(clusters))
+        # One capture says where the target is, a second one where it is going
+        for _ in range(self.track_frames - len(tracker.samples(key, seen_at))):
+            if self.stop_flag:
+                break
+            self._raw_sleep(self.track_interval)
+            clusters, seen_at = self._locate(act)
+            pick = tracker.nearest(key, seen_at, clusters)
+            if pick is None:
+                break  # lost it, or it jumped: predict from what we have
+            tracker.observe(key, seen_at, *pick)
+        return tracker.predict(key)
+
+    def _do_mouse(self, act: MouseAction):
+        if act.color_toggle:
+            target = self._find_target(act)
+            if target is None:
                 return 0
+        else:
+            target = (*act.position, None)
+        return self._click(act, *target)
 
-        MOUSE.position = (x, y)
-        time.sleep(0.06)
-        MOUSE.click(_BUTTON_MAP.get(act.button, Button.left))
+    def _find_target(self, act: MouseAction, final: bool = True):
+        """
+        Where to click for a color/template action: ``(x, y, tracked key)``,
+        or None if the target is not on screen. A search that is not *final*
+        (started ahead of time) stays quiet about a miss.
+        """
+        detect_from = self._clock()
+        clusters, seen_at = self._locate(act)
+        target = "Template" if act.template else f"Color {act.color}"
+        tracked = None
+        if clusters and act.track_motion:
+            tracked = self._action_key
+            x, y = self._track(act, tracked, clusters, seen_at)
+            print(f"{target} found, clicking predicted position {x}, {y}")
+        elif clusters:
+            # Find the cluster closest to the anchor
+            anchor = self._anchor_point(act)
+            with TRACER.span("select", clusters=len(clusters)):
+                closest_cluster = find_closest_cluster(clusters, anchor)
+            if closest_cluster:
+                x, y = closest_cluster
+                print(f"{target} found at {x}, {y} (closest to anchor {anchor[0]}, {anchor[1]})")
+            else:
+                # Fallback to random cluster if something goes wrong
+                x, y = clusters[random.randint(0, len(clusters) - 1)]
+                print(f"{target} found at {x}, {y} (random)")
+        else:
+            self._detect_time = self._clock() - detect_from
+            if final:
+                print(f"{target} not found")
+                self._dump_frames("not_found")
+            return None
+        self._detect_time = self._clock() - detect_from
+        self._last_hits[self._action_key] = (x, y)
+        if self.roi is not None:
+            self.roi.hit(self._action_key, act.color_area, x, y)
+        return x, y, tracked
+
+    def _sees(self, act: MouseAction) -> bool:
+        """Whether the target of *act* is on screen (control-flow conditions)."""
+        detect_from = self._clock()
+        clusters, _ = self._locate(act)
+        self._detect_time = self._clock() - detect_from
+        return bool(clusters)
+
+    def _click(self, act: MouseAction, x: int, y: int, tracked=None):
+        self.mouse.position = (x, y)
+        with TRACER.span("click_sleep"):
+            self._raw_sleep(0.06)
+        button = _button(act.button)
+        if not act.press_duration and not act.path:
+            with TRACER.span("inject"):
+                self.mouse.click(button)
+            if tracked:
+                self.tracker.clicked(tracked, self._clock())
+            return 1
+        # Held press or drag: replay the hold time and the path relative to
+        # where the press actually landed (it may have moved via color search)
+        self.mouse.press(button)
+        if tracked:
+            self.tracker.clicked(tracked, self._clock())
+        try:
+            held = 0.0
+            if act.path:
+                px, py = act.position
+                self._motion.play(act.path, self.speed, offset=(x - px, y - py),
+                                  should_stop=lambda: self.stop_flag)
+                held = act.path[-1][2] * self.speed
+            remaining = act.press_duration * self.speed - held
+            if remaining > 0:
+                self._raw_sleep(remaining)
+        finally:
+            self.mouse.release(button)
         return 1
 
+    def _load_roi(self, script_name: str):
+        if self.roi is not None:
+            self.roi.load(roi_path(script_name), script_name)
+
+    def _save_roi(self, script_name: str):
+        if self.roi is None or not self.save_learned:
+            return
+        try:
+            self.roi.save(roi_path(script_name), script_name)
+        except OSError as e:
+            print(f"Failed to save learned regions for {script_name}: {e}")
+
+    def _anchor_point(self, act: MouseAction):
+        spec = act.anchor or self.anchor
+        try:
+            with TRACER.span("anchor", mode=spec.get("mode")):
+                return self.anchors.resolve(spec, act.position)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Bad anchor {spec!r}, using the recorded position: {e}")
+            return tuple(act.position)
+
+    def _capture_screen(self, x, y, w, h):
+        return grab_area(x, y, w, h)
+
+    def _dump_frames(self, reason: str):
+        try:
+            where = self.frames.dump(reason)
+        except OSError as e:
+            print(f"Failed to write diagnostic frames: {e}")
+            return
+        if where:
+            print(f"Diagnostic frames written to {where}")
+
+    def _set_mouse_position(self, pos):
+        self.mouse.position = pos
+
+    def _do_move(self, act: MouseMoveAction):
+        self._motion.play(act.path, self.speed, should_stop=lambda: self.stop_flag)
+
     def _do_key(self, act: KeyboardAction):
         key_obj = _to_key(act.key)
         if not key_obj:
             return
-        time.sleep(0.01)
-        KEYS.press(key_obj)
-        time.sleep(0.06)
-        KEYS.release(key_obj)
\ No newline at end of file
+        with TRACER.span("key_sleep"):
+            self._raw_sleep(0.01)
+            self.keys.press(key_obj)
+            self._raw_sleep(0.06)
+            self.keys.release(key_obj)
+
+    def _do_text(self, act: TextAction):
+        self._raw_sleep(0.01)
+        for i, ch in enumerate(act.text):
+            if i and act.char_interval:
+                self._raw_sleep(act.char_interval * self.speed)
+            self.keys.press(ch)
+            self.keys.release(ch)
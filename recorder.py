@@ -1,6 +1,8 @@
 """Logic for listening & recording user input to a list[Action]."""
 from __future__ import annotations
 
+import queue
+import threading
 import time
 from typing import List
 
@@ -8,14 +10,16 @@ import pynput
 from pynput import mouse, keyboard
 from pynput.keyboard import Key
 
-from actions import KeyboardAction, MouseAction
-from utils import save_json, SCRIPTS_DIR
+from actions import KeyboardAction, MouseAction, MouseMoveAction
+from paths import PathSimplifier
+from utils import grab_area, save_json, SCRIPTS_DIR
 
 
 class ActionRecorder:
-    def __init__(self, color_toggle_key=Key.shift_l, stop_recording_key=Key.tab, color_area_width=300, color_area_height=500):
-        self._actions: List[MouseAction | KeyboardAction] = []
-        self._last_action_time = None  # Track the time of the last action
+    def __init__(self, color_toggle_key=Key.shift_l, stop_recording_key=Key.tab, color_area_width=300, color_area_height=500,
+                 record_moves=True, path_tolerance=2.0, template_size=0):
+        self._actions: List[MouseAction | KeyboardAction | MouseMoveAction] = []
+        self._last_action_time = None  # perf_counter() stamp of the last action
         self._color_toggle_key = color_toggle_key  # Key to toggle pixel color recording
         self._color_toggle_active = False  # Whether pixel color should be recorded for the next mouse click
         self._stop_recording_key = stop_recording_key  # Key to stop recording
@@ -24,28 +28,30 @@ class ActionRecorder:
         self._stop_recording = False  # Flag to stop recording
         self._mouse_listener = None
         self._keyboard_listener = None
+        # Listener callbacks only stamp events and hand them over; the worker
+        # thread does the slow part (pixel sampling) and builds the actions.
+        self._events: queue.SimpleQueue = queue.SimpleQueue()
+        self._worker = None
+        self._record_moves = record_moves  # Record cursor paths between clicks (drags are always recorded)
+        self._hover_path = PathSimplifier(path_tolerance)
+        self._drag_path = PathSimplifier(path_tolerance)
+        self._pressed: tuple[MouseAction, float] | None = None  # (action, press time) until the release arrives
+        self._template_size = template_size  # side of the patch saved with color clicks (0 = none)
 
     # ---------- mouse callbacks ----------
     def _on_click(self, x, y, button, pressed):
-        if not pressed or self._stop_recording:
+        if self._stop_recording:
             return
-        btn_str = str(button)
-        color = None
-        color_area = None
-        if self._color_toggle_active:
-            import pyautogui
-            color = pyautogui.pixel(x, y)
-            width = self._color_area_width
-            height = self._color_area_height
-            color_area = (x - width // 2, y - height // 2, width, height)
-        now = time.time()
-        interval = now - self._last_action_time if self._last_action_time else 0.1
-        self._actions.append(
-            MouseAction(interval, btn_str, (x, y), self._color_toggle_active, color, color_area)
-        )
-        self._last_action_time = now
+        if not pressed:
+            self._events.put((time.perf_counter(), "release", x, y))
+            return
+        self._events.put((time.perf_counter(), "click", x, y, str(button), self._color_toggle_active))
         self._color_toggle_active = False  # Reset after use
 
+    def _on_move(self, x, y):
+        if not self._stop_recording:
+            self._events.put((time.perf_counter(), "move", x, y))
+
     # ---------- keyboard callbacks ----------
     def _on_press(self, key):
         if key == self._stop_recording_key or self._stop_recording:
@@ -54,11 +60,102 @@ class ActionRecorder:
         if key == self._color_toggle_key:
             self._color_toggle_active = True
             return
-        now = time.time()
-        interval = now - self._last_action_time if self._last_action_time else 0
-        self._actions.append(KeyboardAction(interval, str(key)))
+        self._events.put((time.perf_counter(), "key", str(key)))
+
+    # ---------- event worker ----------
+    def _process_events(self):
+        """Turn queued input events into actions until the ``None`` sentinel arrives."""
+        pixel = None
+        while True:
+            event = self._events.get()
+            if event is None:
+                break
+            now, kind = event[0], event[1]
+            if kind == "move":
+                if self._pressed:
+                    self._drag_path.add(event[2], event[3], now)
+                elif self._record_moves:
+                    self._hover_path.add(event[2], event[3], now)
+                continue
+            if kind == "release":
+                self._finish_press(now, event[2], event[3])
+                continue
+            self._flush_hover()
+            if kind == "click":
+                _, _, x, y, btn_str, color_toggle = event
+                color = None
+                color_area = None
+                if color_toggle:
+                    if pixel is None:
+                        import pyautogui
+                        pixel = pyautogui.pixel
+                    try:
+                        color = tuple(pixel(x, y))
+                    except Exception as e:
+                        print(f"Failed to sample color at {x}, {y}: {e}")
+                    width = self._color_area_width
+                    height = self._color_area_height
+                    color_area = (x - width // 2, y - height // 2, width, height)
+                    template = self._grab_template(x, y)
+                interval = now - self._last_action_time if self._last_action_time else 0.1
+                action = MouseAction(interval, btn_str, (x, y), color_toggle, color, color_area)
+                if color_toggle:
+                    action.template = template
+                self._actions.append(action)
+                self._pressed = (action, now)
+                self._drag_path.add(x, y, now)
+            else:
+                interval = now - self._last_action_time if self._last_action_time else 0
+                self._actions.append(KeyboardAction(interval, event[2]))
+            self._last_action_time = now
+        self._finish_press(self._last_action_time or 0.0, None, None)
+        self._flush_hover()
+
+    def _grab_template(self, x, y):
+        """Patch around the click, saved so playback can match it instead of one color."""
+        size = self._template_size
+        if not size:
+            return None
+        try:
+            from template import encode_patch
+            return encode_patch(grab_area(x - size // 2, y - size // 2, size, size))
+        except Exception as e:
+            print(f"Failed to capture template at {x}, {y}: {e}")
+            return None
+
+    def _flush_hover(self):
+        """Emit the cursor path recorded since the last action, if it went anywhere."""
+        path = self._hover_path
+        if not path.moved():
+            path.finish()
+            return
+        start, end = path.start_time, path.end_time
+        interval = start - self._last_action_time if self._last_action_time else 0.1
+        self._actions.append(MouseMoveAction(interval, path.finish(start)))
+        self._last_action_time = end
+
+    def _finish_press(self, now, x, y):
+        """Complete the pending press with its hold time and drag path."""
+        if not self._pressed:
+            return
+        action, pressed_at = self._pressed
+        self._pressed = None
+        if x is not None:
+            self._drag_path.add(x, y, now)
+        action.press_duration = round(max(0.0, now - pressed_at), 4)
+        if self._drag_path.moved():
+            action.path = self._drag_path.finish(pressed_at)
+        else:
+            self._drag_path.finish()
+        # The next interval starts at the release; the hold is replayed by the press itself
         self._last_action_time = now
 
+    def _stop_worker(self):
+        if self._worker:
+            self._events.put(None)
+            self._worker.join()
+            self._worker = None
+
     def stop_recording(self):
         """Stop recording manually."""
         self._stop_recording = True
@@ -73,25 +170,29 @@ class ActionRecorder:
     def cleanup(self):
         """Clean up all listeners and resources."""
         self.stop_recording()
+        # Drain whatever the listeners queued before they stopped
+        self._stop_worker()
 
     # ---------- public API ----------
     def record(self):
         try:
-            self._mouse_listener = mouse.Listener(on_click=self._on_click)
+            self._worker = threading.Thread(target=self._process_events, daemon=True)
+            self._worker.start()
+            self._mouse_listener = mouse.Listener(on_click=self._on_click, on_move=self._on_move)
             self._keyboard_listener = keyboard.Listener(on_press=self._on_press)
-            
+
             self._mouse_listener.start()
             self._keyboard_listener.start()
-            
+
             # Wait for keyboard listener to stop (when stop key is pressed)
             self._keyboard_listener.join()
-            
+
         except Exception as e:
             print(f"Error during recording: {e}")
         finally:
             # Ensure listeners are stopped
             self.cleanup()
-        
+
         return self._actions
 
     def save(self, name: str):
@@ -99,4 +200,4 @@ class ActionRecorder:
             name += ".json"
         out = SCRIPTS_DIR / name
         save_json([a.__dict__ for a in self._actions], out)
-        return out
\ No newline at end of file
+        return out
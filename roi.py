@@ -0,0 +1,155 @@
+"""Learned search regions: where each action's target has actually been found."""
+from __future__ import annotations
+
+from collections import deque
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from utils import SCRIPTS_DIR, load_json, save_json
+
+Rect = Tuple[int, int, int, int]  # (x, y, w, h)
+
+
+def roi_path(script_name: str, directory: Path = SCRIPTS_DIR) -> Path:
+    """Learned regions of a script: ``my_script.json`` -> ``my_script.roi`` next to it."""
+    return directory / (Path(script_name).stem + ".roi")
+
+
+def _clip(rect: Rect, area: Rect) -> Optional[Rect]:
+    x0, y0 = max(rect[0], area[0]), max(rect[1], area[1])
+    x1 = min(rect[0] + rect[2], area[0] + area[2])
+    y1 = min(rect[1] + rect[3], area[1] + area[3])
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def _percentile(sorted_values: List[int], q: float) -> int:
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))]
+
+
+class _Stats:
+    __slots__ = ("area", "hits", "box")
+
+    def __init__(self, area: Rect, history: int, hits=()):
+        self.area = area
+        self.hits = deque(hits, maxlen=history)
+        self.box: Optional[Rect] = None  # percentile box, recomputed after new hits
+
+
+class RoiLearner:
+    """
+    Per-action hit positions, turned into smaller regions to search first.
+
+    For an action's ``color_area``, :meth:`regions` yields the window of
+    *window* pixels around the last hit, then the *lower*-*upper* percentile
+    bounding box of the recent hits (once there are *min_hits*), each widened
+    by *margin* and clipped to the area, and finally the area itself. The
+    player searches them in order and stops at the first one with a match
+    clear of the region's inner edges (see :meth:`complete`).
+    Hits are forgotten when an action's area changes (edited in the editor).
+    """
+
+    def __init__(self, window: int = 64, margin: int = 16, history: int = 256, min_hits: int = 8,
+                 lower: float = 0.02, upper: float = 0.98):
+        self.window = window
+        self.margin = margin
+        self.history = history
+        self.min_hits = min_hits
+        self.lower = lower
+        self.upper = upper
+        self._actions: Dict[Hashable, _Stats] = {}
+        self.found = {"last": 0, "box": 0, "area": 0}
+        self.misses = 0
+        self.pixels = 0  # searched
+        self.area_pixels = 0  # what full-area searches would have cost
+
+    def _stats(self, key: Hashable, area: Rect) -> _Stats:
+        stats = self._actions.get(key)
+        if stats is None or stats.area != area:
+            stats = self._actions[key] = _Stats(area, self.history)
+        return stats
+
+    def regions(self, key: Hashable, area: Rect, min_size: Tuple[int, int] = (0, 0)) -> List[Tuple[str, Rect]]:
+        """``(stage, rect)`` pairs to search in order; the last one is always the full *area*."""
+        area = tuple(area)
+        stats = self._stats(key, area)
+        out = []
+        if stats.hits:
+            # Big enough to hold a template patch centred anywhere near the hit
+            w = max(self.window, min_size[0] + 2 * self.margin)
+            h = max(self.window, min_size[1] + 2 * self.margin)
+            x, y = stats.hits[-1]
+            last = _clip((x - w // 2, y - h // 2, w, h), area)
+            if last:
+                out.append(("last", last))
+        if len(stats.hits) >= self.min_hits:
+            if stats.box is None:
+                xs = sorted(p[0] for p in stats.hits)
+                ys = sorted(p[1] for p in stats.hits)
+                x0, x1 = _percentile(xs, self.lower), _percentile(xs, self.upper)
+                y0, y1 = _percentile(ys, self.lower), _percentile(ys, self.upper)
+                pad_x = self.margin + min_size[0] // 2
+                pad_y = self.margin + min_size[1] // 2
+                stats.box = _clip((x0 - pad_x, y0 - pad_y, x1 - x0 + 2 * pad_x + 1, y1 - y0 + 2 * pad_y + 1), area)
+            if stats.box and not (out and stats.box == out[0][1]):
+                out.append(("box", stats.box))
+        out = [(stage, r) for stage, r in out if r[2] * r[3] < area[2] * area[3]]
+        out.append(("area", area))
+        return out
+
+    def complete(self, clusters, rect: Rect, area: Rect):
+        """
+        The matches in *clusters* at least *margin* pixels from every edge of
+        *rect* that cuts through *area*; closer ones may be a target cut in
+        half by the smaller region, with a shifted centroid.
+        """
+        m = self.margin
+        x0 = rect[0] + m if rect[0] > area[0] else rect[0]
+        y0 = rect[1] + m if rect[1] > area[1] else rect[1]
+        x1 = rect[0] + rect[2] - m if rect[0] + rect[2] < area[0] + area[2] else rect[0] + rect[2]
+        y1 = rect[1] + rect[3] - m if rect[1] + rect[3] < area[1] + area[3] else rect[1] + rect[3]
+        return [c for c in clusters if x0 <= c[0] < x1 and y0 <= c[1] < y1]
+
+    def record(self, stage: Optional[str], pixels: int, area: Rect):
+        """Account for one lookup: the *stage* that matched (None if none did), *pixels* searched."""
+        self.pixels += pixels
+        self.area_pixels += area[2] * area[3]
+        if stage is None:
+            self.misses += 1
+        else:
+            self.found[stage] += 1
+
+    def hit(self, key: Hashable, area: Rect, x: int, y: int):
+        """Record that the action's target was clicked at (x, y)."""
+        stats = self._stats(key, tuple(area))
+        stats.hits.append((int(x), int(y)))
+        stats.box = None
+
+    # ---------- persistence ----------
+    def load(self, path: Path, prefix: Hashable = None):
+        """Add the hits saved in *path*, keyed ``(prefix, action index)``; a missing file is fine."""
+        try:
+            data = load_json(path)
+        except (OSError, ValueError):
+            return
+        for index, entry in data.get("actions", {}).items():
+            try:
+                area = tuple(entry["area"])
+                self._actions[(prefix, int(index))] = _Stats(area, self.history, (tuple(p) for p in entry["hits"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+
+    def save(self, path: Path, prefix: Hashable = None):
+        """Write the hits of every ``(prefix, index)`` action to *path*."""
+        actions = {str(key[1]): {"area": list(s.area), "hits": [list(p) for p in s.hits]}
+                   for key, s in self._actions.items()
+                   if isinstance(key, tuple) and key[0] == prefix and s.hits}
+        if actions:
+            save_json({"version": 1, "actions": actions}, path)
+
+    def stats(self) -> dict:
+        searches = sum(self.found.values()) + self.misses
+        return {**{f"found_{k}": v for k, v in self.found.items()}, "misses": self.misses,
+                "searches": searches,
+                "pixel_ratio": self.pixels / self.area_pixels if self.area_pixels else 1.0}
@@ -1,12 +1,280 @@
 """High‑level operations: save/load scripts, sequences, etc."""
 from __future__ import annotations
 
+import json
+import mmap
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Tuple
+from typing import Iterable, Iterator, List, Tuple
 
-from actions import Action, KeyboardAction, MouseAction
+from actions import Action, ActionType, ControlOp, KeyboardAction, MouseAction, MouseMoveAction, TextAction
+from control import CompiledScript, compile_script
 from utils import load_json, save_json, PROGRAMS_DIR, SCRIPTS_DIR
 
+# Keys that can be folded into a TextAction, mapped to the character they type
+_TEXT_KEYS = {"Key.space": " "}
+
+
+def action_duration(action: Action) -> float:
+    """
+    Scheduled time (seconds) an action accounts for in a script: its interval
+    plus what it replays itself (typing, a held press or drag, a cursor path),
+    since the recorder starts the next interval where that ends.
+    """
+    kind = action.type
+    if kind == ActionType.TEXT:
+        return action.timestamp + max(len(action.text) - 1, 0) * action.char_interval
+    if kind == ActionType.MOUSE:
+        return action.timestamp + max(action.press_duration, action.path[-1][2] if action.path else 0.0)
+    if kind == ActionType.MOUSE_MOVE:
+        return action.timestamp + (action.path[-1][2] if action.path else 0.0)
+    return action.timestamp
+
+
+def actions_duration(actions: Iterable[Action]) -> float:
+    """Sum of the scheduled time of *actions* (one pass, speed 1.0)."""
+    return sum(action_duration(a) for a in actions)
+
+
+def action_from_dict(entry: dict) -> Action:
+    """Build the action matching a saved script entry."""
+    if "op" in entry:
+        return ControlOp(**entry)
+    if "button" in entry:
+        return MouseAction(**entry)
+    if "path" in entry:
+        return MouseMoveAction(**entry)
+    if "text" in entry:
+        return TextAction(**entry)
+    return KeyboardAction(**entry)
+
+
+def has_control_flow(path: Path | str) -> bool:
+    """
+    Whether a script file may have control-flow entries, found without
+    parsing it: they have an ``"op"`` key. A text action typing ``op``
+    matches too, which only means the script is compiled rather than streamed.
+    """
+    with open(path, "rb") as f:
+        if not f.seek(0, 2):
+            return False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return data.find(b'"op"') >= 0
+
+
+class LoadedScript(tuple):
+    """A fully parsed script: read-only, with the part of the ScriptStream interface playback uses."""
+
+    def close(self):
+        pass
+
+
+class ScriptStream:
+    """
+    Incrementally parsed, randomly addressable view of a script file.
+
+    Actions are decoded from the JSON array on demand, *read_ahead* at a time,
+    and at most *window* of them are kept in memory. The byte offset of every
+    action seen so far is remembered, so going back (e.g. restarting at
+    index 0) is a seek plus a small re-parse rather than a reload.
+    """
+
+    def __init__(self, path: Path | str, window: int = 4096, read_ahead: int = 64, chunk_size: int = 1 << 16):
+        self.path = Path(path)
+        self._size = self.path.stat().st_size
+        self._file = open(self.path, "rb")
+        self._window = max(window, read_ahead + 1)  # room for the requested action and its read-ahead
+        self._read_ahead = read_ahead
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._offsets = array("q")          # file offset of every action found so far
+        self._cache: OrderedDict[int, Action] = OrderedDict()
+        self._length: int | None = None     # known once the closing bracket was seen
+        self._seek(0, 0)
+
+    # ---------- parser ----------
+    def _seek(self, offset: int, index: int):
+        self._file.seek(offset)
+        # latin-1 maps bytes 1:1 to characters, so string positions are file offsets
+        self._buf = ""
+        self._raw = b""
+        self._buf_start = offset
+        self._pos = 0
+        self._next_index = index
+        self._eof = False
+        self._done = False
+        self._opened = offset > 0
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        # Drop what was already consumed before growing the buffer
+        self._raw = self._raw[self._pos:] + chunk
+        self._buf = self._buf[self._pos:] + chunk.decode("latin-1")
+        self._buf_start += self._pos
+        self._pos = 0
+        return True
+
+    def _skip(self, chars: str):
+        while True:
+            buf, pos = self._buf, self._pos
+            while pos < len(buf) and buf[pos] in chars:
+                pos += 1
+            self._pos = pos
+            if pos < len(buf) or not self._fill():
+                return
+
+    def _parse_next(self) -> Action | None:
+        """Decode the action at the parser position, or None at the end."""
+        if self._done:
+            return None
+        if not self._opened:
+            self._skip(" \t\r\n")
+            if self._buf[self._pos:self._pos + 1] != "[":
+                raise ValueError(f"{self.path.name}: expected a JSON array of actions")
+            self._pos += 1
+            self._opened = True
+        self._skip(" \t\r\n,")
+        if self._pos >= len(self._buf) or self._buf[self._pos] == "]":
+            self._done = True
+            self._length = self._next_index
+            return None
+        while True:
+            try:
+                entry, end = self._decoder.raw_decode(self._buf, self._pos)
+                break
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+        raw = self._raw[self._pos:end]
+        if not raw.isascii():
+            entry = json.loads(raw)  # re-decode UTF-8 text properly
+        index = self._next_index
+        if index == len(self._offsets):
+            self._offsets.append(self._buf_start + self._pos)
+        self._pos = end
+        self._next_index += 1
+        return action_from_dict(entry)
+
+    # ---------- sequence protocol ----------
+    def __getitem__(self, index: int) -> Action:
+        if index < 0:
+            index += len(self)
+            if index < 0:
+                raise IndexError(index)
+        act = self._cache.get(index)
+        if act is not None:
+            return act
+        if index < len(self._offsets):
+            if index != self._next_index:
+                self._seek(self._offsets[index], index)
+        elif self._next_index < len(self._offsets):
+            # Resume scanning from the furthest known action
+            self._seek(self._offsets[-1], len(self._offsets) - 1)
+        while self._next_index <= index:
+            i = self._next_index
+            act = self._parse_next()
+            if act is None:
+                raise IndexError(index)
+            if i >= index - self._read_ahead:
+                self._remember(i, act)
+        # Read ahead so the following actions are ready
+        for _ in range(self._read_ahead):
+            i = self._next_index
+            nxt = self._parse_next()
+            if nxt is None:
+                break
+            self._remember(i, nxt)
+        return act
+
+    def _remember(self, index: int, act: Action):
+        self._cache[index] = act
+        while len(self._cache) > self._window:
+            self._cache.popitem(last=False)
+
+    def __iter__(self) -> Iterator[Action]:
+        index = 0
+        while True:
+            try:
+                yield self[index]
+            except IndexError:
+                return
+            index += 1
+
+    def __len__(self) -> int:
+        if self._length is None:
+            if len(self._offsets) > self._next_index:
+                self._seek(self._offsets[-1], len(self._offsets) - 1)
+            while self._parse_next() is not None:
+                pass
+        return self._length
+
+    def __length_hint__(self) -> int:
+        """Exact length once known, otherwise an estimate from the file size."""
+        if self._length is not None:
+            return self._length
+        n = len(self._offsets)
+        if n < 2:
+            return n
+        per_action = (self._offsets[-1] - self._offsets[0]) / (n - 1)
+        return max(n, int((self._size - self._offsets[0]) / per_action))
+
+    def close(self):
+        self._file.close()
+        self._cache.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _key_char(action: Action) -> str | None:
+    """The character a keyboard action types, or None if it is not plain text."""
+    if action.type != ActionType.KEYBOARD or action.delay_randomization:
+        return None
+    key = action.key
+    if key in _TEXT_KEYS:
+        return _TEXT_KEYS[key]
+    if len(key) == 3 and key[0] == key[2] == "'" and key[1].isprintable():
+        return key[1]
+    return None
+
+
+def _quantize(value: float, quantum: float) -> float:
+    if quantum <= 0:
+        return value
+    return round(round(value / quantum) * quantum, 6)
+
+
+@dataclass
+class OptimizeReport:
+    """What an optimizer pass changed in a script."""
+    actions_before: int
+    actions_after: int
+    duration_before: float
+    duration_after: float
+    merged_keys: int = 0
+    dropped_clicks: int = 0
+    clamped_delays: int = 0
+
+    @property
+    def time_saved(self) -> float:
+        return self.duration_before - self.duration_after
+
+    def __str__(self):
+        return (f"{self.actions_before} -> {self.actions_after} actions, "
+                f"{self.time_saved:.2f}s saved per run "
+                f"({self.merged_keys} keys merged, {self.dropped_clicks} duplicate clicks dropped, "
+                f"{self.clamped_delays} delays clamped)")
+
 
 class ScriptManager:
     """Handle *.json files and program sequences."""
@@ -19,13 +287,136 @@ class ScriptManager:
 
     def load_script(self, name: str) -> List[Action]:
         data = load_json(SCRIPTS_DIR / name)
-        acts: list[Action] = []
-        for entry in data:
-            if "button" in entry:
-                acts.append(MouseAction(**entry))
+        return [action_from_dict(entry) for entry in data]
+
+    def compile_script(self, name: str) -> CompiledScript:
+        """Load a script with control flow and compile it (ValueError if it does not compile)."""
+        return compile_script(self.load_script(name), name)
+
+    def preload(self, names: Iterable[str]) -> dict:
+        """
+        Parse each script once, e.g. to share between player processes
+        (name -> LoadedScript, or CompiledScript for scripts with control flow).
+        """
+        out = {}
+        for name in dict.fromkeys(names):
+            actions = self.load_script(name)
+            if any(a.type == ActionType.CONTROL for a in actions):
+                out[name] = compile_script(actions, name)
             else:
-                acts.append(KeyboardAction(**entry))
-        return acts
+                out[name] = LoadedScript(actions)
+        return out
+
+    def open_script(self, name: str, window: int = 4096) -> ScriptStream | CompiledScript:
+        """
+        Open a script for playback. Plain scripts are streamed, their actions
+        parsed as they are reached; scripts with control flow are compiled
+        whole, since jumps can go anywhere.
+        """
+        path = SCRIPTS_DIR / name
+        if has_control_flow(path):
+            return self.compile_script(name)
+        return ScriptStream(path, window=window)
+
+    def iter_script(self, name: str) -> Iterator[Action]:
+        """
+        Yield the entries of a script without loading the whole file, in file
+        order (control-flow entries included, not compiled).
+        """
+        stream = ScriptStream(SCRIPTS_DIR / name, window=64)
+        try:
+            yield from stream
+        finally:
+            stream.close()
+
+    def script_duration(self, name: str) -> float:
+        """Scheduled duration of one pass of a script (see :func:`actions_duration`)."""
+        return actions_duration(self.iter_script(name))
+
+    def save_script(self, name: str, actions: List[Action]):
+        if not name.endswith(".json"):
+            name += ".json"
+        out = SCRIPTS_DIR / name
+        save_json([a.__dict__ for a in actions], out)
+        return out
+
+    # -------- optimizer --------
+    def optimize_actions(
+        self,
+        actions: List[Action],
+        *,
+        quantum: float = 0.01,
+        outlier_factor: float = 10.0,
+        min_outlier_delay: float = 5.0,
+        duplicate_window: float = 0.05,
+        merge_window: float = 0.5,
+        char_interval: float = 0.02,
+    ) -> Tuple[List[Action], OptimizeReport]:
+        """
+        Return a leaner copy of *actions* and a report of what changed.
+
+        Args:
+            quantum: Timestamps are rounded to a multiple of this (0 disables).
+            outlier_factor: Delays above this multiple of the median delay are
+                            clamped down to it...
+            min_outlier_delay: ...but delays up to this many seconds are never clamped.
+            duplicate_window: A click repeating the previous click's button and
+                              position within this many seconds is dropped.
+            merge_window: Consecutive plain key presses at most this far apart
+                          are merged into one TextAction.
+            char_interval: Pause between characters of merged TextActions.
+
+        Running the pass on its own output changes nothing.
+        """
+        report = OptimizeReport(len(actions), 0, actions_duration(actions), 0.0)
+        acts = [type(a)(**a.__dict__) for a in actions]
+
+        # 1. quantize, then clamp outliers to a quantized cap
+        for a in acts:
+            a.timestamp = _quantize(a.timestamp, quantum)
+        delays = sorted(a.timestamp for a in acts if a.timestamp > 0)
+        if delays:
+            median = delays[len(delays) // 2]
+            cap = _quantize(max(min_outlier_delay, outlier_factor * median), quantum)
+            for a in acts:
+                if a.timestamp > cap:
+                    a.timestamp = cap
+                    report.clamped_delays += 1
+
+        # 2. drop duplicate clicks, 3. merge key presses into typed text
+        out: List[Action] = []
+        for a in acts:
+            prev = out[-1] if out else None
+            if (prev is not None and a.type == ActionType.MOUSE and prev.type == ActionType.MOUSE
+                    and a.timestamp <= duplicate_window
+                    and not (a.color_toggle or prev.color_toggle or a.path or prev.path)
+                    and a.button == prev.button and tuple(a.position) == tuple(prev.position)):
+                report.dropped_clicks += 1
+                continue
+            ch = _key_char(a)
+            if ch is not None and prev is not None and a.timestamp <= merge_window:
+                if prev.type == ActionType.TEXT and not prev.delay_randomization:
+                    prev.text += ch
+                    report.merged_keys += 1
+                    continue
+                prev_ch = _key_char(prev)
+                if prev_ch is not None:
+                    out[-1] = TextAction(prev.timestamp, prev_ch + ch, char_interval)
+                    report.merged_keys += 2
+                    continue
+            out.append(a)
+
+        report.actions_after = len(out)
+        report.duration_after = actions_duration(out)
+        return out, report
+
+    def optimize_script(self, name: str, **options) -> OptimizeReport:
+        """Optimize a saved script in place (see :meth:`optimize_actions`)."""
+        original = self.load_script(name)
+        actions, report = self.optimize_actions(original, **options)
+        if [a.__dict__ for a in actions] != [a.__dict__ for a in original]:
+            self.save_script(name, actions)
+        return report
 
     # -------- programs (sequences of scripts with iterations) --------
     def save_program(self, seq: List[Tuple[str, int]], out_name: str):
@@ -33,4 +424,27 @@ class ScriptManager:
         save_json(seq, PROGRAMS_DIR / out_name)
 
     def load_program(self, name: str):
-        return load_json(PROGRAMS_DIR / name)
\ No newline at end of file
+        return load_json(PROGRAMS_DIR / name)
+
+    def normalize_program(self, seq) -> List[Tuple[str, int]]:
+        """Program entries as (script file name with .json, iterations) tuples."""
+        fixed = []
+        for script_name, iters in seq:
+            if not script_name.endswith(".json"):
+                script_name += ".json"
+            fixed.append((script_name, int(iters)))
+        return fixed
+
+    def missing_scripts(self, seq) -> List[str]:
+        return [name for name, _ in seq if not (SCRIPTS_DIR / name).exists()]
+
+    def control_flow_errors(self, seq) -> List[str]:
+        """Why scripts of *seq* with control flow do not compile (empty if they all do)."""
+        errors = []
+        for name in dict.fromkeys(name for name, _ in seq):
+            try:
+                if has_control_flow(SCRIPTS_DIR / name):
+                    self.compile_script(name)
+            except (OSError, TypeError, ValueError) as e:
+                errors.append(f"{name}: {e}" if name not in str(e) else str(e))
+        return errors
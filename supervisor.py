@@ -0,0 +1,296 @@
+"""
+Several players at once, each driving its own X display.
+
+    python main.py supervise my_program --workers 4 --launch "my-app --windowed"
+
+starts an Xvfb server per worker (displays :10, :11, ...), optionally the
+application on each, and one player process per display. Scripts are
+parsed once in the supervisor and inherited read-only by the forked workers.
+Workers, their Xvfb server and their application are pinned to disjoint
+CPU sets so instances do not compete for cores.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+
+@dataclass
+class WorkerSpec:
+    display: str  # e.g. ":10"
+    cpus: Tuple[int, ...] = ()  # CPU affinity of the worker, its X server and its app (empty = any)
+
+
+@dataclass
+class WorkerState:
+    spec: WorkerSpec
+    process: Optional[multiprocessing.Process] = None
+    control: object = None  # parent end of the command pipe
+    helpers: List[subprocess.Popen] = field(default_factory=list)  # Xvfb, application
+    progress: dict = field(default_factory=dict)
+    result: Optional[dict] = None  # the "end" (or "error") event
+    paused: bool = False  # as last commanded (paused players send no progress)
+
+
+def plan_cpus(workers: int, cpus: Optional[Sequence[int]] = None) -> List[Tuple[int, ...]]:
+    """
+    Split *cpus* (default: the CPUs this process may use) into *workers*
+    contiguous, disjoint sets; with more workers than CPUs they share them
+    round-robin.
+    """
+    if cpus is None:
+        cpus = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else range(os.cpu_count() or 1)
+    cpus = sorted(cpus)
+    if workers >= len(cpus):
+        return [(cpus[i % len(cpus)],) for i in range(workers)]
+    base, extra = divmod(len(cpus), workers)
+    out, start = [], 0
+    for i in range(workers):
+        size = base + (i < extra)
+        out.append(tuple(cpus[start:start + size]))
+        start += size
+    return out
+
+
+def _pin(pid: int, cpus: Sequence[int]):
+    if cpus and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(pid, cpus)
+        except OSError as e:
+            print(f"Failed to set CPU affinity of {pid}: {e}", file=sys.stderr)
+
+
+def start_xvfb(display: str, screen: str = "1920x1080x24", cpus: Sequence[int] = (),
+               timeout: float = 10.0) -> subprocess.Popen:
+    """Start an Xvfb server for *display* and wait until it accepts connections."""
+    exe = shutil.which("Xvfb")
+    if exe is None:
+        raise RuntimeError("Xvfb not found (install it, or pass existing displays with --no-xvfb)")
+    proc = subprocess.Popen([exe, display, "-screen", "0", screen, "-nolisten", "tcp"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _pin(proc.pid, cpus)
+    socket = Path("/tmp/.X11-unix") / f"X{display.lstrip(':').split('.')[0]}"
+    deadline = time.monotonic() + timeout
+    while not socket.exists():
+        if proc.poll() is not None:
+            raise RuntimeError(f"Xvfb {display} exited with code {proc.returncode} (display in use?)")
+        if time.monotonic() > deadline:
+            proc.terminate()
+            raise RuntimeError(f"Xvfb {display} did not start within {timeout:.0f}s")
+        time.sleep(0.05)
+    return proc
+
+
+def _control(conn, player):
+    """Worker thread applying supervisor commands to *player*."""
+    while True:
+        try:
+            command = conn.recv()
+        except (EOFError, OSError):
+            player.stop_playback()
+            return
+        if command == "pause":
+            player.pause_flag = True
+        elif command == "resume":
+            player.pause_flag = False
+        elif command == "stop":
+            player.stop_playback()
+            return
+
+
+def _run_worker(index: int, spec: WorkerSpec, sequence, scripts, options: dict, events, conn):
+    """Worker process: bind to the display and CPUs, then play the program."""
+    # Backends (pynput, pyautogui) connect to $DISPLAY when first imported/used,
+    # which happens only below, in this process
+    os.environ["DISPLAY"] = spec.display
+    _pin(0, spec.cpus)
+    sys.stdout = sys.stderr  # the supervisor's stdout carries its own output
+    interval = options.get("progress_interval", 0.5)
+    last = [0.0]
+
+    def progress(info):
+        now = time.monotonic()
+        if now - last[0] < interval and not info.get("is_stopped"):
+            return
+        last[0] = now
+        events.put((index, "progress", info))
+
+    try:
+        from player import ActionPlayer
+        player = ActionPlayer(speed=options["speed"], loop_until_stopped=True, hotkeys=False,
+                              max_passes=options["max_passes"], progress_callback=progress, **options["player"])
+    except Exception as e:
+        events.put((index, "error", {"message": f"{type(e).__name__}: {e}"}))
+        return
+    player.pause_flag = options.get("start_paused", False)
+    player.save_learned = False  # several workers would race on the same .roi files
+    threading.Thread(target=_control, args=(conn, player), daemon=True).start()
+    events.put((index, "start", {"display": spec.display, "cpus": list(spec.cpus), "pid": os.getpid()}))
+    try:
+        player.replay_program(sequence, scripts=scripts)
+    except Exception as e:
+        events.put((index, "error", {"message": f"{type(e).__name__}: {e}"}))
+        return
+    events.put((index, "end", {"stop_reason": player.stop_reason or "completed",
+                               "passes_completed": player.passes_completed,
+                               "fast_path": player.probe_stats(),
+                               "detect_cache": player.detector.stats()}))
+
+
+class Supervisor:
+    """
+    Runs *sequence* in one player process per entry of *workers*.
+
+    *scripts* are the parsed scripts (``ScriptManager.preload``) and
+    *player_options* the ActionPlayer keyword arguments from the settings.
+    With *xvfb* each worker's display is started here; *launch* (a command
+    line) is started on every display after its X server. Use :meth:`poll`
+    or :meth:`wait` to collect events, :meth:`pause`/:meth:`resume`/:meth:`stop`
+    to control one worker (by index) or all of them.
+    """
+
+    def __init__(self, sequence, scripts: dict, workers: Sequence[WorkerSpec], player_options: dict, *,
+                 speed: float = 1.0, max_passes: Optional[int] = 1, start_paused: bool = False,
+                 xvfb: bool = True, screen: str = "1920x1080x24", launch: Optional[str] = None,
+                 progress_interval: float = 0.5):
+        self.sequence = sequence
+        self.scripts = scripts
+        self.workers = [WorkerState(spec) for spec in workers]
+        self.options = {"player": dict(player_options), "speed": speed, "max_passes": max_passes,
+                        "start_paused": start_paused, "progress_interval": progress_interval}
+        self.xvfb = xvfb
+        self.screen = screen
+        self.launch = launch
+        # fork: workers inherit the parsed scripts instead of unpickling copies
+        method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        self._ctx = multiprocessing.get_context(method)
+        self._events = self._ctx.Queue()
+
+    def start(self):
+        """Start the displays, the applications and the workers."""
+        try:
+            for w in self.workers:
+                if self.xvfb:
+                    w.helpers.append(start_xvfb(w.spec.display, self.screen, w.spec.cpus))
+                if self.launch:
+                    app = subprocess.Popen(shlex.split(self.launch), env={**os.environ, "DISPLAY": w.spec.display},
+                                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                    _pin(app.pid, w.spec.cpus)
+                    w.helpers.append(app)
+            for i, w in enumerate(self.workers):
+                w.control, child = self._ctx.Pipe()
+                w.process = self._ctx.Process(
+                    # not daemonic: workers may start their own vision service / detector pool;
+                    # a worker whose supervisor is gone stops when the control pipe closes
+                    target=_run_worker, name=f"toolforge-worker-{i}",
+                    args=(i, w.spec, self.sequence, self.scripts, self.options, self._events, child),
+                )
+                w.process.start()
+                child.close()
+        except Exception:
+            self.close()
+            raise
+
+    def _send(self, command: str, index: Optional[int] = None):
+        targets = self.workers if index is None else [self.workers[index]]
+        for w in targets:
+            if w.control is not None and w.result is None:
+                try:
+                    w.control.send(command)
+                except (OSError, ValueError):
+                    continue
+                if command in ("pause", "resume"):
+                    w.paused = command == "pause"
+
+    def pause(self, index: Optional[int] = None):
+        self._send("pause", index)
+
+    def resume(self, index: Optional[int] = None):
+        self._send("resume", index)
+
+    def stop(self, index: Optional[int] = None):
+        self._send("stop", index)
+
+    @property
+    def running(self) -> bool:
+        return any(w.result is None and w.process is not None and w.process.is_alive() for w in self.workers)
+
+    def poll(self, timeout: float = 0.5) -> List[Tuple[int, str, dict]]:
+        """Events received within *timeout*: ``(worker index, kind, fields)``."""
+        import queue
+
+        out = []
+        try:
+            out.append(self._events.get(timeout=timeout))
+            while True:
+                out.append(self._events.get_nowait())
+        except queue.Empty:
+            pass
+        for index, kind, fields in out:
+            w = self.workers[index]
+            if kind == "progress":
+                w.progress = fields
+            elif kind in ("end", "error"):
+                w.result = dict(fields, event=kind)
+        # A worker that died without reporting (crash, kill) still ends
+        for index, w in enumerate(self.workers):
+            if w.result is None and w.process is not None and w.process.exitcode is not None:
+                w.result = {"event": "error", "message": f"worker exited with code {w.process.exitcode}"}
+                out.append((index, "error", w.result))
+        return out
+
+    def progress(self) -> dict:
+        """Totals over all workers plus one short entry per worker."""
+        entries = []
+        for i, w in enumerate(self.workers):
+            p = w.progress
+            if w.result:
+                state = w.result.get("stop_reason") or w.result["event"]
+            else:
+                state = "paused" if w.paused else "running" if w.process else "idle"
+            entries.append({"worker": i, "display": w.spec.display, "state": state,
+                            "script": p.get("script_name"), "action": p.get("action_index"),
+                            "passes_completed": (w.result or p).get("passes_completed", 0)})
+        return {"workers": len(self.workers),
+                "running": sum(e["state"] == "running" for e in entries),
+                "paused": sum(e["state"] == "paused" for e in entries),
+                "passes_completed": sum(e["passes_completed"] for e in entries),
+                "per_worker": entries}
+
+    def wait(self, on_event: Optional[Callable[[int, str, dict], None]] = None, interval: float = 0.5):
+        """Collect events until every worker has ended; returns the per-worker results."""
+        while any(w.result is None for w in self.workers if w.process is not None):
+            for event in self.poll(interval):
+                if on_event:
+                    on_event(*event)
+        return [w.result for w in self.workers]
+
+    def close(self):
+        """Stop everything still running: workers, applications, X servers."""
+        self.stop()
+        for w in self.workers:
+            if w.process is not None:
+                w.process.join(timeout=5)
+                if w.process.is_alive():
+                    w.process.terminate()
+                    w.process.join(timeout=1)
+            if w.control is not None:
+                w.control.close()
+                w.control = None
+            for proc in reversed(w.helpers):
+                if proc.poll() is None:
+                    proc.terminate()
+                    try:
+                        proc.wait(timeout=5)
+                    except subprocess.TimeoutExpired:
+                        proc.kill()
+            w.helpers.clear()
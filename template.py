@@ -0,0 +1,139 @@
+"""Image-patch matching by normalized cross-correlation (FFT + integral images)."""
+from __future__ import annotations
+
+import base64
+import functools
+import io
+from typing import List, Optional, Tuple
+
+
+def encode_patch(patch) -> str:
+    """(h, w, 3) uint8 array -> base64 PNG, for storing in a script."""
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.fromarray(patch).save(buf, format="PNG", optimize=True)
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+@functools.lru_cache(maxsize=64)
+def decode_patch(data: str):
+    """base64 PNG -> read-only (h, w, 3) uint8 array (cached per string)."""
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(io.BytesIO(base64.b64decode(data))) as img:
+        arr = np.asarray(img.convert("RGB"), dtype=np.uint8)
+    arr.flags.writeable = False
+    return arr
+
+
+def _integral(a):
+    """Summed-area table with a zero first row/column."""
+    import numpy as np
+
+    out = np.zeros((a.shape[0] + 1, a.shape[1] + 1), dtype=np.float64)
+    np.cumsum(np.cumsum(a, axis=0), axis=1, out=out[1:, 1:])
+    return out
+
+
+def _window_sum(ii, h, w):
+    """Sum over every h x w window, from an integral image."""
+    return ii[h:, w:] - ii[:-h, w:] - ii[h:, :-w] + ii[:-h, :-w]
+
+
+def ncc_map(frame, patch):
+    """
+    Zero-mean normalized cross-correlation of *patch* at every position of
+    *frame* (both (H, W, 3)); result is (H - h + 1, W - w + 1) in [-1, 1].
+
+    The numerator is computed per channel with FFTs against the zero-mean
+    patch; window means and energies come from integral images. Flat windows
+    score 0.
+    """
+    import numpy as np
+
+    img = np.asarray(frame, dtype=np.float64)
+    tpl = np.asarray(patch, dtype=np.float64)
+    H, W = img.shape[:2]
+    h, w = tpl.shape[:2]
+    if h > H or w > W:
+        return np.zeros((0, 0))
+    n = h * w
+    tpl = tpl - tpl.mean(axis=(0, 1))
+    tpl_norm = np.sqrt((tpl ** 2).sum())
+    fh, fw = H + h - 1, W + w - 1
+    num = np.zeros((H - h + 1, W - w + 1))
+    energy = np.zeros_like(num)
+    for c in range(img.shape[2]):
+        ch = img[..., c]
+        spec = np.fft.rfft2(ch, (fh, fw)) * np.fft.rfft2(tpl[::-1, ::-1, c], (fh, fw))
+        num += np.fft.irfft2(spec, (fh, fw))[h - 1:H, w - 1:W]
+        s = _window_sum(_integral(ch), h, w)
+        s2 = _window_sum(_integral(ch * ch), h, w)
+        energy += s2 - s * s / n
+    denom = np.sqrt(np.maximum(energy, 0.0)) * tpl_norm
+    out = np.zeros_like(num)
+    ok = denom > 1e-6 * max(tpl_norm, 1.0)
+    out[ok] = num[ok] / denom[ok]
+    return np.clip(out, -1.0, 1.0)
+
+
+def _peaks(scores, threshold: float, h: int, w: int, max_matches: int) -> List[Tuple[int, int, float]]:
+    """Best positions >= threshold, suppressing overlaps (top-left x, y, score)."""
+    import numpy as np
+
+    scores = scores.copy()
+    out = []
+    while len(out) < max_matches and scores.size:
+        i = int(np.argmax(scores))
+        y, x = divmod(i, scores.shape[1])
+        best = float(scores[y, x])
+        if best < threshold:
+            break
+        out.append((x, y, best))
+        scores[max(0, y - h // 2):y + h // 2 + 1, max(0, x - w // 2):x + w // 2 + 1] = -np.inf
+    return out
+
+
+def _downscale(a, k: int):
+    H, W = (a.shape[0] // k) * k, (a.shape[1] // k) * k
+    return a[:H, :W].reshape(H // k, k, W // k, k, -1).mean(axis=(1, 3))
+
+
+def match_template(frame, patch, *, threshold: float = 0.8, offset: Tuple[int, int] = (0, 0),
+                   downscale: Optional[int] = None, max_matches: int = 10) -> List[Tuple[int, int, float]]:
+    """
+    Find *patch* in *frame*; returns ``(x, y, score)`` match centers (plus
+    *offset*), best first, with overlapping matches suppressed.
+
+    With *downscale* k > 1 a coarse pass runs on k x k block means and only
+    candidate neighbourhoods (scoring above threshold - 0.15 there) are
+    matched at full resolution; if the coarse pass finds nothing (fine texture
+    averages out in block means) the full-resolution search runs anyway.
+    """
+    import numpy as np
+
+    frame = np.asarray(frame)[..., :3]
+    patch = np.asarray(patch)[..., :3]
+    h, w = patch.shape[:2]
+    ox, oy = offset
+    found = []
+    if downscale and downscale > 1 and min(h, w) >= 4 * downscale:
+        k = downscale
+        coarse = ncc_map(_downscale(frame, k), _downscale(patch, k))
+        hits = []
+        for cx, cy, _ in _peaks(coarse, threshold - 0.15, h // k, w // k, max_matches * 2):
+            # Re-match a window around the coarse hit at full resolution
+            x0, y0 = max(0, (cx - 1) * k), max(0, (cy - 1) * k)
+            crop = frame[y0:y0 + h + 2 * k, x0:x0 + w + 2 * k]
+            for x, y, s in _peaks(ncc_map(crop, patch), threshold, h, w, 1):
+                hits.append((x0 + x, y0 + y, s))
+        hits.sort(key=lambda m: -m[2])
+        for x, y, s in hits:  # coarse windows can overlap: keep one match per spot
+            if all(abs(x - fx) > w // 2 or abs(y - fy) > h // 2 for fx, fy, _ in found):
+                found.append((x, y, s))
+        found = found[:max_matches]
+    if not found:  # no coarse candidate (or no coarse pass): search at full resolution
+        found = _peaks(ncc_map(frame, patch), threshold, h, w, max_matches)
+    return [(x + w // 2 + ox, y + h // 2 + oy, s) for x, y, s in found]
@@ -0,0 +1,59 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+RED = (255, 0, 0)
+
+
+class FakeScreen:
+    """A 50x50 screen for color searches; :meth:`show` puts a red square on it."""
+
+    def __init__(self):
+        self.frame = np.zeros((50, 50, 3), dtype=np.uint8)
+
+    def show(self, visible: bool = True):
+        self.frame[10:20, 10:20] = RED if visible else (0, 0, 0)
+
+    def capture(self, x, y, w, h):
+        return self.frame[y:y + h, x:x + w].copy()
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+        self.on_sleep = None  # called after every sleep, e.g. to stop playback at some point
+
+    def now(self):
+        return self.t
+
+    def sleep(self, seconds):
+        self.t += max(seconds, 0.0)
+        if self.on_sleep:
+            self.on_sleep()
+
+
+@pytest.fixture
+def make_player():
+    """
+    ``make_player(**options) -> (player, log)``: an inline ActionPlayer on a
+    fake clock and screen (``player.clock``, ``player.screen``), appending the
+    key of every keyboard action it plays to *log*, and ``("click", x, y)``
+    for every click. Diagnostic frames are not written.
+    """
+    from player import ActionPlayer
+
+    def make(**options):
+        clock, screen, log = FakeClock(), FakeScreen(), []
+        player = ActionPlayer(pause_key=object(), hotkeys=False, clock=clock.now, sleep=clock.sleep, inline=True,
+                              mouse=object(), keys=object(), capture=screen.capture, **options)
+        player.pause_flag = False
+        player._do_key = lambda act: log.append(act.key)
+        player._click = lambda act, x, y, tracked=None: log.append(("click", x, y)) or 1
+        player._dump_frames = lambda reason: None
+        player.clock, player.screen = clock, screen
+        return player, log
+    return make
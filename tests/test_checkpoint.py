@@ -0,0 +1,173 @@
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import checkpoint
+from checkpoint import Checkpointer, checkpoint_path, file_hash, fingerprint, load_resume, write_atomic
+from script_manager import LoadedScript, action_from_dict
+
+SEQUENCE = [("one.json", 1), ("two.json", 2)]
+SCRIPTS = {"one.json": [f"'{c}'" for c in "abc"], "two.json": [f"'{c}'" for c in "xyz"]}
+
+
+@pytest.fixture
+def scripts_dir(tmp_path):
+    d = tmp_path / "scripts"
+    d.mkdir()
+    for name, keys in SCRIPTS.items():
+        (d / name).write_text(json.dumps([{"timestamp": 0.1, "key": k} for k in keys]))
+    return d
+
+
+def _loaded(scripts_dir):
+    return {name: LoadedScript([action_from_dict(e) for e in json.loads((scripts_dir / name).read_text())])
+            for name in SCRIPTS}
+
+
+def _save(path, position, scripts_dir, sequence=SEQUENCE):
+    Checkpointer(path, "prog.json", sequence, scripts_dir=scripts_dir).save(position)
+
+
+def test_checkpoint_path(tmp_path):
+    assert checkpoint_path("my_program.json", tmp_path) == tmp_path / "my_program.ckpt"
+    assert checkpoint_path("my_program", tmp_path) == tmp_path / "my_program.ckpt"
+
+
+def test_fingerprint_follows_program_and_script_contents(scripts_dir):
+    before = fingerprint(SEQUENCE, scripts_dir)
+    assert before == fingerprint(SEQUENCE, scripts_dir)
+    assert set(before["scripts"]) == {"one.json", "two.json"}
+    assert fingerprint([("one.json", 1), ("two.json", 3)], scripts_dir)["program"] != before["program"]
+
+    path = scripts_dir / "two.json"
+    path.write_text(path.read_text().replace("'x'", "'q'"))
+    os.utime(path, ns=(1, 1))  # a different mtime invalidates the remembered hash
+    after = fingerprint(SEQUENCE, scripts_dir)
+    assert after["program"] == before["program"]
+    assert after["scripts"]["one.json"] == before["scripts"]["one.json"]
+    assert after["scripts"]["two.json"] == file_hash(path) != before["scripts"]["two.json"]
+
+
+def test_write_atomic_keeps_the_old_file_on_failure(tmp_path, monkeypatch):
+    path = tmp_path / "deep" / "x.ckpt"
+    write_atomic(path, b"old")
+    assert path.read_bytes() == b"old" and not path.with_name("x.ckpt.tmp").exists()
+
+    def fail(src, dst):
+        raise OSError("disk full")
+    monkeypatch.setattr(checkpoint.os, "replace", fail)
+    with pytest.raises(OSError):
+        write_atomic(path, b"new")
+    assert path.read_bytes() == b"old"
+
+
+def test_save_failure_is_reported_not_raised(tmp_path, scripts_dir, capsys, monkeypatch):
+    ckpt = Checkpointer(tmp_path / "p.ckpt", "prog.json", SEQUENCE, scripts_dir=scripts_dir)
+    monkeypatch.setattr(checkpoint, "write_atomic", lambda *a: (_ for _ in ()).throw(OSError("read-only")))
+    ckpt.save({"script_index": 0})
+    assert ckpt.writes == 0 and "Failed to write checkpoint" in capsys.readouterr().out
+
+
+def test_levels_and_action_interval(tmp_path, scripts_dir):
+    now = [0.0]
+    ckpt = Checkpointer(tmp_path / "p.ckpt", "prog.json", SEQUENCE, every="action", interval=1.0,
+                        clock=lambda: now[0], scripts_dir=scripts_dir)
+    for t in (0.0, 0.5, 0.9, 1.0, 1.2):
+        now[0] = t
+        ckpt.reached("action", lambda: {"t": t})
+    assert ckpt.writes == 2  # at 0.0 and 1.0
+    ckpt.reached("iteration", lambda: {})  # coarser levels are not throttled
+    assert ckpt.writes == 3
+
+    ckpt = Checkpointer(tmp_path / "q.ckpt", "prog.json", SEQUENCE, every="script", scripts_dir=scripts_dir)
+    ckpt.reached("iteration", lambda: {})
+    ckpt.reached("action", lambda: {})
+    assert ckpt.writes == 0
+    ckpt.reached("script", lambda: {})
+    assert ckpt.writes == 1
+    with pytest.raises(ValueError, match="checkpoint level"):
+        Checkpointer(tmp_path / "r.ckpt", "prog.json", SEQUENCE, every="sometimes", scripts_dir=scripts_dir)
+
+
+def test_load_resume_accepts_a_matching_checkpoint(tmp_path, scripts_dir):
+    path = tmp_path / "p.ckpt"
+    position = {"passes_completed": 0, "script_index": 1, "iteration": 1, "action_index": 2, "reset_counter": 0}
+    _save(path, position, scripts_dir)
+    assert load_resume("prog.json", SEQUENCE, path, scripts_dir) == (position, None)
+
+
+@pytest.mark.parametrize("change, reason", [
+    (lambda path, d: path.unlink(), "no checkpoint"),
+    (lambda path, d: path.write_text("{not json"), "unreadable checkpoint"),
+    (lambda path, d: path.write_text(json.dumps({"version": 99, "position": {}})), "unsupported checkpoint"),
+    (lambda path, d: (d / "one.json").write_text("[]"), "changed since the checkpoint: one.json"),
+])
+def test_load_resume_rejects(tmp_path, scripts_dir, change, reason):
+    path = tmp_path / "p.ckpt"
+    _save(path, {"script_index": 0, "iteration": 0, "action_index": 1}, scripts_dir)
+    change(path, scripts_dir)
+    position, problem = load_resume("prog.json", SEQUENCE, path, scripts_dir)
+    assert position is None and problem.startswith(reason)
+
+
+def test_load_resume_rejects_a_changed_program(tmp_path, scripts_dir):
+    path = tmp_path / "p.ckpt"
+    _save(path, {"script_index": 0}, scripts_dir)
+    assert load_resume("prog.json", [("one.json", 1)], path, scripts_dir) == \
+        (None, "the program changed since the checkpoint")
+
+
+@pytest.mark.parametrize("position, reason", [
+    ({"script_index": 2}, "checkpoint position is outside the program"),
+    ({"script_index": 0, "iteration": 1}, "checkpoint position is outside the program"),
+    ({"script_index": 0, "action_index": -1}, "malformed position"),
+    ({"script_index": 0, "reset_counter": "3"}, "malformed position"),
+    ({"script_index": 0, "flow": {"pc": 1, "miss": -1, "calls": "x", "counters": []}}, "malformed position"),
+])
+def test_load_resume_rejects_bad_positions(tmp_path, scripts_dir, position, reason):
+    path = tmp_path / "p.ckpt"
+    _save(path, position, scripts_dir)
+    resumed, problem = load_resume("prog.json", SEQUENCE, path, scripts_dir)
+    assert resumed is None and problem.startswith(reason)
+
+
+def _run(player, scripts_dir, path, resume=None, every="action"):
+    player.checkpointer = Checkpointer(path, "prog.json", SEQUENCE, every=every, interval=0.0,
+                                       scripts_dir=scripts_dir)
+    asyncio.run(player.engine.run_program(SEQUENCE, _loaded(scripts_dir), resume=resume))
+
+
+def test_completed_program_clears_its_checkpoint(make_player, tmp_path, scripts_dir):
+    player, log = make_player(loop_until_stopped=True, max_passes=1)
+    path = tmp_path / "p.ckpt"
+    _run(player, scripts_dir, path)
+    assert log == ["'a'", "'b'", "'c'"] + ["'x'", "'y'", "'z'"] * 2
+    assert player.stop_reason == "completed" and player.checkpointer.writes > 0
+    assert not path.exists()
+
+
+def test_stop_mid_script_resumes_exactly_the_rest(make_player, tmp_path, scripts_dir):
+    everything = ["'a'", "'b'", "'c'"] + ["'x'", "'y'", "'z'"] * 2
+    path = tmp_path / "p.ckpt"
+    player, log = make_player(loop_until_stopped=True, max_passes=1)
+
+    def stop():
+        if len(log) == 5:  # waiting before the first 'z'
+            player.stop_flag = True
+    player.clock.on_sleep = stop
+    _run(player, scripts_dir, path)
+    assert log == everything[:5] and path.exists()
+
+    position, problem = load_resume("prog.json", SEQUENCE, path, scripts_dir)
+    assert problem is None
+    assert (position["script_index"], position["iteration"], position["action_index"]) == (1, 0, 2)
+    resumed, rest = make_player(loop_until_stopped=True, max_passes=1)
+    _run(resumed, scripts_dir, path, resume=position)
+    assert rest == everything[5:]
+    assert not path.exists()
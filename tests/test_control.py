@@ -0,0 +1,189 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from control import CALL, JUMP, LOOP, RET, SET, compile_script
+from script_manager import action_from_dict
+
+LOOK = {"color": [255, 0, 0], "color_area": [0, 0, 50, 50]}
+CLICK = {"timestamp": 0.1, "button": "Button.left", "position": [15, 15], "color_toggle": True, **LOOK}
+
+
+def key(k, t=0.1):
+    return {"timestamp": t, "key": k}
+
+
+def op(kind, **fields):
+    return {"op": kind, **fields}
+
+
+def compiled(entries):
+    return compile_script([action_from_dict(e) for e in entries], "test.json")
+
+
+def play(player, script, start=None):
+    player.engine._resume_from = start
+    player._play_script(script)
+
+
+def test_nested_repeat(make_player):
+    player, log = make_player()
+    play(player, compiled([
+        op("repeat", count=2),
+        key("a"),
+        op("repeat", count=3), key("b"), op("end_repeat"),
+        op("end_repeat"),
+        key("c"),
+    ]))
+    assert log == ["a", "b", "b", "b", "a", "b", "b", "b", "c"]
+
+
+@pytest.mark.parametrize("visible", [True, False])
+def test_if_found_and_if_missing(make_player, visible):
+    script = compiled([
+        op("if_found", to="found", **LOOK),
+        key("missing"),
+        op("jump", to="second"),
+        op("label", name="found"),
+        key("found"),
+        op("label", name="second"),
+        op("if_missing", to="gone", **LOOK),
+        key("still there"),
+        op("end"),
+        op("label", name="gone"),
+        key("gone"),
+    ])
+    player, log = make_player()
+    player.screen.show(visible)
+    play(player, script)
+    assert log == (["found", "still there"] if visible else ["missing", "gone"])
+
+
+def test_call_and_return(make_player):
+    script = compiled([
+        op("call", to="sub"),
+        key("x"),
+        op("call", to="sub"),
+        op("end"),
+        op("label", name="sub"),
+        key("s1"),
+        key("s2"),
+        op("return"),
+    ])
+    assert [script.code[i] for i in range(0, len(script.code), 3)][:3] == [CALL, 0, CALL]
+    player, log = make_player()
+    play(player, script)
+    assert log == ["s1", "s2", "x", "s1", "s2"]
+
+
+def test_return_without_call_ends_the_pass(make_player):
+    player, log = make_player()
+    play(player, compiled([key("a"), op("return"), key("b")]))
+    assert log == ["a"]
+
+
+def test_runaway_recursion_is_an_error(make_player):
+    player, _ = make_player()
+    with pytest.raises(RuntimeError, match="nested deeper"):
+        play(player, compiled([op("label", name="r"), op("call", to="r")]))
+
+
+def test_on_miss_jumps_instead_of_restarting(make_player):
+    script = compiled([
+        op("on_miss", to="recover"),
+        key("before"),
+        CLICK,
+        key("after"),
+        op("end"),
+        op("label", name="recover"),
+        key("recovered"),
+    ])
+    player, log = make_player()
+    play(player, script)
+    assert log == ["before", "recovered"]
+    player, log = make_player()
+    player.screen.show()
+    play(player, script)
+    assert log == ["before", ("click", 14, 14), "after"]
+
+
+def test_jump_loop_ends_on_stop(make_player):
+    player, log = make_player()
+
+    def stop_after_three():
+        if len(log) >= 3:
+            player.stop_flag = True
+    player.clock.on_sleep = stop_after_three
+    play(player, compiled([op("label", name="top"), key("k"), op("jump", to="top")]))
+    assert log == ["k", "k", "k"]
+
+
+@pytest.mark.parametrize("entries, message", [
+    ([op("jump", to="nowhere")], "entry 1: unknown label 'nowhere'"),
+    ([op("label", name="a"), key("x"), op("label", name="a")], "entry 3: duplicate label 'a'"),
+    ([key("x"), op("repeat", count=2), key("y")], "entry 2: repeat without end_repeat"),
+    ([key("x"), op("end_repeat")], "entry 2: end_repeat without repeat"),
+    ([op("repeat", count=0), op("end_repeat")], "entry 1: repeat count must be at least 1"),
+    ([op("if_found", to="x")], "entry 1: needs color_area"),
+    ([op("call")], "entry 1: call needs a target label"),
+    ([op("sing")], "entry 1: unknown op 'sing'"),
+])
+def test_compile_errors_name_the_entry(entries, message):
+    with pytest.raises(ValueError, match="^test.json, " + message):
+        compiled(entries)
+
+
+SUBROUTINE_LOOP = [
+    op("repeat", count=2),  # SET c0 = 2
+    op("call", to="sub"),  # CALL
+    op("end_repeat"),  # LOOP
+    key("z"),
+    op("end"),
+    op("label", name="sub"),
+    key("a"),
+    key("b"),
+    op("return"),
+]
+
+
+def test_resumed_flow_stack(make_player):
+    script = compiled(SUBROUTINE_LOOP)
+    assert [script.code[3 * i] for i in (0, 1, 2, 7)] == [SET, CALL, LOOP, RET]
+    player, log = make_player()
+    play(player, script)
+    assert log == ["a", "b", "a", "b", "z"]
+
+    # In the second call (counter already decremented once), about to type "b"
+    player, log = make_player()
+    play(player, script, {"flow": {"pc": 6, "miss": -1, "calls": [2], "counters": [1]}})
+    assert log == ["b", "z"]
+
+
+def test_stopped_position_resumes_the_rest(make_player):
+    script = compiled(SUBROUTINE_LOOP)
+    player, log = make_player()
+
+    def stop_after_three():
+        if len(log) == 3:  # during the delay before the second "b"
+            player.stop_flag = True
+    player.clock.on_sleep = stop_after_three
+    play(player, script)
+    assert log == ["a", "b", "a"]
+    position = player.engine.position()
+    assert position["flow"] == {"pc": 6, "miss": -1, "calls": [2], "counters": [1]}
+    assert position["action_index"] == 7  # the entry of "b"
+
+    resumed, rest = make_player()
+    play(resumed, script, position)
+    assert rest == ["b", "z"]
+
+
+def test_jump_to_label_at_end(make_player):
+    script = compiled([key("a"), op("jump", to="out"), key("never"), op("label", name="out")])
+    assert script.code[3] == JUMP and script.labels["out"] == 3
+    player, log = make_player()
+    play(player, script)
+    assert log == ["a"]
@@ -0,0 +1,70 @@
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from actions import KeyboardAction, MouseAction, MouseMoveAction, TextAction
+from script_manager import ScriptManager, action_duration, actions_duration
+
+
+def _recording(seed: int):
+    """A recording-like script: typing bursts, clicks (some repeated), holds, drags, moves and long waits."""
+    rng = random.Random(seed)
+    out = []
+    for _ in range(200):
+        roll = rng.random()
+        t = round(rng.choice([rng.uniform(0.0, 0.4), rng.uniform(0.2, 3.0), rng.uniform(20, 120)]
+                             if roll < 0.1 else [rng.uniform(0.0, 0.4), rng.uniform(0.2, 3.0)]), 4)
+        if roll < 0.4:
+            out.append(KeyboardAction(t, rng.choice(["'a'", "'b'", "Key.space", "Key.enter"])))
+        elif roll < 0.7:
+            pos = rng.choice([(10, 10), (200, 50)])
+            hold = rng.choice([0.0, 0.0, round(rng.uniform(0.3, 1.5), 4)])
+            out.append(MouseAction(t, "Button.left", pos, press_duration=hold))
+        elif roll < 0.85:
+            out.append(MouseAction(t, "Button.left", (5, 5), press_duration=0.5,
+                                   path=[[5, 5, 0.0], [40, 60, 0.3], [80, 90, 0.45]]))
+        else:
+            out.append(MouseMoveAction(t, [[0, 0, 0.0], [30, 30, 0.2], [60, 10, 0.35]]))
+    return out
+
+
+def test_action_duration_counts_what_the_action_replays():
+    assert action_duration(KeyboardAction(0.5, "'a'")) == 0.5
+    assert action_duration(TextAction(0.5, "abc", char_interval=0.1)) == pytest.approx(0.7)
+    assert action_duration(MouseAction(0.5, "Button.left", (0, 0), press_duration=1.25)) == 1.75
+    drag = MouseAction(0.5, "Button.left", (0, 0), press_duration=0.4, path=[[0, 0, 0.0], [9, 9, 0.6]])
+    assert action_duration(drag) == pytest.approx(1.1)
+    assert action_duration(MouseMoveAction(0.25, [[0, 0, 0.0], [5, 5, 0.5]])) == 0.75
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_optimize_is_idempotent(seed):
+    mgr = ScriptManager()
+    once, _ = mgr.optimize_actions(_recording(seed))
+    twice, report = mgr.optimize_actions(once)
+    assert [a.__dict__ for a in twice] == [a.__dict__ for a in once]
+    assert report.actions_before == report.actions_after
+    assert report.time_saved == pytest.approx(0.0)
+    assert (report.merged_keys, report.dropped_clicks, report.clamped_delays) == (0, 0, 0)
+
+
+def test_optimize_accounts_for_the_time_it_saves():
+    original = [
+        MouseAction(1.0, "Button.left", (5, 5), press_duration=2.0),
+        MouseAction(0.02, "Button.left", (5, 5)),  # duplicate click: dropped
+        MouseMoveAction(0.5, [[0, 0, 0.0], [9, 9, 0.75]]),
+        KeyboardAction(0.3, "'h'"),
+        KeyboardAction(0.1, "'i'"),  # merged with the previous key into "hi"
+        KeyboardAction(600.0, "Key.enter"),  # clamped to the outlier cap
+    ]
+    optimized, report = ScriptManager().optimize_actions(original)
+    assert report.duration_before == pytest.approx(actions_duration(original)) == pytest.approx(604.67)
+    assert report.duration_after == pytest.approx(actions_duration(optimized))
+    assert (report.dropped_clicks, report.merged_keys, report.clamped_delays) == (1, 2, 1)
+    # The hold and the cursor path are kept and still counted
+    assert report.duration_after == pytest.approx(1.0 + 2.0 + 0.5 + 0.75 + 0.3 + 0.02 + 5.0)
+    assert report.time_saved == pytest.approx(report.duration_before - report.duration_after)
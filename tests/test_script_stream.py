@@ -0,0 +1,87 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from actions import KeyboardAction
+from script_manager import ScriptStream
+
+
+def _write(path: Path, entries, **dump) -> Path:
+    path.write_text(json.dumps(entries, ensure_ascii=False, **dump), encoding="utf-8")
+    return path
+
+
+def _keys(n):
+    return [KeyboardAction(i / 100, f"'{chr(97 + i % 26)}'").__dict__ for i in range(n)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 64])
+def test_small_chunks_parse_every_action(tmp_path, chunk_size):
+    entries = _keys(50)
+    path = _write(tmp_path / "s.json", entries, indent=2)
+    with ScriptStream(path, window=8, read_ahead=3, chunk_size=chunk_size) as stream:
+        assert [a.__dict__ for a in stream] == entries
+        assert len(stream) == 50
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 5, 16])
+def test_multibyte_text_across_chunk_boundaries(tmp_path, chunk_size):
+    texts = ["héllo", "日本語のテキスト", "emoji 🙂 ok", "ß" * 7, "plain"]
+    entries = [{"timestamp": 0.1, "text": t, "char_interval": 0.02} for t in texts]
+    path = _write(tmp_path / "t.json", entries)
+    with ScriptStream(path, window=2, read_ahead=1, chunk_size=chunk_size) as stream:
+        assert [a.text for a in stream] == texts
+        assert stream[1].text == texts[1]  # seek back to a multibyte entry
+
+
+def test_random_access_after_eviction(tmp_path):
+    entries = _keys(300)
+    path = _write(tmp_path / "r.json", entries)
+    stream = ScriptStream(path, window=16, read_ahead=4, chunk_size=128)
+    try:
+        for index in [0, 299, 5, 150, 0, 17, 298, 100, 100, -1]:
+            assert stream[index].__dict__ == entries[index]
+            assert len(stream._cache) <= 16
+        with pytest.raises(IndexError):
+            stream[300]
+    finally:
+        stream.close()
+
+
+def test_window_equal_to_read_ahead(tmp_path):
+    entries = _keys(100)
+    path = _write(tmp_path / "w.json", entries)
+    with ScriptStream(path, window=64) as stream:
+        assert stream[0].__dict__ == entries[0]
+        assert stream[99].__dict__ == entries[99]
+
+
+def test_length_hint_and_empty_script(tmp_path):
+    path = _write(tmp_path / "e.json", [])
+    with ScriptStream(path) as stream:
+        assert list(stream) == [] and len(stream) == 0
+    path = _write(tmp_path / "h.json", _keys(40))
+    with ScriptStream(path, window=4, read_ahead=2) as stream:
+        stream[0]
+        assert 0 < stream.__length_hint__() and len(stream) == 40
+        assert stream.__length_hint__() == 40
+
+
+def test_close_releases_the_file(tmp_path):
+    path = _write(tmp_path / "c.json", _keys(10))
+    with ScriptStream(path) as stream:
+        stream[3]
+    assert stream._file.closed and not stream._cache
+    with pytest.raises(ValueError):
+        stream[9]  # reading needs the closed file
+
+
+def test_not_an_array(tmp_path):
+    path = _write(tmp_path / "bad.json", {"timestamp": 0.1})
+    with ScriptStream(path) as stream:
+        with pytest.raises(ValueError, match="expected a JSON array"):
+            stream[0]
@@ -0,0 +1,28 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tiles import ParallelTileDetector
+from utils import find_color_connected_clusters
+
+
+def test_parallel_detection_on_spawned_workers():
+    frame = np.zeros((300, 200, 3), dtype=np.uint8)
+    frame[10:20, 10:20] = (255, 0, 0)
+    frame[60:70, 60:200] = (255, 0, 0)  # across tile seams
+    frame[250:260, 5:15] = (255, 0, 0)
+    detector = ParallelTileDetector(workers=2, tile=64, min_pixels=1)
+    try:
+        clusters = detector.find(frame, (255, 0, 0), tolerance=0)
+        assert detector._pool._mp_context.get_start_method() == "spawn"
+        # A larger frame replaces the shared buffers
+        bigger = np.zeros((400, 300, 3), dtype=np.uint8)
+        bigger[:300, :200] = frame
+        assert detector.find(bigger, (255, 0, 0), tolerance=0) == clusters
+    finally:
+        detector.close()
+    assert clusters == find_color_connected_clusters(frame, (255, 0, 0), tolerance=0)
+    assert detector._pool is None and detector._frame_shm is None
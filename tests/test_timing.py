@@ -0,0 +1,59 @@
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from script_manager import LoadedScript, action_from_dict
+from timing import TimingLog
+
+CLICK = {"timestamp": 0.5, "button": "Button.left", "position": [15, 15], "color_toggle": True,
+         "color": [255, 0, 0], "color_area": [0, 0, 50, 50]}
+
+
+def _script(entries):
+    return LoadedScript([action_from_dict(e) for e in entries])
+
+
+def test_reset_does_not_count_as_drift(make_player):
+    player, log = make_player()
+
+    def appear():
+        if player.clock.t > 2.0:  # after the first miss and its reset wait
+            player.screen.show()
+    player.clock.on_sleep = appear
+    player._play_script(_script([{"timestamp": 0.5, "key": "a"}, CLICK, {"timestamp": 0.5, "key": "b"}]))
+    assert log == ["a", "a", ("click", 14, 14), "b"]
+    summary = player.timing.summary()
+    assert summary["actions"] == 4
+    assert summary["max_drift"] < 0.05  # sleep granularity; the 1 s reset wait would be > 1
+
+
+def test_on_miss_jump_does_not_count_as_drift(make_player):
+    from control import compile_script
+    entries = [{"op": "on_miss", "to": "recover"}, CLICK, {"op": "end"},
+               {"op": "label", "name": "recover"}, {"timestamp": 0.5, "key": "r"}]
+    player, log = make_player()
+    player.detector.detect = lambda *a, **k: (player.clock.sleep(0.3), [])[1]  # a slow, failed search
+    player._play_script(compile_script([action_from_dict(e) for e in entries]))
+    assert log == ["r"]
+    assert player.timing.max_drift < 0.05  # the failed 0.3 s search is not drift
+
+
+def test_reserve_is_per_pass(make_player):
+    player, log = make_player(loop_until_stopped=True, max_passes=1)
+    reserved = []
+    player.timing.reserve = reserved.append
+    keys = _script([{"timestamp": 0.0, "key": "k"}] * 3)
+    asyncio.run(player.engine.run_program([("k.json", 200)], {"k.json": keys}))
+    assert len(log) == 600 and player.timing.count == 600
+    assert reserved == [3]
+
+
+def test_log_wraps_past_max_records():
+    log = TimingLog(capacity=4, max_records=8)
+    log.reserve(100)
+    assert log._capacity == 8
+    for i in range(20):
+        log.add(i, i + 0.5, 0.0, 0.0, 0.0)
+    assert log.count == 20 and [r["intended"] for r in log.records()] == list(range(12, 20))
@@ -0,0 +1,28 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tracking import TargetTracker
+
+
+def _follow(tracker, t, clusters):
+    return tracker.follow("a", t, clusters, lambda: clusters[0])
+
+
+def test_follow_continues_a_moving_track():
+    tracker = TargetTracker(latency=0.1)
+    _follow(tracker, 0.0, [(100, 100)])
+    _follow(tracker, 0.03, [(103, 100)])
+    assert _follow(tracker, 0.06, [(106, 100), (400, 400)]) == (106, 100)
+    assert tracker.predict("a") == (116, 100)
+
+
+def test_follow_starts_a_new_track_after_a_jump():
+    tracker = TargetTracker(latency=0.1)
+    _follow(tracker, 0.0, [(100, 100)])
+    _follow(tracker, 0.03, [(103, 100)])
+    assert _follow(tracker, 0.1, [(400, 400)]) == (400, 400)
+    assert tracker.samples("a", 0.1) == [(0.1, 400, 400)]
+    # One sample, no velocity: the click goes where the target was seen
+    assert tracker.predict("a") == (400, 400)
@@ -0,0 +1,66 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from vision_service import ServiceUnavailable, VisionService
+
+CLICK = {"timestamp": 0.1, "button": "Button.left", "position": [15, 15], "color_toggle": True,
+         "color": [255, 0, 0], "color_area": [0, 0, 50, 50]}
+
+
+def capture(x, y, w, h):
+    """Runs in the service process: a red square, and a failure for 13 px wide areas."""
+    if w == 13:
+        raise ValueError("cannot grab that")
+    frame = np.zeros((h, w, 3), dtype=np.uint8)
+    frame[2:8, 2:8] = (255, 0, 0)
+    return frame
+
+
+def test_failed_request_keeps_the_service_and_a_dead_one_is_reported():
+    service = VisionService(capture, timeout=10)
+    try:
+        clusters, frame = service.detect((0, 0, 20, 20), (255, 0, 0))
+        assert clusters == [(4, 4)] and frame.shape == (20, 20, 3)
+        with pytest.raises(RuntimeError, match="cannot grab that") as failed:
+            service.detect((0, 0, 13, 20), (255, 0, 0))
+        assert not isinstance(failed.value, ServiceUnavailable)
+        assert service.running and service.detect((0, 0, 20, 20), (255, 0, 0))[0] == [(4, 4)]
+
+        service._proc.kill()
+        service._proc.join()
+        service.start = lambda: None  # it died between the liveness check and the request
+        with pytest.raises(ServiceUnavailable):
+            service.detect((0, 0, 20, 20), (255, 0, 0))
+        assert service._conn is None and service._ring is None
+    finally:
+        service.close()
+
+
+class _FailingService:
+    def __init__(self, error):
+        self.error = error
+        self.closed = False
+
+    def detect(self, *args, **kwargs):
+        raise self.error
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.parametrize("error, kept", [(RuntimeError("bad request"), True),
+                                         (ServiceUnavailable("connection lost"), False)])
+def test_player_falls_back_per_request(make_player, error, kept):
+    from script_manager import LoadedScript, action_from_dict
+
+    player, log = make_player()
+    player.screen.show()
+    service = player.vision = _FailingService(error)
+    player._play_script(LoadedScript([action_from_dict(CLICK)]))
+    assert log == [("click", 14, 14)]  # found in-process either way
+    assert (player.vision is service) == kept and service.closed != kept
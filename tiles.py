@@ -0,0 +1,347 @@
+"""
+Incremental connected-cluster detection over a tiled frame.
+
+Repeated captures of the same region mostly do not change. ``TileDetector``
+keeps the previous frame and per-tile component statistics, and for a new
+frame re-masks and re-labels only the tiles whose pixels differ. Components
+touching a tile seam are merged with a small union-find, so the result is
+the same as ``utils.find_color_connected_clusters`` (8-connectivity, same
+cluster order and centroid rounding) at a cost proportional to the change.
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import List, Tuple
+
+from instrument import TRACER
+
+
+def _label_python(mask):
+    """8-connected labels of a boolean array (pure Python fallback for SciPy)."""
+    import numpy as np
+
+    h, w = mask.shape
+    labels = np.zeros((h, w), dtype=np.int32)
+    n = 0
+    for y, x in zip(*np.nonzero(mask)):
+        if labels[y, x]:
+            continue
+        n += 1
+        labels[y, x] = n
+        stack = [(y, x)]
+        while stack:
+            cy, cx = stack.pop()
+            for ny in range(max(cy - 1, 0), min(cy + 2, h)):
+                for nx in range(max(cx - 1, 0), min(cx + 2, w)):
+                    if mask[ny, nx] and not labels[ny, nx]:
+                        labels[ny, nx] = n
+                        stack.append((ny, nx))
+    return labels, n
+
+
+def _label(mask):
+    try:
+        from scipy import ndimage
+    except ImportError:
+        return _label_python(mask)
+    return ndimage.label(mask, structure=[[1, 1, 1], [1, 1, 1], [1, 1, 1]])
+
+
+def _label_tiles(frame, labels, stats, tiles, t, target, tolerance):
+    """
+    Mask and label the (ty, tx) *tiles* of *frame*, writing global ids into
+    *labels* and per-tile component statistics into *stats*.
+
+    Global id = tile index * (t * t + 1) + local label, so tiles can be
+    labeled independently (and in other processes) without id clashes.
+    """
+    import numpy as np
+
+    w = frame.shape[1]
+    ntx = -(-w // t)
+    stride = t * t + 1
+    tgt = np.asarray(target, dtype=np.int16)
+    for ty, tx in tiles:
+        y0, x0 = ty * t, tx * t
+        block = frame[y0:y0 + t, x0:x0 + t]
+        mask = np.all(np.abs(block.astype(np.int16) - tgt) <= tolerance, axis=-1)
+        local, n = _label(mask)
+        index = int(ty * ntx + tx)
+        if not n:
+            labels[y0:y0 + t, x0:x0 + t] = 0
+            stats.pop(index, None)
+            continue
+        base = index * stride
+        labels[y0:y0 + t, x0:x0 + t] = np.where(local > 0, local + base, 0)
+        ys, xs = np.nonzero(local)
+        lab = local[ys, xs]
+        counts = np.bincount(lab, minlength=n + 1)[1:]
+        sum_x = np.bincount(lab, weights=xs + x0, minlength=n + 1)[1:]
+        sum_y = np.bincount(lab, weights=ys + y0, minlength=n + 1)[1:]
+        first = np.full(n + 1, np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(first, lab, (ys + y0).astype(np.int64) * w + xs + x0)
+        stats[index] = (np.arange(1, n + 1) + base, counts, sum_x, sum_y, first[1:])
+
+
+class _State:
+    """Previous frame and per-tile results for one (shape, color, tolerance)."""
+
+    __slots__ = ("frame", "labels", "stats")
+
+    def __init__(self, frame, labels, stats):
+        self.frame = frame
+        self.labels = labels  # global label ids, 0 = no match
+        self.stats = stats  # tile index -> (ids, counts, sum_x, sum_y, first raster index)
+
+
+class TileDetector:
+    """
+    Drop-in for ``find_color_connected_clusters`` on (H, W, 3) arrays that
+    reuses work from the previous frame of the same shape and parameters.
+
+    Up to *max_states* (shape, color, tolerance) combinations are remembered,
+    so several color actions can alternate without evicting each other.
+    """
+
+    def __init__(self, tile: int = 32, max_states: int = 8):
+        self.tile = tile
+        self.max_states = max_states
+        self._states: OrderedDict = OrderedDict()
+        self.frames = 0
+        self.tiles_total = 0
+        self.tiles_dirty = 0
+
+    def stats(self) -> dict:
+        return {"frames": self.frames, "tiles": self.tiles_total, "dirty": self.tiles_dirty,
+                "dirty_fraction": self.tiles_dirty / self.tiles_total if self.tiles_total else 0.0}
+
+    def find(self, frame, target: Tuple[int, int, int], *, offset: Tuple[int, int] = (0, 0),
+             tolerance: int = 10, min_cluster_size: int = 5) -> List[Tuple[int, int]]:
+        import numpy as np
+
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)[..., :3]
+        h, w = frame.shape[:2]
+        t = self.tile
+        nty, ntx = -(-h // t), -(-w // t)
+        key = (frame.shape, tuple(target), tolerance)
+        state = self._states.get(key)
+
+        with TRACER.span("diff"):
+            if state is None:
+                dirty = np.ones((nty, ntx), dtype=bool)
+                labels = np.zeros((h, w), dtype=np.int32)
+                stats = {}
+            else:
+                self._states.move_to_end(key)
+                changed = np.any(frame != state.frame, axis=-1)
+                padded = np.zeros((nty * t, ntx * t), dtype=bool)
+                padded[:h, :w] = changed
+                dirty = padded.reshape(nty, t, ntx, t).any(axis=(1, 3))
+                labels, stats = state.labels, state.stats
+
+        self.frames += 1
+        self.tiles_total += nty * ntx
+        self.tiles_dirty += int(dirty.sum())
+
+        with TRACER.span("mask", tiles=int(dirty.sum())):
+            _label_tiles(frame, labels, stats, zip(*np.nonzero(dirty)), t, target, tolerance)
+
+        with TRACER.span("merge"):
+            clusters = _merge(labels, stats, t, min_cluster_size, offset)
+
+        self._states[key] = _State(frame.copy(), labels, stats)
+        while len(self._states) > self.max_states:
+            self._states.popitem(last=False)
+        return clusters
+
+
+def _merge(labels, stats, t, min_cluster_size, offset):
+    """Union components across tile seams; clusters in the order and rounding of the original."""
+    import numpy as np
+
+    if not stats:
+        return []
+    ids = np.concatenate([s[0] for s in stats.values()])
+    counts = np.concatenate([s[1] for s in stats.values()])
+    sum_x = np.concatenate([s[2] for s in stats.values()])
+    sum_y = np.concatenate([s[3] for s in stats.values()])
+    first = np.concatenate([s[4] for s in stats.values()])
+
+    # Label pairs touching across tile seams (8-connectivity)
+    pairs = []
+    h, w = labels.shape
+    for c in range(t, w, t):
+        left, right = labels[:, c - 1], labels[:, c]
+        for dy in (-1, 0, 1):
+            a = left[max(0, -dy):h - max(0, dy)]
+            b = right[max(0, dy):h - max(0, -dy)]
+            hit = (a > 0) & (b > 0)
+            if hit.any():
+                pairs.append(np.stack([a[hit], b[hit]], axis=1))
+    for r in range(t, h, t):
+        top, bottom = labels[r - 1], labels[r]
+        for dx in (-1, 0, 1):
+            a = top[max(0, -dx):w - max(0, dx)]
+            b = bottom[max(0, dx):w - max(0, -dx)]
+            hit = (a > 0) & (b > 0)
+            if hit.any():
+                pairs.append(np.stack([a[hit], b[hit]], axis=1))
+
+    position = {int(g): i for i, g in enumerate(ids)}
+    parent = list(range(len(ids)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    if pairs:
+        for a, b in np.unique(np.concatenate(pairs), axis=0):
+            ra, rb = find(position[int(a)]), find(position[int(b)])
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+
+    roots = np.fromiter((find(i) for i in range(len(ids))), dtype=np.int64, count=len(ids))
+    n = len(ids)
+    tot = np.bincount(roots, weights=counts, minlength=n)
+    sx = np.bincount(roots, weights=sum_x, minlength=n)
+    sy = np.bincount(roots, weights=sum_y, minlength=n)
+    fst = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(fst, roots, first)
+
+    keep = np.nonzero(tot >= min_cluster_size)[0]
+    keep = keep[np.argsort(fst[keep], kind="stable")]
+    ox, oy = offset
+    out = []
+    for r in keep:
+        k = int(tot[r])
+        # Same rounding as find_color_connected_clusters: int(sum(x + ox) / n)
+        out.append((int((int(sx[r]) + ox * k) / k), int((int(sy[r]) + oy * k) / k)))
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Process-parallel labeling
+# ---------------------------------------------------------------------------
+_ATTACHED: dict = {}  # worker side: shared-memory name -> SharedMemory
+
+
+def _attach(name: str):
+    shm = _ATTACHED.get(name)
+    if shm is None:
+        from multiprocessing import shared_memory
+        # Pool workers share the parent's resource tracker, which unlinks the
+        # block only when the parent does
+        shm = shared_memory.SharedMemory(name=name)
+        _ATTACHED[name] = shm
+    return shm
+
+
+def _label_band(frame_name: str, labels_name: str, shape, rows, t, target, tolerance):
+    """Worker: label every tile in tile rows *rows* of the shared frame; returns the tile stats."""
+    import numpy as np
+
+    # Buffers replaced after a resize (or by a closed detector) are not coming back
+    for stale in [name for name in _ATTACHED if name not in (frame_name, labels_name)]:
+        _ATTACHED.pop(stale).close()
+    frame = np.ndarray(shape, dtype=np.uint8, buffer=_attach(frame_name).buf)
+    labels = np.ndarray(shape[:2], dtype=np.int32, buffer=_attach(labels_name).buf)
+    ntx = -(-shape[1] // t)
+    stats: dict = {}
+    _label_tiles(frame, labels, stats, ((ty, tx) for ty in rows for tx in range(ntx)), t, target, tolerance)
+    return stats
+
+
+class ParallelTileDetector:
+    """
+    ``find_color_connected_clusters`` for large frames, labeled in parallel.
+
+    The frame is copied once into shared memory; a persistent process pool
+    masks and labels bands of tiles in place (only the small per-tile
+    statistics travel back), and the components are merged across tile
+    seams here. Frames under *min_pixels* are labeled in this process, where
+    the pool round trip would cost more than it saves.
+    """
+
+    def __init__(self, workers: int | None = None, tile: int = 64, min_pixels: int = 1_000_000):
+        import os
+        self.workers = workers or os.cpu_count() or 1
+        self.tile = tile
+        self.min_pixels = min_pixels
+        self._pool = None
+        self._frame_shm = None
+        self._labels_shm = None
+
+    def _buffers(self, h: int, w: int):
+        from multiprocessing import shared_memory
+
+        if self._frame_shm is None or self._frame_shm.size < h * w * 3:
+            self._release_buffers()
+            self._frame_shm = shared_memory.SharedMemory(create=True, size=h * w * 3)
+            self._labels_shm = shared_memory.SharedMemory(create=True, size=h * w * 4)
+        return self._frame_shm, self._labels_shm
+
+    def _executor(self):
+        if self._pool is None:
+            import atexit
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # spawn, not fork: the parent has listener, engine and Tk threads running
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(self.close)  # in case the owner never closes it
+        return self._pool
+
+    def find(self, frame, target: Tuple[int, int, int], *, offset: Tuple[int, int] = (0, 0),
+             tolerance: int = 10, min_cluster_size: int = 5) -> List[Tuple[int, int]]:
+        import numpy as np
+
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)[..., :3]
+        h, w = frame.shape[:2]
+        t = self.tile
+        nty, ntx = -(-h // t), -(-w // t)
+        target = tuple(int(c) for c in target)
+
+        if h * w < self.min_pixels or self.workers < 2:
+            labels = np.zeros((h, w), dtype=np.int32)
+            stats: dict = {}
+            with TRACER.span("mask", tiles=nty * ntx):
+                _label_tiles(frame, labels, stats, ((ty, tx) for ty in range(nty) for tx in range(ntx)),
+                             t, target, tolerance)
+            with TRACER.span("merge"):
+                return _merge(labels, stats, t, min_cluster_size, offset)
+
+        frame_shm, labels_shm = self._buffers(h, w)
+        shared = np.ndarray((h, w, 3), dtype=np.uint8, buffer=frame_shm.buf)
+        shared[...] = frame
+        # A few bands per worker keeps them busy when tiles differ in cost
+        bands = max(1, min(nty, self.workers * 4))
+        rows = [range(nty * i // bands, nty * (i + 1) // bands) for i in range(bands)]
+        stats = {}
+        with TRACER.span("mask", tiles=nty * ntx, bands=bands):
+            futures = [self._executor().submit(_label_band, frame_shm.name, labels_shm.name, (h, w, 3),
+                                               r, t, target, tolerance) for r in rows]
+            for f in futures:
+                stats.update(f.result())
+        labels = np.ndarray((h, w), dtype=np.int32, buffer=labels_shm.buf)
+        with TRACER.span("merge"):
+            clusters = _merge(labels, stats, t, min_cluster_size, offset)
+        del shared, labels
+        return clusters
+
+    def _release_buffers(self):
+        for shm in (self._frame_shm, self._labels_shm):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        self._frame_shm = self._labels_shm = None
+
+    def close(self):
+        """Stop the worker pool and free the shared buffers."""
+        if self._pool is not None:
+            import atexit
+            self._pool.shutdown()
+            self._pool = None
+            atexit.unregister(self.close)
+        self._release_buffers()
@@ -0,0 +1,152 @@
+"""Scheduled vs. actual dispatch times for every replayed action."""
+from __future__ import annotations
+
+import csv
+import json
+import math
+from array import array
+from pathlib import Path
+from typing import List, Optional
+
+COLUMNS = ("intended", "actual", "drift", "overshoot", "detect", "inject")
+
+
+class TimingLog:
+    """
+    Array-backed record of one playback.
+
+    Each action gets its intended dispatch time (playback start plus the sum
+    of scheduled delays), its actual dispatch time (when input injection
+    started) and the parts of the gap: how long the interval sleep overran,
+    time spent on color detection and time spent injecting input. Columns are
+    preallocated and grow by doubling; past *max_records* the oldest records
+    are overwritten, while the running mean/max keep covering everything.
+    """
+
+    def __init__(self, capacity: int = 4096, max_records: int = 1_000_000):
+        self.max_records = max_records
+        self._cols = {name: array("d", bytes(8 * capacity)) for name in COLUMNS}
+        self._iteration = array("l", bytes(array("l").itemsize * capacity))
+        self._capacity = capacity
+        self.reset()
+
+    def reset(self, t0: float = 0.0):
+        self.t0 = t0
+        self.count = 0  # records ever added
+        self._drift_sum = 0.0
+        self._drift_max = -math.inf
+        self._iter_start: Optional[tuple] = None
+        self.iterations: List[dict] = []  # per script iteration: script, iteration, actions, drift
+
+    # ------------------------------------------------------------------
+    def reserve(self, n: int):
+        """Make room for *n* more records up front (capped at max_records)."""
+        need = min(self.count + n, self.max_records)
+        if need > self._capacity:
+            self._grow(need)
+
+    def _grow(self, capacity: int):
+        capacity = min(max(capacity, self._capacity * 2), self.max_records)
+        extra = capacity - self._capacity
+        for col in self._cols.values():
+            col.frombytes(bytes(8 * extra))
+        self._iteration.frombytes(bytes(self._iteration.itemsize * extra))
+        self._capacity = capacity
+
+    def add(self, intended: float, actual: float, overshoot: float, detect: float, inject: float):
+        i = self.count
+        if i >= self._capacity and self._capacity < self.max_records:
+            self._grow(i + 1)
+        slot = i % self._capacity
+        drift = actual - intended
+        c = self._cols
+        c["intended"][slot] = intended - self.t0
+        c["actual"][slot] = actual - self.t0
+        c["drift"][slot] = drift
+        c["overshoot"][slot] = overshoot
+        c["detect"][slot] = detect
+        c["inject"][slot] = inject
+        self._iteration[slot] = len(self.iterations)
+        self.count = i + 1
+        self._drift_sum += drift
+        if drift > self._drift_max:
+            self._drift_max = drift
+
+    def begin_iteration(self, name: str, iteration: int):
+        self._iter_start = (name, iteration, self.count)
+
+    def end_iteration(self):
+        """Close the current script iteration and record the drift it added."""
+        if self._iter_start is None:
+            return
+        name, iteration, first = self._iter_start
+        self._iter_start = None
+        if self.count == first:
+            return
+        drift = self._cols["drift"]
+        last = drift[(self.count - 1) % self._capacity]
+        start = drift[max(first, self.count - self._capacity) % self._capacity]
+        self.iterations.append({"script": name, "iteration": iteration, "actions": self.count - first,
+                                "drift": last - start, "end_drift": last})
+
+    # ------------------------------------------------------------------
+    @property
+    def last_drift(self) -> float:
+        return self._cols["drift"][(self.count - 1) % self._capacity] if self.count else 0.0
+
+    @property
+    def mean_drift(self) -> float:
+        return self._drift_sum / self.count if self.count else 0.0
+
+    @property
+    def max_drift(self) -> float:
+        return self._drift_max if self.count else 0.0
+
+    def _column(self, name: str) -> array:
+        """Retained values of *name* in insertion order."""
+        return self._ordered(self._cols[name])
+
+    def _ordered(self, col: array) -> array:
+        if self.count <= self._capacity:
+            return col[:self.count]
+        split = self.count % self._capacity
+        return col[split:] + col[:split]
+
+    def summary(self) -> dict:
+        """Mean/p95/max drift and mean gap components, plus per-iteration drift."""
+        drift = sorted(self._column("drift"))
+        p95 = drift[min(len(drift) - 1, int(0.95 * len(drift)))] if drift else 0.0
+
+        def mean(name):
+            col = self._column(name)
+            return sum(col) / len(col) if col else 0.0
+
+        return {
+            "actions": self.count,
+            "mean_drift": self.mean_drift,
+            "p95_drift": p95,
+            "max_drift": self.max_drift,
+            "mean_overshoot": mean("overshoot"),
+            "mean_detect": mean("detect"),
+            "mean_inject": mean("inject"),
+            "iterations": list(self.iterations),
+        }
+
+    def records(self):
+        """Yield retained records as dicts (times in seconds since playback start)."""
+        cols = [self._column(name) for name in COLUMNS]
+        for *row, iteration in zip(*cols, self._ordered(self._iteration)):
+            rec = dict(zip(COLUMNS, row))
+            rec["iteration"] = iteration
+            yield rec
+
+    def export(self, path: Path | str):
+        """Write CSV for ``*.csv``, otherwise JSON with the summary and all records."""
+        path = Path(path)
+        if path.suffix.lower() == ".csv":
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=COLUMNS + ("iteration",))
+                writer.writeheader()
+                writer.writerows(self.records())
+        else:
+            path.write_text(json.dumps({"summary": self.summary(), "records": list(self.records())}))
@@ -0,0 +1,136 @@
+"""Motion tracking of color-search targets, so clicks land where a moving target will be."""
+from __future__ import annotations
+
+import math
+from collections import deque
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+Sample = Tuple[float, float, float]  # (capture time, x, y)
+
+
+class TargetTracker:
+    """
+    Recent target positions per action, and a constant-velocity prediction.
+
+    Every capture where the target was found is recorded with the time it was
+    taken. The velocity is a least-squares fit over the samples no older than
+    *max_age* seconds; :meth:`predict` extrapolates the newest sample by the
+    expected capture-to-click latency, moving at most *max_extrapolation*
+    pixels. The latency is an exponential average of what :meth:`clicked`
+    measured, starting at *latency*.
+    """
+
+    def __init__(self, history: int = 5, max_age: float = 0.5, max_jump: float = 60.0,
+                 max_extrapolation: float = 80.0, latency: float = 0.08, smoothing: float = 0.3):
+        self.history = history
+        self.max_age = max_age
+        self.max_jump = max_jump  # farther than this from the prediction = a different target
+        self.max_extrapolation = max_extrapolation
+        self.latency = latency
+        self.smoothing = smoothing
+        self._tracks: Dict[Hashable, deque] = {}
+        self.predictions = 0
+        self.clamped = 0
+
+    def samples(self, key: Hashable, now: float) -> List[Sample]:
+        """Samples of *key* still young enough to estimate motion from."""
+        track = self._tracks.get(key)
+        if not track:
+            return []
+        return [s for s in track if now - s[0] <= self.max_age]
+
+    def observe(self, key: Hashable, t: float, x: float, y: float):
+        track = self._tracks.get(key)
+        if track is None:
+            track = self._tracks[key] = deque(maxlen=self.history)
+        elif track and t - track[-1][0] > self.max_age:
+            track.clear()  # stale: the target may have gone anywhere since
+        track.append((t, x, y))
+
+    def velocity(self, key: Hashable, now: float) -> Optional[Tuple[float, float]]:
+        """Pixels per second from the fresh samples (None with fewer than two)."""
+        fresh = self.samples(key, now)
+        if len(fresh) < 2:
+            return None
+        n = len(fresh)
+        mt = sum(s[0] for s in fresh) / n
+        mx = sum(s[1] for s in fresh) / n
+        my = sum(s[2] for s in fresh) / n
+        var = sum((s[0] - mt) ** 2 for s in fresh)
+        if var <= 0.0:
+            return None
+        vx = sum((s[0] - mt) * (s[1] - mx) for s in fresh) / var
+        vy = sum((s[0] - mt) * (s[2] - my) for s in fresh) / var
+        return vx, vy
+
+    def expected(self, key: Hashable, t: float) -> Optional[Tuple[float, float]]:
+        """Where the tracked target should be at time *t* (unclamped; None if untracked)."""
+        fresh = self.samples(key, t)
+        if not fresh:
+            return None
+        t0, x0, y0 = fresh[-1]
+        v = self.velocity(key, t)
+        if v is None:
+            return x0, y0
+        return x0 + v[0] * (t - t0), y0 + v[1] * (t - t0)
+
+    def nearest(self, key: Hashable, t: float, clusters: Sequence[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+        """The cluster continuing the track at time *t*, or None if none is within *max_jump*."""
+        where = self.expected(key, t)
+        if where is None or not clusters:
+            return None
+        ex, ey = where
+        best = min(clusters, key=lambda c: (c[0] - ex) ** 2 + (c[1] - ey) ** 2)
+        if math.hypot(best[0] - ex, best[1] - ey) > self.max_jump:
+            return None
+        return best
+
+    def follow(self, key: Hashable, t: float, clusters: Sequence[Tuple[int, int]],
+               fallback: Callable[[], Tuple[int, int]]) -> Tuple[int, int]:
+        """
+        Record where *key* is at time *t*: the cluster continuing its track,
+        or else ``fallback()`` as the first sample of a new track.
+        """
+        pick = self.nearest(key, t, clusters)
+        if pick is None:
+            # A different target, or the same one jumped: the old samples say nothing about its motion
+            self.forget(key)
+            pick = fallback()
+        self.observe(key, t, *pick)
+        return pick
+
+    def predict(self, key: Hashable) -> Optional[Tuple[int, int]]:
+        """Click position for the newest sample of *key*, *latency* seconds after it was captured."""
+        track = self._tracks.get(key)
+        if not track:
+            return None
+        t0, x0, y0 = track[-1]
+        v = self.velocity(key, t0)
+        if v is None:
+            return round(x0), round(y0)
+        dx, dy = v[0] * self.latency, v[1] * self.latency
+        dist = math.hypot(dx, dy)
+        if dist > self.max_extrapolation:
+            dx, dy = dx * self.max_extrapolation / dist, dy * self.max_extrapolation / dist
+            self.clamped += 1
+        self.predictions += 1
+        return round(x0 + dx), round(y0 + dy)
+
+    def clicked(self, key: Hashable, t: float):
+        """Record that the click for *key* happened at *t*, refining the latency estimate."""
+        track = self._tracks.get(key)
+        if not track:
+            return
+        measured = t - track[-1][0]
+        if 0.0 <= measured <= self.max_age:
+            self.latency += self.smoothing * (measured - self.latency)
+
+    def forget(self, key: Hashable):
+        self._tracks.pop(key, None)
+
+    def clear(self):
+        self._tracks.clear()
+
+    def stats(self) -> dict:
+        return {"tracks": len(self._tracks), "predictions": self.predictions, "clamped": self.clamped,
+                "latency": self.latency}
@@ -6,27 +6,66 @@ import os
 import time
 from pathlib import Path
 from typing import List, Sequence, Tuple
-import numpy as np
-from sklearn.cluster import DBSCAN
 
-import pyautogui
-from PIL import Image
+from instrument import TRACER
+
+# NumPy, scikit-learn, PIL and pyautogui are imported inside the functions
+# that need them: they dominate start-up time and most runs never touch them.
 
 BASE_DIR = Path(__file__).resolve().parent
 SCRIPTS_DIR = BASE_DIR / "scripts"
 PROGRAMS_DIR = BASE_DIR / "programs"
+SETTINGS_PATH = BASE_DIR / "settings.json"
+DIAGNOSTICS_DIR = BASE_DIR / "diagnostics"
+
+DEFAULT_SETTINGS = dict(
+    color_area_width=300,
+    color_area_height=500,
+    color_toggle_key='shift', stop_key='tab',
+    replay_speed=1.0, pause_key='space', replay_stop_key='s', skip_pause_key='n',
+    loop_until_stopped=False, record_mouse_moves=True, path_tolerance=2.0,
+    optimize_recordings=True, failure_frames=32, failure_budget_mb=16, detect_mode='full',
+    vision_service=False, template_size=0, template_downscale=0,
+    track_frames=2, track_interval=0.03, max_extrapolation=80,
+    anchor={"mode": "fixed", "point": [1111, 561]}, learn_roi=False,
+    fast_path=False, probe_radius=3, probe_min=5, detect_lookahead=False,
+    checkpoint_every='off', checkpoint_interval=1.0
+)
+
+
+def open_image(img):
+    """
+    Context manager yielding a PIL image for *img*.
+
+    *img* may be a path (opened and closed here), a PIL image or an (H, W, 3)
+    uint8 array (used as is), so the color searches work on in-memory frames.
+    """
+    import contextlib
+    from PIL import Image
 
-for _p in (SCRIPTS_DIR, PROGRAMS_DIR):
-    _p.mkdir(exist_ok=True)
+    if isinstance(img, (str, Path)):
+        return Image.open(img)
+    if isinstance(img, Image.Image):
+        return contextlib.nullcontext(img)
+    import numpy as np
+    return contextlib.nullcontext(Image.fromarray(np.ascontiguousarray(img, dtype=np.uint8)))
 
 
 def screenshot_area(x: int, y: int, w: int, h: int, out: Path | str) -> None:
     """Capture rectangular region to *out* PNG."""
+    import pyautogui
     region = (x, y, w, h)
     pyautogui.screenshot(region=region).save(out)
 
 
-def find_color_clusters(
+def grab_area(x: int, y: int, w: int, h: int):
+    """Capture rectangular region as an (h, w, 3) uint8 RGB array (no file written)."""
+    import numpy as np
+    import pyautogui
+    return np.asarray(pyautogui.screenshot(region=(x, y, w, h)).convert("RGB"))
+
+
+def find_color_clusters_dbscan(
     img_path: Path | str,
     target: Tuple[int, int, int],
     *,
@@ -40,7 +79,8 @@ def find_color_clusters(
     mean (x, y) position of each cluster, **fast**.
 
     Args:
-        img_path: Path to image (any PIL-readable format).
+        img_path: Path to image (any PIL-readable format), PIL image or
+                  (H, W, 3) uint8 array.
         target: RGB triple to match (r, g, b).
         offset: (dx, dy) added to returned coordinates.
         tolerance: Per-channel maximum absolute difference from `target`.
@@ -50,13 +90,17 @@ def find_color_clusters(
     Returns:
         List of (x, y) integer coordinates (cluster centroids).
     """
+    import numpy as np
+    from sklearn.cluster import DBSCAN
+
     # --- 1. Load & vectorize -------------------------------------------------
-    img = Image.open(img_path).convert("RGB")
-    arr = np.asarray(img, dtype=np.int16)          # shape (H, W, 3)
+    with TRACER.span("decode"), open_image(img_path) as img:
+        arr = np.asarray(img.convert("RGB"), dtype=np.int16)          # shape (H, W, 3)
 
     # --- 2. Boolean mask of matching pixels ---------------------------------
-    target_arr = np.array(target, dtype=np.int16)
-    mask = np.all(np.abs(arr - target_arr) <= tolerance, axis=-1)
+    with TRACER.span("mask"):
+        target_arr = np.array(target, dtype=np.int16)
+        mask = np.all(np.abs(arr - target_arr) <= tolerance, axis=-1)
 
     # Short-circuit if nothing matches
     if not mask.any():
@@ -68,12 +112,13 @@ def find_color_clusters(
     coords += np.asarray(offset, dtype=np.int32)
 
     # --- 4. Density-based clustering (DBSCAN) -------------------------------
-    db = DBSCAN(
-        eps=max_distance,          # neighborhood radius
-        min_samples=min_cluster_size,
-        n_jobs=-1                  # use all CPU cores
-    )
-    labels = db.fit_predict(coords)
+    with TRACER.span("label", points=len(coords)):
+        db = DBSCAN(
+            eps=max_distance,          # neighborhood radius
+            min_samples=min_cluster_size,
+            n_jobs=-1                  # use all CPU cores
+        )
+        labels = db.fit_predict(coords)
 
     # --- 5. Compute mean of each cluster ------------------------------------
     means: List[Tuple[int, int]] = []
@@ -99,7 +144,7 @@ def find_color_clusters(
     Find clusters of pixels within tolerance of target color and return mean position of each cluster.
     
     Args:
-        img_path: Path to the image file
+        img_path: Path to the image file, PIL image or (H, W, 3) uint8 array
         target: Target RGB color (r, g, b)
         offset: Offset to add to returned coordinates
         tolerance: Color tolerance for matching pixels
@@ -109,52 +154,55 @@ def find_color_clusters(
     Returns:
         List of (x, y) coordinates representing the mean position of each cluster
     """
-    with Image.open(img_path) as img:
+    with open_image(img_path) as img:
         # Find all matching pixels
         matches: List[Tuple[int, int]] = []
-        px = img.load()
+        with TRACER.span("decode"):
+            px = img.load()
         w, h = img.size
-        for yy in range(h):
-            for xx in range(w):
-                r, g, b = px[xx, yy][:3]
-                if all(abs(c - t) <= tolerance for c, t in zip((r, g, b), target)):
-                    matches.append((offset[0] + xx, offset[1] + yy))
+        with TRACER.span("mask"):
+            for yy in range(h):
+                for xx in range(w):
+                    r, g, b = px[xx, yy][:3]
+                    if all(abs(c - t) <= tolerance for c, t in zip((r, g, b), target)):
+                        matches.append((offset[0] + xx, offset[1] + yy))
         
         if not matches:
             return []
         
-        # Group pixels into clusters using distance-based clustering
-        clusters = []
-        used_pixels = set()
+        with TRACER.span("label", points=len(matches)):
+            # Group pixels into clusters using distance-based clustering
+            clusters = []
+            used_pixels = set()
         
-        for pixel in matches:
-            if pixel in used_pixels:
-                continue
+            for pixel in matches:
+                if pixel in used_pixels:
+                    continue
                 
-            # Start a new cluster
-            cluster = [pixel]
-            used_pixels.add(pixel)
+                # Start a new cluster
+                cluster = [pixel]
+                used_pixels.add(pixel)
             
-            # Find all pixels within max_distance of any pixel in this cluster
-            changed = True
-            while changed:
-                changed = False
-                for px1 in matches:
-                    if px1 in used_pixels:
-                        continue
+                # Find all pixels within max_distance of any pixel in this cluster
+                changed = True
+                while changed:
+                    changed = False
+                    for px1 in matches:
+                        if px1 in used_pixels:
+                            continue
                     
-                    # Check if px1 is close to any pixel in current cluster
-                    for px2 in cluster:
-                        distance = ((px1[0] - px2[0]) ** 2 + (px1[1] - px2[1]) ** 2) ** 0.5
-                        if distance <= max_distance:
-                            cluster.append(px1)
-                            used_pixels.add(px1)
-                            changed = True
-                            break
+                        # Check if px1 is close to any pixel in current cluster
+                        for px2 in cluster:
+                            distance = ((px1[0] - px2[0]) ** 2 + (px1[1] - px2[1]) ** 2) ** 0.5
+                            if distance <= max_distance:
+                                cluster.append(px1)
+                                used_pixels.add(px1)
+                                changed = True
+                                break
             
-            # Only keep clusters that meet minimum size requirement
-            if len(cluster) >= min_cluster_size:
-                clusters.append(cluster)
+                # Only keep clusters that meet minimum size requirement
+                if len(cluster) >= min_cluster_size:
+                    clusters.append(cluster)
         
         # Calculate mean position for each cluster
         cluster_means = []
@@ -180,7 +228,7 @@ def find_color_connected_clusters(
     Only pixels that are directly adjacent (neighboring) to other matching pixels form clusters.
     
     Args:
-        img_path: Path to the image file
+        img_path: Path to the image file, PIL image or (H, W, 3) uint8 array
         target: Target RGB color (r, g, b)
         offset: Offset to add to returned coordinates
         tolerance: Color tolerance for matching pixels
@@ -189,63 +237,66 @@ def find_color_connected_clusters(
     Returns:
         List of (x, y) coordinates representing the mean position of each cluster
     """
-    with Image.open(img_path) as img:
+    with open_image(img_path) as img:
         # Find all matching pixels
         matches: List[Tuple[int, int]] = []
-        px = img.load()
+        with TRACER.span("decode"):
+            px = img.load()
         w, h = img.size
         
-        # Create a 2D array to mark matching pixels
-        match_grid = [[False for _ in range(w)] for _ in range(h)]
+        with TRACER.span("mask"):
+            # Create a 2D array to mark matching pixels
+            match_grid = [[False for _ in range(w)] for _ in range(h)]
         
-        for yy in range(h):
-            for xx in range(w):
-                r, g, b = px[xx, yy][:3]
-                if all(abs(c - t) <= tolerance for c, t in zip((r, g, b), target)):
-                    matches.append((xx, yy))
-                    match_grid[yy][xx] = True
+            for yy in range(h):
+                for xx in range(w):
+                    r, g, b = px[xx, yy][:3]
+                    if all(abs(c - t) <= tolerance for c, t in zip((r, g, b), target)):
+                        matches.append((xx, yy))
+                        match_grid[yy][xx] = True
         
         if not matches:
             return []
         
-        # Find connected components using flood fill
-        clusters = []
-        visited = [[False for _ in range(w)] for _ in range(h)]
+        with TRACER.span("label", points=len(matches)):
+            # Find connected components using flood fill
+            clusters = []
+            visited = [[False for _ in range(w)] for _ in range(h)]
         
-        def flood_fill_iterative(start_x: int, start_y: int) -> List[Tuple[int, int]]:
-            """Iterative flood fill to find all connected pixels of the same color."""
-            if (start_x < 0 or start_x >= w or start_y < 0 or start_y >= h or 
-                visited[start_y][start_x] or not match_grid[start_y][start_x]):
-                return []
+            def flood_fill_iterative(start_x: int, start_y: int) -> List[Tuple[int, int]]:
+                """Iterative flood fill to find all connected pixels of the same color."""
+                if (start_x < 0 or start_x >= w or start_y < 0 or start_y >= h or 
+                    visited[start_y][start_x] or not match_grid[start_y][start_x]):
+                    return []
             
-            cluster = []
-            stack = [(start_x, start_y)]
+                cluster = []
+                stack = [(start_x, start_y)]
             
-            while stack:
-                x, y = stack.pop()
+                while stack:
+                    x, y = stack.pop()
                 
-                if (x < 0 or x >= w or y < 0 or y >= h or 
-                    visited[y][x] or not match_grid[y][x]):
-                    continue
+                    if (x < 0 or x >= w or y < 0 or y >= h or 
+                        visited[y][x] or not match_grid[y][x]):
+                        continue
                 
-                visited[y][x] = True
-                cluster.append((x, y))
+                    visited[y][x] = True
+                    cluster.append((x, y))
                 
-                # Add all 8 neighboring pixels to the stack
-                for dx in [-1, 0, 1]:
-                    for dy in [-1, 0, 1]:
-                        if dx == 0 and dy == 0:
-                            continue
-                        stack.append((x + dx, y + dy))
+                    # Add all 8 neighboring pixels to the stack
+                    for dx in [-1, 0, 1]:
+                        for dy in [-1, 0, 1]:
+                            if dx == 0 and dy == 0:
+                                continue
+                            stack.append((x + dx, y + dy))
             
-            return cluster
+                return cluster
         
-        # Find all connected components
-        for x, y in matches:
-            if not visited[y][x]:
-                cluster = flood_fill_iterative(x, y)
-                if len(cluster) >= min_cluster_size:
-                    clusters.append(cluster)
+            # Find all connected components
+            for x, y in matches:
+                if not visited[y][x]:
+                    cluster = flood_fill_iterative(x, y)
+                    if len(cluster) >= min_cluster_size:
+                        clusters.append(cluster)
         
         # Calculate mean position for each cluster
         cluster_means = []
@@ -294,15 +345,17 @@ def find_color_mean(
     tolerance: int = 10,
 ) -> Tuple[int, int] | None:
     """Return mean (x,y) of all pixels within *tolerance* of *target*."""
-    with Image.open(img_path) as img:
+    with open_image(img_path) as img:
         matches: list[Tuple[int, int]] = []
-        px = img.load()
+        with TRACER.span("decode"):
+            px = img.load()
         w, h = img.size
-        for yy in range(h):
-            for xx in range(w):
-                r, g, b = px[xx, yy][:3]
-                if all(abs(c - t) <= tolerance for c, t in zip((r, g, b), target)):
-                    matches.append((offset[0] + xx, offset[1] + yy))
+        with TRACER.span("mask"):
+            for yy in range(h):
+                for xx in range(w):
+                    r, g, b = px[xx, yy][:3]
+                    if all(abs(c - t) <= tolerance for c, t in zip((r, g, b), target)):
+                        matches.append((offset[0] + xx, offset[1] + yy))
         if not matches:
             return None
         mx = sum(x for x, _ in matches) / len(matches)
@@ -311,8 +364,26 @@ def find_color_mean(
 
 
 def save_json(obj: object, path: Path | str) -> None:
-    Path(path).write_text(json.dumps(obj, indent=4))
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(obj, indent=4))
 
 
 def load_json(path: Path | str):
-    return json.loads(Path(path).read_text())
\ No newline at end of file
+    return json.loads(Path(path).read_text())
+
+
+def load_settings(path: Path | str = SETTINGS_PATH) -> dict:
+    """Defaults overlaid with *path* (a missing or malformed file is ignored)."""
+    settings = dict(DEFAULT_SETTINGS)
+    path = Path(path)
+    if path.exists():
+        try:
+            settings.update(json.loads(path.read_text()))
+        except json.JSONDecodeError:
+            pass
+    return settings
+
+
+def save_settings(settings: dict, path: Path | str = SETTINGS_PATH) -> None:
+    Path(path).write_text(json.dumps(settings, indent=4))
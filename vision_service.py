@@ -0,0 +1,182 @@
+"""
+Capture and color detection in a separate process.
+
+The playback process sends a small request (area, color, search options)
+over a pipe; the service captures the area, runs the detector, publishes the
+frame into a ``multiprocessing.shared_memory`` ring and answers with the
+clusters and the ring slot. NumPy work and screen grabs then no longer hold
+the GIL that the Tk mainloop, the pynput listeners and the replay thread
+share.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import threading
+import time
+from typing import Callable, Tuple
+
+from utils import grab_area
+
+
+class ServiceUnavailable(RuntimeError):
+    """The service process cannot serve requests: it died, its pipe broke or it stopped answering."""
+
+
+def _serve(conn, ring_name: str, slots: int, slot_bytes: int, capture: Callable,
+           detect_mode: str, cache_entries: int):
+    """Service process main loop: one request in, one reply out, until None or EOF."""
+    from multiprocessing import shared_memory
+
+    import numpy as np
+
+    from detection import make_detector
+
+    ring = shared_memory.SharedMemory(name=ring_name)
+    detector = make_detector(detect_mode, cache_entries)
+    seq = 0
+    try:
+        while True:
+            try:
+                msg = conn.recv()
+            except EOFError:
+                break
+            if msg is None:
+                break
+            req_id, (x, y, w, h), color, options = msg
+            try:
+                t0 = time.perf_counter()
+                frame = np.ascontiguousarray(capture(x, y, w, h), dtype=np.uint8)
+                t1 = time.perf_counter()
+                clusters = detector.find(frame, color, **options)
+                t2 = time.perf_counter()
+                slot = None
+                if frame.nbytes <= slot_bytes:
+                    slot = seq % slots
+                    view = np.ndarray(frame.shape, dtype=np.uint8, buffer=ring.buf, offset=slot * slot_bytes)
+                    view[...] = frame
+                    del view
+                seq += 1
+                conn.send((req_id, clusters, slot, frame.shape, t1 - t0, t2 - t1, None))
+            except Exception as e:  # reported to the caller, the service keeps running
+                conn.send((req_id, None, None, None, 0.0, 0.0, f"{type(e).__name__}: {e}"))
+    finally:
+        ring.close()
+
+
+class VisionService:
+    """
+    Client for the capture-and-detect process, started on first use.
+
+    *capture* must be a module-level function (it is passed to a spawned
+    process); frames up to *slot_bytes* are published in a ring of *slots*
+    shared-memory slots, and :meth:`detect` returns a view of the slot, which
+    stays valid until *slots* - 1 further requests have been made.
+    """
+
+    def __init__(self, capture: Callable = grab_area, detect_mode: str = "full", cache_entries: int = 256,
+                 slots: int = 3, slot_bytes: int = 8 << 20, timeout: float = 30.0):
+        self.capture = capture
+        self.detect_mode = detect_mode
+        self.cache_entries = cache_entries
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.timeout = timeout
+        self._proc = None
+        self._conn = None
+        self._ring = None
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self.requests = 0
+        self.capture_time = 0.0
+        self.detect_time = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._proc is not None and self._proc.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self.close()  # after the process died: drop its pipe and ring first
+        from multiprocessing import shared_memory
+
+        # spawn, not fork: the parent has listener and Tk threads running
+        ctx = multiprocessing.get_context("spawn")
+        self._ring = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes)
+        self._conn, child = ctx.Pipe()
+        self._proc = ctx.Process(
+            target=_serve, name="toolforge-vision", daemon=True,
+            args=(child, self._ring.name, self.slots, self.slot_bytes, self.capture,
+                  self.detect_mode, self.cache_entries),
+        )
+        self._proc.start()
+        child.close()
+
+    def detect(self, area: Tuple[int, int, int, int], color, *, offset: Tuple[int, int] = (0, 0),
+               tolerance: int = 10, min_cluster_size: int = 5):
+        """
+        Capture *area* (x, y, w, h) and search it for *color* in the service.
+
+        Returns ``(clusters, frame)`` where *frame* is a read-only view into
+        the ring (None if the frame did not fit a slot). Raises RuntimeError
+        if this request failed in the service, and :class:`ServiceUnavailable`
+        (after closing the client) if the service died or did not answer
+        within the timeout.
+        """
+        import numpy as np
+
+        with self._lock:
+            self._next_id += 1
+            req_id = self._next_id
+            try:
+                self.start()
+                self._conn.send((req_id, tuple(area), tuple(color),
+                                 dict(offset=tuple(offset), tolerance=tolerance, min_cluster_size=min_cluster_size)))
+                answered = self._conn.poll(self.timeout)
+                if answered:
+                    got_id, clusters, slot, shape, capture_s, detect_s, error = self._conn.recv()
+            except (EOFError, OSError) as e:  # the service process died
+                self.close()
+                raise ServiceUnavailable(f"vision service connection lost: {e!r}") from e
+            if not answered:
+                self.close()
+                raise ServiceUnavailable(f"vision service did not answer within {self.timeout:.0f}s")
+            if got_id != req_id:
+                # Replies no longer match requests: nothing it answers can be trusted
+                self.close()
+                raise ServiceUnavailable("vision service sent an out-of-order reply")
+        if error:
+            raise RuntimeError(f"vision service failed: {error}")
+        self.requests += 1
+        self.capture_time += capture_s
+        self.detect_time += detect_s
+        frame = None
+        if slot is not None:
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=self._ring.buf, offset=slot * self.slot_bytes)
+            frame.flags.writeable = False
+        return clusters, frame
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "capture_time": self.capture_time, "detect_time": self.detect_time}
+
+    def close(self):
+        """Stop the service process and free the ring."""
+        if self._conn is not None:
+            try:
+                self._conn.send(None)
+            except (OSError, ValueError):
+                pass
+            self._conn.close()
+            self._conn = None
+        if self._proc is not None:
+            self._proc.join(timeout=2)
+            if self._proc.is_alive():
+                self._proc.terminate()
+            self._proc = None
+        if self._ring is not None:
+            try:
+                self._ring.close()
+            except BufferError:  # a returned frame view is still alive; unmapped at exit
+                pass
+            self._ring.unlink()
+            self._ring = None